@@ -1,11 +1,31 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity
+"""
+Application factory.
+
+Importing this module only defines the extensions; ``create_app(role)``
+builds a configured Flask app. What a process starts depends on its role:
+
+- ``web``: the gunicorn/dev server; runs the scheduler and the background
+  services (write-behind flusher, leader election, exit hooks), creates tables
+- ``worker``: the bot worker; scheduler and background services, leaves the
+  schema alone
+- ``cli``: ``flask`` commands and ``startup_check.py``; starts nothing
+
+APP_SCHEDULER, APP_BACKGROUND and APP_CREATE_SCHEMA override the role's
+defaults (e.g. turn schema creation off in web workers once migrations own
+it). Heavy modules
+(numpy, scikit-learn, the broker API, Alembic) are imported by the code that
+needs them, not at startup.
+
+``app`` is still importable: the first access builds one with APP_ROLE
+(``web`` by default, ``cli`` under the ``flask`` command).
+"""
+
+from flask import Flask
+from flask_jwt_extended import JWTManager
 from flask_cors import CORS
-from flask_migrate import Migrate
-from flask_socketio import SocketIO, emit, join_room, leave_room
-from database import db
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from flask_socketio import SocketIO
+from database import db, engine_options
+from datetime import timedelta
 import os
 import sys
 from dotenv import load_dotenv
@@ -20,404 +40,270 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 # Load environment variables
 load_dotenv()
 
-# Initialize Flask app with explicit template and static folders
-# Use absolute paths to ensure templates are found in production
-base_dir = os.path.dirname(os.path.abspath(__file__))
-template_dir = os.path.join(base_dir, 'templates')
-static_dir = os.path.join(base_dir, 'static')
+logger = logging.getLogger(__name__)
 
-BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-PARENT_DIR = os.path.abspath(os.path.join(BASE_DIR, os.pardir))
+# Extensions, bound to an app by create_app
+jwt = JWTManager()
+socketio = SocketIO()
+# Not started here; only processes whose role runs scheduled jobs start it
+scheduler = BackgroundScheduler()
 
-app = Flask(
-    __name__,
-    template_folder=os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "templates")),
-    static_folder=os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "static"))
-)
+# background: threads and exit hooks of the services (flushers, leader election, shutdowns)
+ROLES = {
+    'web': {'scheduler': True, 'background': True, 'create_schema': True},
+    'worker': {'scheduler': True, 'background': True, 'create_schema': False},
+    'cli': {'scheduler': False, 'background': False, 'create_schema': False},
+}
 
-# Log template and static directories for debugging
-logger = logging.getLogger(__name__)
-logger.info(f"Template directory: {template_dir}")
-logger.info(f"Static directory: {static_dir}")
-logger.info(f"Template directory exists: {os.path.exists(template_dir)}")
-logger.info(f"Static directory exists: {os.path.exists(static_dir)}")
-
-# Check if index.html exists
-index_template = os.path.join(template_dir, 'index.html')
-logger.info(f"index.html path: {index_template}")
-logger.info(f"index.html exists: {os.path.exists(index_template)}")
-
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
-
-# Fix DATABASE_URL for Render (postgres:// -> postgresql://)
-database_url = os.getenv('DATABASE_URL', 'sqlite:///trading_bot.db')
-if database_url.startswith('postgres://'):
-    database_url = database_url.replace('postgres://', 'postgresql://', 1)
-app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-string')
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=int(os.getenv('JWT_ACCESS_TOKEN_EXPIRES', 24)))
-
-# Initialize extensions
-db.init_app(app)
-migrate = Migrate(app, db)
-jwt = JWTManager(app)
-CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
-
-# Make socketio available globally
-app.socketio = socketio
-
-# Configure logging
-log_handlers = [logging.StreamHandler()]
-
-# Only add file handler if logs directory exists or can be created
-log_file = os.getenv('LOG_FILE', 'logs/trading_bot.log')
-try:
-    log_dir = os.path.dirname(log_file)
-    if log_dir and not os.path.exists(log_dir):
-        os.makedirs(log_dir, exist_ok=True)
-    log_handlers.append(logging.FileHandler(log_file))
-except (OSError, PermissionError):
-    # If we can't create log file, just use console logging
-    pass
-
-logging.basicConfig(
-    level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO')),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=log_handlers
-)
-logger = logging.getLogger(__name__)
 
-# Initialize scheduler
-scheduler = BackgroundScheduler()
-scheduler.start()
-atexit.register(lambda: scheduler.shutdown())
-
-# Import models and services after db initialization
-try:
-    from models import User, TradingConfig, TradeHistory, MLModel
-    logger.info("Models imported successfully")
-except ImportError as e:
-    logger.error(f"Error importing models: {e}")
-    # Create dummy models to prevent app crash
-    class User:
-        pass
-    class TradingConfig:
-        pass
-    class TradeHistory:
-        pass
-    class MLModel:
+def _env_flag(name, default):
+    value = os.getenv(name)
+    if value is None or value == '':
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def role_settings(role):
+    """What a process of ``role`` starts, after APP_* overrides"""
+    if role not in ROLES:
+        raise ValueError(f"Unknown app role '{role}' (expected one of {', '.join(ROLES)})")
+    settings = dict(ROLES[role])
+    settings['scheduler'] = _env_flag('APP_SCHEDULER', settings['scheduler'])
+    settings['background'] = _env_flag('APP_BACKGROUND', settings['background'])
+    settings['create_schema'] = _env_flag('APP_CREATE_SCHEMA', settings['create_schema'])
+    return settings
+
+
+def default_role():
+    if os.getenv('FLASK_RUN_FROM_CLI'):
+        return os.getenv('APP_ROLE', 'cli')
+    return os.getenv('APP_ROLE', 'web')
+
+
+def configure_logging():
+    """Console plus LOG_FILE logging, once per process"""
+    if logging.getLogger().handlers:
+        return
+
+    log_handlers = [logging.StreamHandler()]
+
+    # Only add file handler if logs directory exists or can be created
+    log_file = os.getenv('LOG_FILE', 'logs/trading_bot.log')
+    try:
+        log_dir = os.path.dirname(log_file)
+        if log_dir and not os.path.exists(log_dir):
+            os.makedirs(log_dir, exist_ok=True)
+        log_handlers.append(logging.FileHandler(log_file))
+    except (OSError, PermissionError):
+        # If we can't create log file, just use console logging
         pass
 
-# Import services with robust fallback system
-try:
-    from services import IQOptionService, SignalAnalyzer, TradingBot, MLService
-    services_available = True
-    logger.info("Services imported successfully")
-except ImportError as e:
-    logger.warning(f"Services not available during startup: {e}")
-    services_available = False
-    # Create minimal dummy services
-    class IQOptionService:
-        def __init__(self, *args, **kwargs):
-            self.is_connected = False
-            self.balance = 0.0
-    class SignalAnalyzer:
-        def __init__(self, *args, **kwargs):
-            pass
-    class TradingBot:
-        def __init__(self, *args, **kwargs):
-            self.is_running = False
-    class MLService:
-        def __init__(self, *args, **kwargs):
-            pass
-
-# Import and register routes blueprint
-try:
-    from routes import api, main
-    app.register_blueprint(api, url_prefix='/api')
-    app.register_blueprint(main)
-    
-    # Add debug route for template checking
-    @app.route('/debug/templates')
-    def debug_templates():
-        import os
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        template_dir = os.path.join(base_dir, 'templates')
-        
-        templates_info = {
-            'base_dir': base_dir,
-            'template_dir': template_dir,
-            'template_dir_exists': os.path.exists(template_dir),
-            'templates': []
-        }
-        
-        if os.path.exists(template_dir):
-            templates_info['templates'] = os.listdir(template_dir)
-        
-        return templates_info
-    logger.info("Routes registered successfully")
-except ImportError as e:
-    logger.error(f"Error importing routes: {e}")
-    # Create minimal routes to keep app running
-    from flask import Blueprint
-    api = Blueprint('api', __name__, url_prefix='/api')
-    main = Blueprint('main', __name__)
-    
-    @main.route('/')
-    def index():
-        return "Application starting..."
-    
-    @api.route('/health')
-    def health():
-        return {'status': 'ok', 'services_available': services_available}
-    
-    app.register_blueprint(api, url_prefix='/api')
-    app.register_blueprint(main)
-
-# Global trading bot instance
-trading_bot = None
-
-def get_or_create_trading_bot():
-    """Get or create trading bot instance"""
-    global trading_bot
-    if trading_bot is None:
-        # Create a dummy bot for status checking
-        class DummyBot:
-            def get_bot_status(self, user_id):
-                return {
-                    'running': False,
-                    'current_session': None,
-                    'trades_today': 0,
-                    'profit_today': 0.0,
-                    'last_signal': None
-                }
-            
-            def start_bot(self, user, config):
-                global trading_bot
-                trading_bot = TradingBot(user.id, config, app)
-                return trading_bot.start()
-            
-            def stop_bot(self, user_id):
-                global trading_bot
-                if trading_bot and hasattr(trading_bot, 'stop'):
-                    trading_bot.stop()
-                    trading_bot = None
-                    return True
-                return False
-        
-        trading_bot = DummyBot()
-    return trading_bot
-
-# Main routes moved to routes.py blueprint
-
-# Configuration endpoints moved to routes.py
-
-@app.route('/api/iq-credentials', methods=['GET', 'POST'])
-@jwt_required()
-def iq_credentials():
-    """Get or update IQ Option credentials"""
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    
-    if not user:
-        return jsonify({'success': False, 'message': 'Usuário não encontrado'}), 404
-    
-    if request.method == 'GET':
-        return jsonify({
-            'success': True,
-            'has_credentials': bool(user.iq_email and user.iq_password),
-            'iq_email': user.iq_email or ''
-        })
-    
-    # POST - Update credentials
-    data = request.get_json()
-    iq_email = data.get('iq_email')
-    iq_password = data.get('iq_password')
-    
-    if not iq_email or not iq_password:
-        return jsonify({'success': False, 'message': 'Email e senha são obrigatórios'}), 400
-    
-    user.iq_email = iq_email
-    user.iq_password = iq_password
-    
-    db.session.commit()
-    
-    return jsonify({'success': True, 'message': 'Credenciais atualizadas com sucesso'})
-
-# Bot control endpoints moved to routes.py
-
-@app.route('/api/trades')
-@jwt_required()
-def get_trades():
-    """Get trade history"""
-    user_id = get_jwt_identity()
-    
-    # Get query parameters
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 50))
-    
-    query = TradeHistory.query.filter_by(user_id=user_id)
-    
-    if start_date:
-        query = query.filter(TradeHistory.timestamp >= datetime.fromisoformat(start_date))
-    if end_date:
-        query = query.filter(TradeHistory.timestamp <= datetime.fromisoformat(end_date))
-    
-    trades = query.order_by(TradeHistory.timestamp.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
+    logging.basicConfig(
+        level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO')),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=log_handlers
     )
-    
-    return jsonify({
-        'success': True,
-        'trades': [{
-            'id': trade.id,
-            'timestamp': trade.timestamp.isoformat(),
-            'asset': trade.asset,
-            'direction': trade.direction,
-            'amount': trade.amount,
-            'result': trade.result,
-            'profit': trade.profit,
-            'martingale_level': trade.martingale_level,
-            'signal_strength': trade.signal_strength
-        } for trade in trades.items],
-        'pagination': {
-            'page': trades.page,
-            'pages': trades.pages,
-            'per_page': trades.per_page,
-            'total': trades.total
-        }
-    })
-
-# User profile endpoint moved to routes.py
-
-@app.route('/api/dashboard/stats')
-@jwt_required()
-def get_dashboard_stats():
-    """Get dashboard statistics"""
-    user_id = get_jwt_identity()
-    
-    # Get today's trades
-    today = datetime.now().date()
-    today_trades = TradeHistory.query.filter(
-        TradeHistory.user_id == user_id,
-        TradeHistory.timestamp >= today
-    ).all()
-    
-    # Calculate stats
-    total_trades_today = len(today_trades)
-    wins_today = len([t for t in today_trades if t.result == 'win'])
-    profit_today = sum([t.profit for t in today_trades])
-    win_rate_today = (wins_today / total_trades_today * 100) if total_trades_today > 0 else 0
-    
-    return jsonify({
-        'success': True,
-        'stats': {
-            'trades_today': total_trades_today,
-            'wins_today': wins_today,
-            'profit_today': profit_today,
-            'win_rate_today': win_rate_today,
-            'current_balance': 1000.0  # Placeholder - should come from IQ Option API
-        }
-    })
-
-# WebSocket endpoint temporarily disabled to avoid 400 errors
-# @app.route('/ws')
-# def websocket_endpoint():
-#     """WebSocket endpoint placeholder"""
-#     return jsonify({'message': 'WebSocket endpoint - requires WebSocket implementation'}), 400
-
-@app.route('/api/statistics')
-@jwt_required()
-def get_statistics():
-    """Get trading statistics"""
-    user_id = get_jwt_identity()
-    
-    # Get date range
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    
-    query = TradeHistory.query.filter_by(user_id=user_id)
-    
-    if start_date:
-        query = query.filter(TradeHistory.timestamp >= datetime.fromisoformat(start_date))
-    if end_date:
-        query = query.filter(TradeHistory.timestamp <= datetime.fromisoformat(end_date))
-    
-    trades = query.all()
-    
-    if not trades:
-        return jsonify({
-            'success': True,
-            'statistics': {
-                'total_trades': 0,
-                'wins': 0,
-                'losses': 0,
-                'win_rate': 0,
-                'total_profit': 0,
-                'best_streak': 0,
-                'worst_streak': 0,
-                'avg_profit_per_trade': 0
+
+
+def _register_blueprints(app):
+    try:
+        from routes import api, main
+        app.register_blueprint(api, url_prefix='/api')
+        app.register_blueprint(main)
+
+        # Add debug route for template checking
+        @app.route('/debug/templates')
+        def debug_templates():
+            template_dir = app.template_folder
+
+            templates_info = {
+                'base_dir': os.path.dirname(os.path.abspath(__file__)),
+                'template_dir': template_dir,
+                'template_dir_exists': os.path.exists(template_dir),
+                'templates': []
             }
-        })
-    
-    total_trades = len(trades)
-    wins = len([t for t in trades if t.result == 'win'])
-    losses = total_trades - wins
-    win_rate = (wins / total_trades) * 100 if total_trades > 0 else 0
-    total_profit = sum(t.profit for t in trades)
-    avg_profit = total_profit / total_trades if total_trades > 0 else 0
-    
-    # Calculate streaks
-    current_streak = 0
-    best_streak = 0
-    worst_streak = 0
-    
-    for trade in trades:
-        if trade.result == 'win':
-            current_streak = max(0, current_streak) + 1
-            best_streak = max(best_streak, current_streak)
-        else:
-            current_streak = min(0, current_streak) - 1
-            worst_streak = min(worst_streak, current_streak)
-    
-    return jsonify({
-        'success': True,
-        'statistics': {
-            'total_trades': total_trades,
-            'wins': wins,
-            'losses': losses,
-            'win_rate': round(win_rate, 2),
-            'total_profit': round(total_profit, 2),
-            'best_streak': best_streak,
-            'worst_streak': abs(worst_streak),
-            'avg_profit_per_trade': round(avg_profit, 2)
-        }
-    })
-
-# Create application factory function
-def create_app():
+
+            if os.path.exists(template_dir):
+                templates_info['templates'] = os.listdir(template_dir)
+
+            return templates_info
+        logger.debug("Routes registered successfully")
+    except ImportError as e:
+        logger.error(f"Error importing routes: {e}")
+        # Create minimal routes to keep app running
+        from flask import Blueprint
+        api = Blueprint('api', __name__, url_prefix='/api')
+        main = Blueprint('main', __name__)
+
+        @main.route('/')
+        def index():
+            return "Application starting..."
+
+        @api.route('/health')
+        def health():
+            return {'status': 'ok', 'routes_available': False}
+
+        app.register_blueprint(api, url_prefix='/api')
+        app.register_blueprint(main)
+
+
+def _register_services(app, settings):
+    """Wire the per-process services onto the app and the shared scheduler.
+
+    Jobs are only added to the scheduler, which runs them if the role starts
+    it; services that start threads or exit hooks do so only with
+    ``settings['background']``.
+    """
+    background = settings['background']
+
+    # One scheduler leader across workers runs the once-per-deployment jobs
+    from leader_election import register_leader_election
+    register_leader_election(app, scheduler, campaign=settings['scheduler'] and background)
+
+    # Schedule incremental ML retraining
+    try:
+        from ml_training import register_retraining_jobs
+        register_retraining_jobs(app, scheduler)
+    except ImportError as e:
+        logger.warning(f"ML retraining not available: {e}")
+
+    # Flush batched MLModel live-performance counters
+    from live_performance import register_live_performance_flush
+    register_live_performance_flush(app, scheduler, background=background)
+
+    # Buffered TradeHistory/SystemLog inserts; registered before the bots so its
+    # final flush runs after they have stopped (atexit is last-in, first-out)
+    from write_behind import register_write_behind
+    register_write_behind(app, background=background)
+
+    # Per-user trading bots
+    if background:
+        from bot_manager import bot_manager
+        atexit.register(bot_manager.shutdown)
+
+    # Shared per-user broker sessions
+    from broker_pool import register_broker_pool_jobs
+    register_broker_pool_jobs(scheduler, background=background)
+
+    # Socket.IO push of bot status, trades and stat deltas
+    from realtime import register_realtime
+    register_realtime(app, socketio, background=background)
+
+    # Revoked JWTs shared across workers (checked on every protected request)
+    from token_revocation import register_token_revocation
+    register_token_revocation(jwt, scheduler)
+
+    # Cached user/config lookups, dropped when a commit changes them
+    from entity_cache import register_entity_cache
+    register_entity_cache()
+
+    # Rate-limited logins with password hashing off the request threads
+    from login_guard import register_login_guard
+    register_login_guard(scheduler, background=background)
+
+    # Route latency, SQL statements per request and broker call metrics on GET /metrics
+    from metrics import register_metrics
+    register_metrics(app, scheduler, background=background)
+
+    # Configs saved in other processes reach the strategies of this process's bots
+    # (signal_hub's numpy stays out of processes that run none)
+    if background:
+        from strategy import register_strategy_sync
+        register_strategy_sync(app, scheduler)
+
+    # Start/stop auto-mode bots at their session times
+    from session_scheduler import register_session_scheduler
+    register_session_scheduler(app, scheduler, load=settings['scheduler'] and background)
+
+
+def create_app(role=None, config=None):
+    """Build the Flask app for a process of ``role`` ('web', 'worker' or 'cli')"""
+    role = role or default_role()
+    settings = role_settings(role)
+    configure_logging()
+
+    # Templates and static files live next to the project directory
+    app = Flask(
+        __name__,
+        template_folder=os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "templates")),
+        static_folder=os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "static"))
+    )
+
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
+
+    # Fix DATABASE_URL for Render (postgres:// -> postgresql://)
+    database_url = os.getenv('DATABASE_URL', 'sqlite:///trading_bot.db')
+    if database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(database_url)
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-string')
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=int(os.getenv('JWT_ACCESS_TOKEN_EXPIRES', 24)))
+    app.config['APP_ROLE'] = role
+    # Reverse proxies (Render's router, nginx) in front of the app whose X-Forwarded-* headers are trusted
+    app.config['TRUSTED_PROXY_HOPS'] = int(os.getenv('TRUSTED_PROXY_HOPS', 0))
+    if config:
+        app.config.update(config)
+
+    # Initialize extensions
+    db.init_app(app)
+    # WAL, pragmas and a serialized writer when the database is SQLite
+    from sqlite_profile import register_sqlite_profile
+    register_sqlite_profile(app)
+    jwt.init_app(app)
+    CORS(app)
+    socketio.init_app(app, cors_allowed_origins="*", message_queue=os.getenv('SOCKETIO_MESSAGE_QUEUE'),
+                      async_mode=os.getenv('SOCKETIO_ASYNC_MODE') or None)
+    hops = app.config['TRUSTED_PROXY_HOPS']
+    if hops:
+        # remote_addr becomes the client address instead of the proxy's (rate limits are keyed on it)
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+    if os.getenv('FLASK_RUN_FROM_CLI'):
+        # Alembic is only needed by the `flask db` commands
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    # Make socketio and the scheduler available to blueprints
+    app.socketio = socketio
+    app.extensions['scheduler'] = scheduler
+
+    _register_blueprints(app)
+    _register_services(app, settings)
+
+    if settings['create_schema']:
+        with app.app_context():
+            try:
+                db.create_all()
+                logger.info("Database tables created successfully")
+            except Exception as e:
+                logger.error(f"Error creating database tables: {e}")
+
+    if settings['scheduler'] and not scheduler.running:
+        scheduler.start()
+        atexit.register(lambda: scheduler.shutdown())
+
+    logger.info(f"Application created (role={role}, scheduler={settings['scheduler']}, "
+                f"background={settings['background']}, create_schema={settings['create_schema']})")
     return app
 
+
+_default_app = None
+
+
+def __getattr__(name):
+    """Build ``app`` on first access, for code that still does ``from app import app``"""
+    global _default_app
+    if name == 'app':
+        if _default_app is None:
+            _default_app = create_app()
+        return _default_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 if __name__ == '__main__':
-    with app.app_context():
-        try:
-            db.create_all()
-            logger.info("Database tables created successfully")
-        except Exception as e:
-            logger.error(f"Error creating database tables: {e}")
-    
+    app = create_app('web')
     port = int(os.environ.get('PORT', 5000))
     logger.info(f"Starting application on port {port}")
     socketio.run(app, host='0.0.0.0', port=port, debug=os.getenv('FLASK_ENV') == 'development')
-else:
-    # For production deployment
-    with app.app_context():
-        try:
-            db.create_all()
-            logger.info("Database tables created successfully")
-        except Exception as e:
-            logger.error(f"Error creating database tables: {e}")
\ No newline at end of file
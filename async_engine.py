@@ -0,0 +1,345 @@
+"""
+asyncio bot execution engine.
+
+All bots run as coroutines on one event loop (in a dedicated thread), so a
+waiting bot costs a suspended task instead of a sleeping thread. A bot that
+implements the staged protocol is driven as::
+
+    candle = await bot.wait_candle()          # candle arrival
+    signal = bot.analyze(candle)              # CPU work, run in the executor
+    signal = bot.score(signal)                # optional ML step, also in the executor
+    order = await bot.place_order(signal)     # order placement
+    result = await bot.poll_result(order)     # result polling (own task)
+
+``analyze`` runs on a small thread pool so indicator/ML work never blocks
+the loop; result polling runs as a separate task so the next candle is not
+delayed by an open position. Each stage is timed in trade_latency, and a
+bot's ``prearmed_signal(candle)`` (see PreArmedDecision) can skip analysis
+entirely. Bots with an ``async def run_cycle()`` are awaited every
+``cycle_interval`` seconds, bots with a plain ``run_cycle()`` run it in the
+executor (a stop waits for the cycle in flight before teardown), and bots with only ``start()``/``stop()`` are started as-is and
+unregistered once their thread ends on its own. The public surface matches
+BotManager.
+"""
+
+import os
+import time
+import asyncio
+import inspect
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from trade_latency import latency_tracker
+from bot_manager import STOPPED_STATUS, MAX_BOTS, DEFAULT_CYCLE_INTERVAL, MAX_CONSECUTIVE_ERRORS, threaded_bot_ended
+
+logger = logging.getLogger(__name__)
+
+CPU_WORKERS = int(os.getenv('BOT_CPU_WORKERS', os.cpu_count() or 1))
+CALL_TIMEOUT = float(os.getenv('BOT_ENGINE_CALL_TIMEOUT', 30))
+# How long a stop waits for a plain run_cycle() already running in the executor
+STOP_TIMEOUT = float(os.getenv('BOT_ENGINE_STOP_TIMEOUT', 10))
+
+
+class AsyncManagedBot:
+    """Lifecycle state of one user's bot inside the engine"""
+    __slots__ = ('user_id', 'bot', 'mode', 'interval', 'status', 'task', 'pending', 'cycle',
+                 'errors', 'cycles', 'started_at')
+
+    def __init__(self, user_id, bot):
+        self.user_id = user_id
+        self.bot = bot
+        self.mode = self._detect_mode(bot)
+        self.interval = float(getattr(bot, 'cycle_interval', DEFAULT_CYCLE_INTERVAL))
+        self.status = {}
+        self.task = None
+        self.pending = set()  # result-polling tasks
+        self.cycle = None  # last run_cycle() call in the executor (sync_cycle)
+        self.errors = 0
+        self.cycles = 0
+        self.started_at = time.time()
+
+    @staticmethod
+    def _detect_mode(bot):
+        if callable(getattr(bot, 'wait_candle', None)):
+            return 'staged'
+        run_cycle = getattr(bot, 'run_cycle', None)
+        if run_cycle is not None and inspect.iscoroutinefunction(run_cycle):
+            return 'async_cycle'
+        if callable(run_cycle):
+            return 'sync_cycle'
+        return 'threaded'
+
+
+class AsyncBotEngine:
+    """Per-user bot registry driven by a single asyncio event loop"""
+
+    remote = False
+
+    def __init__(self, cpu_workers=CPU_WORKERS, max_bots=MAX_BOTS):
+        self.max_bots = max_bots
+        self._bots = {}
+        self._lock = threading.Lock()
+        self._cpu_executor = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix='bot-cpu')
+        self._loop = None
+        self._thread = None
+
+    # Event loop thread
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop.set_default_executor(self._cpu_executor)
+                self._thread = threading.Thread(target=self._loop.run_forever, name='bot-event-loop', daemon=True)
+                self._thread.start()
+        return self._loop
+
+    def _call(self, coro):
+        """Run a coroutine on the engine loop from another thread and wait for it"""
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout=CALL_TIMEOUT)
+
+    async def run_cpu(self, func, *args):
+        """Run CPU-bound work in the engine executor (for use inside bots)"""
+        return await asyncio.get_running_loop().run_in_executor(self._cpu_executor, func, *args)
+
+    async def _maybe_await(self, func, *args):
+        """Await a coroutine function, or run a plain callable in the executor"""
+        if inspect.iscoroutinefunction(func):
+            return await func(*args)
+        return await self.run_cpu(func, *args)
+
+    # Lifecycle (BotManager surface)
+
+    def start_bot(self, user_id, bot):
+        """Register and start a bot for a user; False if already running, full or failed"""
+        with self._lock:
+            if user_id in self._bots:
+                logger.warning(f"Bot already running for user {user_id}")
+                return False
+            if len(self._bots) >= self.max_bots:
+                logger.error(f"Bot limit reached ({self.max_bots}), cannot start bot for user {user_id}")
+                return False
+            entry = self._bots[user_id] = AsyncManagedBot(user_id, bot)
+
+        try:
+            started = self._call(self._start(entry))
+        except Exception as e:
+            logger.error(f"Error starting bot for user {user_id}: {str(e)}")
+            started = False
+
+        if not started:
+            with self._lock:
+                self._bots.pop(user_id, None)
+            return False
+
+        logger.info(f"Bot started for user {user_id} (asyncio, {entry.mode})")
+        return True
+
+    def stop_bot(self, user_id):
+        """Stop and unregister a user's bot. Returns False if none was running."""
+        with self._lock:
+            entry = self._bots.pop(user_id, None)
+        if entry is None:
+            return False
+        try:
+            self._call(self._stop(entry))
+        except Exception as e:
+            logger.error(f"Error stopping bot for user {user_id}: {str(e)}")
+        logger.info(f"Bot stopped for user {user_id}")
+        return True
+
+    def shutdown(self):
+        """Stop every bot, the event loop and the executor"""
+        with self._lock:
+            user_ids = list(self._bots)
+        for user_id in user_ids:
+            self.stop_bot(user_id)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        self._cpu_executor.shutdown(wait=False, cancel_futures=True)
+
+    # Lookups (BotManager surface)
+
+    def is_running(self, user_id):
+        return self._prune(user_id) is not None
+
+    def get_bot(self, user_id):
+        entry = self._prune(user_id)
+        return entry.bot if entry else None
+
+    def running_user_ids(self):
+        with self._lock:
+            user_ids = list(self._bots)
+        return [user_id for user_id in user_ids if self._prune(user_id) is not None]
+
+    def get_status(self, user_id):
+        entry = self._prune(user_id)
+        if entry is None:
+            return dict(STOPPED_STATUS)
+        if entry.mode == 'threaded':
+            return self._read_status(entry)
+        return dict(entry.status)
+
+    def get_bot_status(self, user_id):
+        entry = self._prune(user_id)
+        if entry is None:
+            return dict(STOPPED_STATUS)
+        if entry.mode == 'threaded' and hasattr(entry.bot, 'get_bot_status'):
+            return entry.bot.get_bot_status(user_id)
+        return self.get_status(user_id)
+
+    def stats(self):
+        self.running_user_ids()  # drops threaded bots that ended
+        with self._lock:
+            entries = list(self._bots.values())
+        return {
+            'engine': 'asyncio',
+            'bots': len(entries),
+            'cycles': sum(entry.cycles for entry in entries),
+            'open_orders': sum(len(entry.pending) for entry in entries),
+        }
+
+    def _prune(self, user_id):
+        """The user's registered entry, after dropping a threaded bot that ended on its own"""
+        entry = self._bots.get(user_id)
+        # An empty status means start_bot is still starting it
+        if (entry is None or entry.mode != 'threaded' or not entry.status
+                or not threaded_bot_ended(entry, self._read_status)):
+            return entry
+        with self._lock:
+            if self._bots.get(user_id) is entry:
+                self._bots.pop(user_id)
+                logger.info(f"Bot for user {user_id} finished")
+        return None
+
+    # Coroutines on the engine loop
+
+    def _read_status(self, entry):
+        try:
+            status = entry.bot.get_status() if hasattr(entry.bot, 'get_status') else {}
+        except Exception as e:
+            logger.error(f"Error reading bot status for user {entry.user_id}: {str(e)}")
+            status = dict(entry.status)
+        status.setdefault('running', True)
+        return status
+
+    async def _start(self, entry):
+        bot = entry.bot
+        if entry.mode == 'threaded':
+            if not await self.run_cpu(bot.start):
+                return False
+            entry.status = self._read_status(entry)
+            return True
+
+        setup = getattr(bot, 'setup', None)
+        if callable(setup) and await self._maybe_await(setup) is False:
+            return False
+        entry.status = self._read_status(entry)
+        entry.task = asyncio.get_running_loop().create_task(self._drive(entry), name=f'bot-{entry.user_id}')
+        return True
+
+    async def _stop(self, entry):
+        if entry.mode == 'threaded':
+            await self.run_cpu(entry.bot.stop)
+            return
+
+        tasks = [task for task in (entry.task, *entry.pending) if task and task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Cancelling the await does not stop the executor thread: let the cycle
+        # in flight finish, so nothing it does (an order) lands after teardown
+        if entry.cycle is not None and not entry.cycle.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(entry.cycle), STOP_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"Bot cycle for user {entry.user_id} still running after {STOP_TIMEOUT}s, "
+                               f"tearing down anyway")
+            except Exception as e:
+                logger.error(f"Bot cycle error for user {entry.user_id}: {str(e)}")
+
+        teardown = getattr(entry.bot, 'teardown', None)
+        if callable(teardown):
+            try:
+                await self._maybe_await(teardown)
+            except Exception as e:
+                logger.error(f"Error tearing down bot for user {entry.user_id}: {str(e)}")
+
+    async def _drive(self, entry):
+        """Run one bot until it finishes, fails repeatedly or is cancelled"""
+        step = {
+            'staged': self._staged_step,
+            'async_cycle': lambda e: e.bot.run_cycle(),
+            'sync_cycle': self._sync_step,
+        }[entry.mode]
+
+        while True:
+            try:
+                keep_running = await step(entry) is not False
+                entry.errors = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                entry.errors += 1
+                logger.error(f"Bot cycle error for user {entry.user_id} ({entry.errors}): {str(e)}")
+                keep_running = entry.errors < MAX_CONSECUTIVE_ERRORS
+            entry.cycles += 1
+            entry.status = self._read_status(entry)
+
+            if not keep_running:
+                break
+            if entry.mode != 'staged':
+                await asyncio.sleep(entry.interval)
+
+        # Finished on its own: unregister and tear down
+        with self._lock:
+            if self._bots.get(entry.user_id) is entry:
+                self._bots.pop(entry.user_id)
+        await self._stop(entry)
+        logger.info(f"Bot for user {entry.user_id} finished")
+
+    async def _sync_step(self, entry):
+        entry.cycle = asyncio.ensure_future(self.run_cpu(entry.bot.run_cycle))
+        return await asyncio.shield(entry.cycle)
+
+    async def _staged_step(self, entry):
+        bot = entry.bot
+        candle = await bot.wait_candle()
+        if candle is None:
+            return True
+        timeline = latency_tracker.timeline(entry.user_id, getattr(bot, 'candle_closed_at', None))
+
+        prearmed = bot.prearmed_signal(candle) if hasattr(bot, 'prearmed_signal') else None
+        if prearmed is not None:
+            signal = prearmed[0]
+        else:
+            signal = await self.run_cpu(bot.analyze, candle)
+            timeline.mark('indicators_updated')
+            if callable(getattr(bot, 'score', None)):
+                signal = await self.run_cpu(bot.score, signal)
+                timeline.mark('ml_scored')
+        if not signal:
+            return True
+
+        timeline.mark('order_sent')
+        order = await bot.place_order(signal)
+        if order is None:
+            return True
+        timeline.mark('order_acknowledged')
+
+        task = asyncio.get_running_loop().create_task(self._poll(entry, order))
+        entry.pending.add(task)
+        task.add_done_callback(entry.pending.discard)
+        return getattr(bot, 'keep_running', True)
+
+    async def _poll(self, entry, order):
+        try:
+            await entry.bot.poll_result(order)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Result polling error for user {entry.user_id}: {str(e)}")
+        entry.status = self._read_status(entry)
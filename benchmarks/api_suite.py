@@ -0,0 +1,303 @@
+"""
+Reproducible API benchmark suite.
+
+Seeds --users x --trades trades x --candles candles with synthetic_data
+(same --seed, same rows) into a throwaway SQLite file and, with
+--postgres-url, into a local PostgreSQL database (its tables are dropped).
+For each database it starts the app under gunicorn with the broker simulator
+(BROKER_BACKEND=simulator: nothing leaves the machine) and runs every
+scenario in turn: --clients keep-alive clients for --warmup seconds
+(discarded) and then --duration seconds. Per scenario it records
+throughput and p50/p90/p99/max latency of the successful responses, every
+status code (e.g. login's 429s when the hashing pool is full) and SQL
+statements per request (from GET /metrics).
+
+Results go to a JSON file (--output, by default benchmarks/results/); pass
+a previous file with --compare to print the differences and exit with
+status 1 when a scenario's throughput, p99 or SQL statements per request
+got worse by more than --tolerance.
+
+    python benchmarks/api_suite.py --users 50 --trades 500 --candles 2000 --duration 10
+    python benchmarks/api_suite.py --postgres-url postgresql://localhost/iqbot_bench \\
+        --compare benchmarks/results/api-20260101-120000.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import http.client
+from datetime import datetime
+from collections import Counter
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from serving_load import free_port, start_server  # noqa: E402
+from synthetic_data import PASSWORD, generate  # noqa: E402
+
+# name -> (method, path, URL rule in the metrics)
+SCENARIOS = {
+    'dashboard_stats': ('GET', '/api/dashboard/stats', '/api/dashboard/stats'),
+    'statistics': ('GET', '/api/statistics', '/api/statistics'),
+    'trade_history': ('GET', '/api/trades/history?per_page=20&page={page}', '/api/trades/history'),
+    'login': ('POST', '/api/auth/login', '/api/auth/login'),
+    'bot_status': ('GET', '/api/bot/status', '/api/bot/status'),
+}
+
+
+def build_request(name, rng, user_ids, tokens):
+    method, path, _ = SCENARIOS[name]
+    index = rng.randrange(len(user_ids))
+    if name == 'login':
+        body = json.dumps({'email': f'bench{index}@example.com', 'password': PASSWORD})
+        return method, path, body, {'Content-Type': 'application/json'}
+    headers = {'Authorization': f'Bearer {tokens[user_ids[index]]}'}
+    return method, path.format(page=rng.randint(1, 5)), None, headers
+
+
+def drive(port, name, args, user_ids, tokens, seconds, seed):
+    """Run ``name`` for ``seconds`` with args.clients clients; successful latencies, statuses, errors"""
+    lock = threading.Lock()
+    latencies, statuses, errors = [], Counter(), Counter()
+    deadline = time.time() + seconds
+
+    def client(index):
+        rng = random.Random(f'{seed}-{name}-{index}')
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        local_latencies, local_statuses, local_errors = [], Counter(), Counter()
+        while time.time() < deadline:
+            method, path, body, headers = build_request(name, rng, user_ids, tokens)
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException) as e:
+                local_errors[type(e).__name__] += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                continue
+            if response.status < 400:
+                local_latencies.append(time.perf_counter() - started)
+            local_statuses[response.status] += 1
+            if response.status == 429:
+                # Back off like a real client instead of stealing CPU from the requests being served
+                retry_after = float(response.getheader('Retry-After') or 1)
+                time.sleep(max(0.0, min(retry_after * rng.uniform(0.5, 1.0), deadline - time.time())))
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+            errors.update(local_errors)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, errors
+
+
+def sql_totals(port):
+    """(statements, requests) per route from GET /metrics"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        conn.request('GET', '/metrics')
+        text = conn.getresponse().read().decode()
+    finally:
+        conn.close()
+    totals = {}
+    for line in text.splitlines():
+        for suffix, slot in (('_sum', 0), ('_count', 1)):
+            prefix = f'http_request_sql_statements{suffix}{{route="'
+            if line.startswith(prefix):
+                route, value = line[len(prefix):].split('"}', 1)
+                totals.setdefault(route, [0.0, 0.0])[slot] = float(value)
+    return totals
+
+
+def run_scenario(port, name, args, user_ids, tokens):
+    if args.warmup:
+        drive(port, name, args, user_ids, tokens, args.warmup, args.seed + 1)
+    # Workers dump their counters every METRICS_SYNC_SECONDS
+    time.sleep(1.5)
+    before = sql_totals(port)
+    started = time.time()
+    latencies, statuses, errors = drive(port, name, args, user_ids, tokens, args.duration, args.seed)
+    wall = time.time() - started
+    time.sleep(1.5)
+    after = sql_totals(port)
+
+    route = SCENARIOS[name][2]
+    statements, requests = (a - b for a, b in zip(after.get(route, (0, 0)), before.get(route, (0, 0))))
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1000 if latencies else (0.0, 0.0, 0.0)
+    return {
+        'requests': len(latencies),
+        'throughput_rps': round(len(latencies) / wall, 1),
+        'p50_ms': round(float(p50), 2),
+        'p90_ms': round(float(p90), 2),
+        'p99_ms': round(float(p99), 2),
+        'max_ms': round(max(latencies) * 1000, 2) if latencies else 0.0,
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        'errors': dict(errors),
+        'sql_per_request': round(statements / requests, 2) if requests else None,
+    }
+
+
+def run_backend(label, database_url, args, workdir):
+    env = dict(os.environ,
+               DATABASE_URL=database_url,
+               BROKER_BACKEND='simulator',
+               SIM_SEED=str(args.seed),
+               LOG_LEVEL='WARNING',
+               LOG_FILE=os.path.join(workdir, f'{label}.log'),
+               RATE_LIMIT_DB_PATH=os.path.join(workdir, f'{label}-rate-limits.db'),
+               REVOCATION_DB_PATH=os.path.join(workdir, f'{label}-revoked.db'),
+               LEADER_DB_PATH=os.path.join(workdir, f'{label}-leader.db'),
+               METRICS_DIR=os.path.join(workdir, f'{label}-metrics'),
+               METRICS_SYNC_SECONDS='1',
+               METRICS_TOKEN='',
+               # One client IP hammering login; the limits would turn the scenario into 429s
+               RATE_LIMIT_PER_MINUTE='100000000',
+               MAX_LOGIN_ATTEMPTS='100000000')
+    os.environ.update(env)
+
+    print(f'{label}: seeding {args.users} users x {args.trades} trades, {args.candles} candles per asset')
+    dataset = generate(database_url, users=args.users, trades=args.trades, candles=args.candles, seed=args.seed)
+    user_ids = dataset.pop('user_ids')
+
+    from flask_jwt_extended import create_access_token
+    from app import create_app
+
+    with create_app('cli').app_context():
+        tokens = {user_id: create_access_token(identity=str(user_id)) for user_id in user_ids}
+
+    port = free_port()
+    server = start_server(args, port, env)
+    scenarios = {}
+    try:
+        for name in args.scenarios:
+            result = scenarios[name] = run_scenario(port, name, args, user_ids, tokens)
+            print(f'  {name:16} {result["throughput_rps"]:8.1f} req/s  p50 {result["p50_ms"]:7.1f} ms  '
+                  f'p99 {result["p99_ms"]:7.1f} ms  sql/req {result["sql_per_request"]}  {result["statuses"]}'
+                  + (f'  errors {result["errors"]}' if result['errors'] else ''))
+    finally:
+        server.terminate()
+        server.wait(30)
+    return {'dataset': dataset, 'scenarios': scenarios}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Print changes against ``baseline``; returns the number of regressions"""
+    regressions = 0
+    print(f'\ncompared with {baseline.get("git_commit")} ({baseline.get("created_at")}), tolerance {tolerance:.0%}:')
+    differing = sorted(key for key, value in results['config'].items() if baseline.get('config', {}).get(key) != value)
+    if differing or baseline.get('host', {}).get('cpus') != results['host']['cpus']:
+        print(f'  note: runs differ in {", ".join(differing) or "cpus"}; numbers are not like for like')
+    for label, backend in results['backends'].items():
+        old_backend = baseline.get('backends', {}).get(label)
+        if old_backend is None:
+            continue
+        for name, new in backend['scenarios'].items():
+            old = old_backend['scenarios'].get(name)
+            if old is None:
+                continue
+            flags = []
+            if old['throughput_rps'] and new['throughput_rps'] < old['throughput_rps'] * (1 - tolerance):
+                flags.append('throughput')
+            if old['p99_ms'] and new['p99_ms'] > old['p99_ms'] * (1 + tolerance):
+                flags.append('p99')
+            # Statement counts move with the status mix (a failed login stops early), not with the machine
+            if old.get('sql_per_request') is not None and new.get('sql_per_request') is not None \
+                    and new['sql_per_request'] > old['sql_per_request'] * (1 + tolerance):
+                flags.append('sql')
+            regressions += bool(flags)
+
+            def change(key):
+                return f'{(new[key] - old[key]) / old[key]:+.0%}' if old[key] else 'n/a'
+
+            print(f'  {label}/{name:16} throughput {change("throughput_rps"):>6}  p50 {change("p50_ms"):>6}  '
+                  f'p99 {change("p99_ms"):>6}  sql/req {old.get("sql_per_request")} -> {new.get("sql_per_request")}'
+                  + (f'  REGRESSION ({", ".join(flags)})' if flags else ''))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--trades', type=int, default=200, help='trades per user')
+    parser.add_argument('--candles', type=int, default=2000, help='1m candles per asset')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--clients', type=int, default=16, help='concurrent keep-alive client connections')
+    parser.add_argument('--duration', type=float, default=10, help='measured seconds per scenario')
+    parser.add_argument('--warmup', type=float, default=2, help='discarded seconds before each scenario')
+    parser.add_argument('--scenarios', nargs='+', choices=tuple(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--postgres-url', help='local PostgreSQL database to run against as well (tables are dropped)')
+    parser.add_argument('--skip-sqlite', action='store_true')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers (WEB_CONCURRENCY)')
+    parser.add_argument('--threads', type=int, default=32, help='threads per gthread worker')
+    parser.add_argument('--worker-class', default='gthread')
+    parser.add_argument('--output', help='JSON results file (default benchmarks/results/api-<time>.json)')
+    parser.add_argument('--compare', help='previous results file to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown before a regression')
+    args = parser.parse_args()
+    args.server = 'gunicorn'
+
+    backends = {}
+    if not args.skip_sqlite:
+        backends['sqlite'] = None
+    if args.postgres_url:
+        backends['postgresql'] = args.postgres_url
+    if not backends:
+        parser.error('nothing to run: --skip-sqlite without --postgres-url')
+
+    workdir = tempfile.mkdtemp(prefix='api-suite-')
+    created_at = datetime.utcnow()
+    results = {
+        'suite': 'api',
+        'created_at': created_at.isoformat(timespec='seconds') + 'Z',
+        'git_commit': git_commit(),
+        'host': {'cpus': os.cpu_count(), 'python': platform.python_version(), 'platform': platform.platform()},
+        'config': {key: getattr(args, key) for key in ('users', 'trades', 'candles', 'seed', 'clients', 'duration',
+                                                       'warmup', 'workers', 'threads', 'worker_class')},
+        'backends': {},
+    }
+    print(f'{os.cpu_count()} cores, {args.clients} clients, {args.warmup:.0f}s warmup + {args.duration:.0f}s '
+          f'per scenario, gunicorn {args.worker_class} x{args.workers}')
+    for label, database_url in backends.items():
+        database_url = database_url or f'sqlite:///{os.path.join(workdir, "app.db")}'
+        results['backends'][label] = run_backend(label, database_url, args, workdir)
+
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results',
+                                         f'api-{created_at.strftime("%Y%m%d-%H%M%S")}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'results: {output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
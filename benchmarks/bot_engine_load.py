@@ -0,0 +1,199 @@
+"""
+Load test for the asyncio bot engine.
+
+Runs N simulated bots (no broker, no database) through AsyncBotEngine and
+reports candle-to-order latency, event loop lag, CPU use and memory. By
+default the process is pinned to one CPU core.
+
+    python benchmarks/bot_engine_load.py --bots 500 --duration 30
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import resource
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_engine import AsyncBotEngine  # noqa: E402
+from trade_latency import PreArmedDecision, latency_tracker  # noqa: E402
+
+PREARM_LEAD = 0.15  # seconds before the close at which decisions are pre-armed
+
+
+class SimulatedBot:
+    """Staged bot with broker latencies replaced by sleeps"""
+
+    def __init__(self, user_id, candle_seconds, order_latency, expiry, signal_rate, prearm=False, history=100):
+        self.user_id = user_id
+        self.candle_seconds = candle_seconds
+        self.order_latency = order_latency
+        self.expiry = expiry
+        self.signal_rate = signal_rate
+        self.closes = list(100 + np.cumsum(np.random.normal(0, 0.1, history)))
+        self.candle_time = None
+        self.closed_candle = None
+        self.prearmed = PreArmedDecision(user_id) if prearm else None
+        self.latencies = []
+        self.candles = 0
+        self.orders = 0
+        self.results = 0
+        self.balance = 1000.0
+
+    @property
+    def candle_closed_at(self):
+        return self.candle_time
+
+    async def wait_candle(self):
+        # Candles close on shared boundaries, like a real feed; arrival is jittered a little
+        now = time.time()
+        close_at = (now // self.candle_seconds + 1) * self.candle_seconds
+        candle = {'from': close_at - self.candle_seconds, 'open': self.closes[-1]}
+        price = self.closes[-1] + random.gauss(0, 0.1)
+
+        if self.prearmed is not None and close_at - now > PREARM_LEAD:
+            await asyncio.sleep(close_at - PREARM_LEAD - now)
+            self.prearmed.arm([], dict(candle, close=price), lambda candles: self.decide(candles[-1]['close']))
+            # The price still moves a little before the close
+            price += random.gauss(0, 0.001)
+            now = time.time()
+
+        await asyncio.sleep(close_at - now + random.uniform(0, 0.05))
+        self.candle_time = close_at
+        self.closed_candle = dict(candle, close=price)
+        self.closes.append(price)
+        del self.closes[0]
+        self.candles += 1
+        return self.closes
+
+    def prearmed_signal(self, closes):
+        return self.prearmed.resolve(self.closed_candle) if self.prearmed is not None else None
+
+    def analyze(self, closes):
+        return self.decide(closes[-1], closes[:-1])
+
+    def decide(self, close, history=None):
+        # Roughly the cost of an RSI + moving average pass over the candle window
+        prices = np.append(self.closes if history is None else history, close)
+        delta = np.diff(prices)
+        gain = delta.clip(min=0)[-14:].mean()
+        loss = -delta.clip(max=0)[-14:].mean()
+        rsi = 100 - 100 / (1 + gain / loss) if loss else 100
+        sma = prices[-20:].mean()
+        if random.random() >= self.signal_rate:
+            return None
+        return {'direction': 'call' if prices[-1] > sma else 'put', 'rsi': rsi}
+
+    async def place_order(self, signal):
+        await asyncio.sleep(random.uniform(*self.order_latency))
+        self.latencies.append(time.time() - self.candle_time)
+        self.orders += 1
+        return {'direction': signal['direction'], 'amount': 2.0}
+
+    async def poll_result(self, order):
+        await asyncio.sleep(self.expiry)
+        self.results += 1
+        self.balance += order['amount'] * (0.85 if random.random() < 0.55 else -1)
+
+    def get_status(self):
+        return {'running': True, 'balance': round(self.balance, 2), 'orders': self.orders}
+
+
+def measure_loop_lag(loop, samples, interval=0.1):
+    """Schedule a probe on the engine loop and record how late it runs"""
+    async def probe():
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            samples.append(loop.time() - start - interval)
+    return asyncio.run_coroutine_threadsafe(probe(), loop)
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+    return {
+        'p50_ms': round(float(p50), 1),
+        'p95_ms': round(float(p95), 1),
+        'p99_ms': round(float(p99), 1),
+        'max_ms': round(max(values) * 1000, 1),
+    }
+
+
+def rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bots', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to run after all bots start')
+    parser.add_argument('--candle-seconds', type=float, default=1.0)
+    parser.add_argument('--expiry', type=float, default=3.0, help='seconds until an order settles')
+    parser.add_argument('--signal-rate', type=float, default=0.3, help='share of candles that produce an order')
+    parser.add_argument('--cpu-workers', type=int, default=1)
+    parser.add_argument('--prearm', action='store_true', help='pre-arm decisions before each candle close')
+    parser.add_argument('--all-cores', action='store_true', help='do not pin the process to one core')
+    args = parser.parse_args()
+
+    if not args.all_cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {min(os.sched_getaffinity(0))})
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+
+    engine = AsyncBotEngine(cpu_workers=args.cpu_workers, max_bots=args.bots)
+    rss_before = rss_mb()
+    bots = [SimulatedBot(user_id, args.candle_seconds, (0.02, 0.08), args.expiry, args.signal_rate, args.prearm)
+            for user_id in range(1, args.bots + 1)]
+
+    started_at = time.time()
+    for bot in bots:
+        if not engine.start_bot(bot.user_id, bot):
+            sys.exit(f'failed to start bot {bot.user_id}')
+    start_seconds = time.time() - started_at
+
+    lag = []
+    probe = measure_loop_lag(engine._loop, lag)
+    cpu_before, wall_before = time.process_time(), time.time()
+    time.sleep(args.duration)
+    cpu_used, wall = time.process_time() - cpu_before, time.time() - wall_before
+
+    status_started = time.perf_counter()
+    for bot in bots:
+        engine.get_status(bot.user_id)
+    status_seconds = time.perf_counter() - status_started
+
+    probe.cancel()
+    stats = engine.stats()
+    stopped_at = time.time()
+    engine.shutdown()
+    stop_seconds = time.time() - stopped_at
+
+    latencies = [value for bot in bots for value in bot.latencies]
+    candles = sum(bot.candles for bot in bots)
+    print(f'bots:                 {args.bots} on {cores} core(s), {threading.active_count()} threads')
+    print(f'start all / stop all: {start_seconds:.2f}s / {stop_seconds:.2f}s')
+    print(f'candles processed:    {candles} ({candles / wall:.0f}/s, expected {args.bots / args.candle_seconds:.0f}/s)')
+    print(f'orders / settled:     {sum(b.orders for b in bots)} / {sum(b.results for b in bots)} '
+          f'(open at end: {stats["open_orders"]})')
+    print(f'candle -> order:      {percentiles(latencies)}')
+    print(f'event loop lag:       {percentiles(lag)}')
+    print(f'cpu:                  {cpu_used / wall:.0%} of one core')
+    print(f'memory:               {rss_mb() - rss_before:.1f} MB for {args.bots} bots '
+          f'(peak RSS {rss_mb():.1f} MB)')
+    print(f'status reads:         {status_seconds / args.bots * 1e6:.1f} us each')
+    report = latency_tracker.report()
+    print(f'pre-armed:            {report["prearmed"]}')
+    for stage, summary in report['stages'].items():
+        print(f'  {stage:<20} {summary}')
+
+
+if __name__ == '__main__':
+    main()
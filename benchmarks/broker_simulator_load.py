@@ -0,0 +1,122 @@
+"""
+Load test against the local broker simulator.
+
+N simulated users each log in, poll candles, check the asset (switching to
+its OTC version when the regular market is closed), buy and collect results
+through broker_simulator, with injected latency and disconnects. Halfway
+through, regular markets are closed to exercise the OTC switch.
+
+    python benchmarks/broker_simulator_load.py --users 2000 --duration 20 --speed 60
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import resource
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from broker_simulator import OTC_SUFFIX, SimulatedMarket  # noqa: E402
+
+
+def run_user(market, user_id, deadline, calls, counts, lock):
+    service = market.service(f'user{user_id}@sim', 'x')
+    rng = random.Random(user_id)
+    asset = rng.choice(list(market.series))
+    pending = []
+    local = {'reconnects': 0, 'otc_switches': 0, 'orders': 0, 'rejected': 0, 'settled': 0, 'profit': 0.0}
+    timings = []
+
+    def timed(fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - started)
+        return result
+
+    while time.time() < deadline:
+        if not service.is_connected:
+            if not timed(service.connect):
+                time.sleep(0.1)
+                continue
+            local['reconnects'] += 1
+
+        candles = timed(service.get_candles, asset, 60, 100)
+        if not candles:
+            continue
+        target = asset
+        if not timed(service.is_asset_open, target):
+            target = asset + OTC_SUFFIX
+            local['otc_switches'] += 1
+        direction = 'call' if candles[-1]['close'] > candles[-20]['close'] else 'put'
+        ok, order_id = timed(service.buy, 2.0, target, direction, 1)
+        if ok:
+            pending.append(order_id)
+            local['orders'] += 1
+        else:
+            local['rejected'] += 1
+
+        for order_id in list(pending):
+            profit = timed(service.check_win, order_id, False)
+            if profit is not None:
+                pending.remove(order_id)
+                local['settled'] += 1
+                local['profit'] += profit
+        # One decision per simulated candle, like a bot on M1
+        time.sleep(market.wall_delay(60) * rng.uniform(0.9, 1.1))
+
+    with lock:
+        calls.extend(timings)
+        for key, value in local.items():
+            counts[key] = counts.get(key, 0) + value
+        counts['logins'] = counts.get('logins', 0) + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--speed', type=float, default=60.0, help='simulated seconds per wall second')
+    parser.add_argument('--latency-ms', type=float, nargs=2, default=(1.0, 5.0), metavar=('MIN', 'MAX'))
+    parser.add_argument('--disconnect-rate', type=float, default=0.001)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    market = SimulatedMarket.synthetic(
+        seed=args.seed,
+        speed=args.speed,
+        latency=(args.latency_ms[0] / 1000, args.latency_ms[1] / 1000),
+        disconnect_rate=args.disconnect_rate,
+    )
+    calls, counts, lock = [], {}, threading.Lock()
+    deadline = time.time() + args.duration
+    closer = threading.Timer(args.duration / 2, market.set_regular_markets, args=(False,))
+    closer.start()
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        for user_id in range(args.users):
+            pool.submit(run_user, market, user_id, deadline, calls, counts, lock)
+    wall = time.time() - started
+
+    p50, p95, p99 = (np.percentile(calls, [50, 95, 99]) * 1000) if calls else (0, 0, 0)
+    stats = market.stats()
+    print(f'users:             {args.users} at {args.speed:g}x, {wall:.1f}s')
+    print(f'broker calls:      {len(calls)} ({len(calls) / wall:.0f}/s), '
+          f'p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms')
+    print(f'orders / settled:  {counts.get("orders", 0)} / {counts.get("settled", 0)} '
+          f'(rejected {counts.get("rejected", 0)}, open at end {stats["open_orders"]})')
+    print(f'wins/losses/ties:  {stats["wins"]} / {stats["losses"]} / {stats["ties"]}, '
+          f'profit {counts.get("profit", 0.0):.2f}')
+    print(f'disconnects:       {stats["disconnects"]} (reconnects {counts.get("reconnects", 0) - args.users})')
+    print(f'OTC switches:      {counts.get("otc_switches", 0)}')
+    print(f'peak RSS:          {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Login burst benchmark.
+
+Creates users in a throwaway SQLite database and fires a burst of
+concurrent POST /api/auth/login requests through the Flask app, each from
+its own client IP. Clients honour Retry-After on a 429 (with jitter), up to
+--retries times. Reports throughput, end-to-end latency percentiles and the
+final status codes, with the bounded hashing pool (default) or with hashing
+on the request threads (--inline, the old behaviour).
+
+    python benchmarks/login_burst.py --requests 400 --concurrency 64
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=64, help='simultaneous clients (request threads)')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--retries', type=int, default=20, help='retries of a 429 per client')
+    parser.add_argument('--inline', action='store_true', help='hash on the request threads, no queue bound')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='login-burst-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "app.db")}'
+    os.environ['RATE_LIMIT_DB_PATH'] = os.path.join(workdir, 'rate-limits.db')
+    os.environ['REVOCATION_DB_PATH'] = os.path.join(workdir, 'revoked.db')
+    os.environ.setdefault('LOG_FILE', os.path.join(workdir, 'app.log'))
+    # Every request is its own IP and users are spread out, so the rate limits stay out of the way
+    os.environ.setdefault('MAX_LOGIN_ATTEMPTS', str(args.requests))
+
+    from app import create_app
+    from database import db
+    from models import User
+    from login_guard import login_guard, PasswordHasher
+    from werkzeug.security import generate_password_hash
+
+    if args.inline:
+        login_guard.hasher = PasswordHasher(workers=args.concurrency, queue_size=args.concurrency,
+                                            timeout=3600)
+
+    app = create_app('cli')
+    password_hash = generate_password_hash('secret123')
+    with app.app_context():
+        db.create_all()
+        db.session.add_all(User(name=f'u{i}', email=f'u{i}@bench', password_hash=password_hash,
+                                iq_email='x', iq_password='x') for i in range(args.users))
+        db.session.commit()
+
+    local = threading.local()
+    latencies, statuses, lock = [], Counter(), threading.Lock()
+    attempts, per_attempt = Counter(), []
+
+    def login(i):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        started = time.perf_counter()
+        for attempt in range(args.retries + 1):
+            sent = time.perf_counter()
+            response = client.post(
+                '/api/auth/login',
+                json={'email': f'u{i % args.users}@bench', 'password': 'secret123'},
+                environ_base={'REMOTE_ADDR': f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}'})
+            with lock:
+                per_attempt.append(time.perf_counter() - sent)
+            if response.status_code != 429:
+                break
+            time.sleep(float(response.headers.get('Retry-After', 1)) * random.uniform(0.5, 1.5))
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append((elapsed, response.status_code))
+            statuses[response.status_code] += 1
+            attempts['total'] += attempt + 1
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(login, range(args.requests)))
+    wall = time.time() - started
+
+    ok = [elapsed for elapsed, status in latencies if status == 200]
+
+    def summary(values):
+        if not values:
+            return '-'
+        p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+        return f'p50 {p50:.0f} ms, p95 {p95:.0f} ms, p99 {p99:.0f} ms, max {max(values) * 1000:.0f} ms'
+
+    print(f'mode:        {"inline hashing" if args.inline else "bounded pool"} '
+          f'({login_guard.hasher._executor._max_workers} hash threads), {os.cpu_count()} cores')
+    print(f'requests:    {args.requests} from {args.concurrency} concurrent clients in {wall:.2f}s')
+    print(f'statuses:    {dict(statuses)} after {attempts["total"]} attempts '
+          f'({login_guard.hasher.counters["rejected"]} rejected by the hashing queue)')
+    print(f'throughput:  {len(ok) / wall:.1f} logins/s')
+    print(f'200 latency: {summary(ok)} (including client retries)')
+    print(f'per request: {summary(per_attempt)} (time a server thread is busy)')
+
+
+if __name__ == '__main__':
+    main()
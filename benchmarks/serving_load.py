@@ -0,0 +1,219 @@
+"""
+HTTP load test of the serving setup.
+
+Seeds a throwaway database (or --database-url), starts the app the way it is
+deployed (gunicorn with gunicorn.conf.py, or the threaded development server
+with --server werkzeug) and keeps --clients keep-alive connections busy with
+a mix of dashboard API reads for --duration seconds. Reports requests/s,
+latency percentiles, status codes and, from /api/health, the database
+connections opened and checked out (now and at peak) by each worker.
+
+    python benchmarks/serving_load.py --workers 2 --threads 32 --clients 64 --duration 15
+    python benchmarks/serving_load.py --database-url postgresql://... --workers 4
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from collections import Counter
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ENDPOINTS = (
+    '/api/user/profile',
+    '/api/config',
+    '/api/trades?per_page=20',
+    '/api/statistics',
+    '/api/dashboard/stats',
+    '/api/bot/status',
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def seed(users, trades_per_user):
+    """Create users with configs and trades; returns their access tokens"""
+    from datetime import datetime, timedelta
+    from flask_jwt_extended import create_access_token
+    from app import create_app
+    from database import db
+    from models import User, TradingConfig, TradeHistory
+
+    app = create_app('cli')
+    rng = random.Random(7)
+    with app.app_context():
+        db.create_all()
+        accounts = [User(name=f'u{i}', email=f'u{i}@load', password_hash='x') for i in range(users)]
+        db.session.add_all(accounts)
+        db.session.flush()
+        now = datetime.utcnow()
+        for user in accounts:
+            db.session.add(TradingConfig(user_id=user.id))
+            for n in range(trades_per_user):
+                win = rng.random() < 0.55
+                db.session.add(TradeHistory(
+                    user_id=user.id, asset='EURUSD', direction=rng.choice(('call', 'put')), amount=10,
+                    result='win' if win else 'loss', profit=8.7 if win else -10.0, payout_percentage=87,
+                    timestamp=now - timedelta(minutes=n)))
+        db.session.commit()
+        return [create_access_token(identity=str(user.id)) for user in accounts]
+
+
+def start_server(args, port, env):
+    if args.server == 'gunicorn':
+        # gunicorn turns 'sync' into gthread when threads > 1
+        threads = args.threads if args.worker_class == 'gthread' else 1
+        env.update(PORT=str(port), WEB_CONCURRENCY=str(args.workers), GUNICORN_THREADS=str(threads),
+                   GUNICORN_WORKER_CLASS=args.worker_class)
+        # No bots run during the benchmarks; external mode lets gunicorn start more than one worker
+        env.setdefault('BOT_WORKER_MODE', 'external')
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:application']
+    else:
+        command = [sys.executable, '-c',
+                   'from app import create_app, socketio; '
+                   f"socketio.run(create_app('web'), host='127.0.0.1', port={port}, "
+                   'allow_unsafe_werkzeug=True)']
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'server exited with code {process.returncode}')
+        try:
+            health(port)
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit('server did not come up in 60s')
+
+
+def health(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    try:
+        conn.request('GET', '/api/health')
+        return json.loads(conn.getresponse().read())
+    finally:
+        conn.close()
+
+
+def worker_pools(port, workers):
+    """/api/health of each worker, polled on fresh connections until all have answered"""
+    seen = {}
+    for _ in range(50 * workers):
+        stats = health(port)['db_pool']
+        seen[stats['pid']] = stats
+        if len(seen) >= workers:
+            break
+    return seen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=('gunicorn', 'werkzeug'), default='gunicorn')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers (WEB_CONCURRENCY)')
+    parser.add_argument('--threads', type=int, default=32, help='threads per gthread worker')
+    parser.add_argument('--worker-class', default='gthread', help='gthread, gevent or eventlet')
+    parser.add_argument('--clients', type=int, default=64, help='concurrent keep-alive client connections')
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--trades', type=int, default=200, help='trades per user')
+    parser.add_argument('--database-url', help='defaults to a temporary SQLite file')
+    args = parser.parse_args()
+    if args.server == 'werkzeug':
+        args.workers = 1
+
+    workdir = tempfile.mkdtemp(prefix='serving-load-')
+    os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{os.path.join(workdir, "app.db")}'
+    for name, filename in (('RATE_LIMIT_DB_PATH', 'rate-limits.db'), ('REVOCATION_DB_PATH', 'revoked.db'),
+                           ('LEADER_DB_PATH', 'leader.db'), ('LOG_FILE', 'app.log')):
+        os.environ[name] = os.path.join(workdir, filename)
+    os.environ.setdefault('RATE_LIMIT_PER_MINUTE', '1000000')
+
+    tokens = seed(args.users, args.trades)
+    port = free_port()
+    server = start_server(args, port, dict(os.environ))
+
+    lock = threading.Lock()
+    latencies, statuses, errors = [], Counter(), Counter()
+    deadline = time.time() + args.duration
+
+    def client(index):
+        rng = random.Random(index)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local_latencies, local_statuses = [], Counter()
+        while time.time() < deadline:
+            path = rng.choice(ENDPOINTS)
+            headers = {'Authorization': f'Bearer {rng.choice(tokens)}'}
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException) as e:
+                with lock:
+                    errors[type(e).__name__] += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            local_latencies.append(time.perf_counter() - started)
+            local_statuses[response.status] += 1
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+
+    try:
+        started = time.time()
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.time() - started
+        pools = worker_pools(port, args.workers)
+        server_connections = None
+        if os.environ['DATABASE_URL'].startswith('postgres'):
+            from sqlalchemy import create_engine, text
+            engine = create_engine(os.environ['DATABASE_URL'].replace('postgres://', 'postgresql://', 1))
+            with engine.connect() as conn:
+                server_connections = conn.execute(text(
+                    'SELECT count(*) FROM pg_stat_activity WHERE datname = current_database()')).scalar() - 1
+            engine.dispose()
+    finally:
+        server.terminate()
+        server.wait(30)
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000 if latencies else (0, 0, 0)
+    mode = (f'gunicorn {args.worker_class} x{args.workers}'
+            + (f' ({args.threads} threads)' if args.worker_class == 'gthread' else '')
+            if args.server == 'gunicorn' else 'werkzeug threaded dev server')
+    print(f'server:      {mode}, {os.cpu_count()} cores, {os.environ["DATABASE_URL"].split(":")[0]}')
+    print(f'load:        {args.clients} keep-alive clients for {wall:.1f}s')
+    print(f'throughput:  {len(latencies) / wall:.1f} req/s ({len(latencies)} requests)')
+    print(f'latency:     p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms')
+    print(f'statuses:    {dict(statuses)}' + (f', client errors {dict(errors)}' if errors else ''))
+    for pid, stats in sorted(pools.items()):
+        print(f'worker {pid}: {stats["open"]} connections open ({stats["opened"]} opened), '
+              f'{stats["checked_out"]} checked out, peak {stats["peak_checked_out"]}, '
+              f'{stats["checkouts"]} checkouts')
+    if server_connections is not None:
+        print(f'postgresql:  {server_connections} server connections from the app')
+
+
+if __name__ == '__main__':
+    main()
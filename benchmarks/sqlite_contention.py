@@ -0,0 +1,187 @@
+"""
+Concurrent read/write benchmark of the SQLite database.
+
+Runs --processes processes (like gunicorn workers plus the bot worker)
+against one SQLite file. Each process has --writers threads inserting one
+trade per transaction, the way bots record trades, and --readers threads
+running dashboard-style aggregates. The run is repeated with SQLite's
+defaults (rollback journal, no writer lock) and with sqlite_profile's
+performance mode. Reports throughput, latency percentiles and "database is
+locked" errors for each mode.
+
+    python benchmarks/sqlite_contention.py --processes 3 --writers 4 --readers 8 --duration 10
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = {'default': 'false', 'performance': 'true'}
+
+
+def child_app(args):
+    from app import create_app
+
+    return create_app('cli')
+
+
+def seed(args):
+    from datetime import datetime, timedelta
+    from database import db
+    from models import User, TradeHistory
+
+    app = child_app(args)
+    rng = random.Random(1)
+    with app.app_context():
+        db.create_all()
+        users = [User(name=f'u{i}', email=f'u{i}@bench', password_hash='x') for i in range(args.users)]
+        db.session.add_all(users)
+        db.session.flush()
+        now = datetime.utcnow()
+        db.session.add_all(TradeHistory(
+            user_id=users[i % args.users].id, asset='EURUSD', direction='call', amount=10,
+            result='win' if rng.random() < 0.55 else 'loss', profit=rng.choice((8.7, -10.0)),
+            timestamp=now - timedelta(seconds=i)) for i in range(args.users * 100))
+        db.session.commit()
+
+
+def load(args):
+    from datetime import datetime
+    from sqlalchemy import func
+    from sqlalchemy.exc import OperationalError
+    from database import db
+    from models import TradeHistory
+
+    app = child_app(args)
+    deadline = time.time() + args.duration
+    results = {'write': [], 'read': [], 'write_errors': 0, 'read_errors': 0}
+    lock = threading.Lock()
+
+    def writer(index):
+        rng = random.Random(os.getpid() * 100 + index)
+        latencies, errors = [], 0
+        with app.app_context():
+            while time.time() < deadline:
+                started = time.perf_counter()
+                try:
+                    db.session.add(TradeHistory(
+                        user_id=rng.randint(1, args.users), asset='EURUSD', direction='put', amount=10,
+                        result='loss', profit=-10.0, timestamp=datetime.utcnow()))
+                    db.session.commit()
+                    latencies.append(time.perf_counter() - started)
+                except OperationalError:
+                    db.session.rollback()
+                    errors += 1
+        with lock:
+            results['write'].extend(latencies)
+            results['write_errors'] += errors
+
+    def reader(index):
+        rng = random.Random(os.getpid() * 1000 + index)
+        latencies, errors = [], 0
+        with app.app_context():
+            while time.time() < deadline:
+                user_id = rng.randint(1, args.users)
+                started = time.perf_counter()
+                try:
+                    db.session.query(func.count(TradeHistory.id), func.sum(TradeHistory.profit)).filter(
+                        TradeHistory.user_id == user_id).one()
+                    db.session.query(TradeHistory).filter(TradeHistory.user_id == user_id).order_by(
+                        TradeHistory.timestamp.desc()).limit(20).all()
+                    latencies.append(time.perf_counter() - started)
+                except OperationalError:
+                    errors += 1
+                finally:
+                    db.session.rollback()
+        with lock:
+            results['read'].extend(latencies)
+            results['read_errors'] += errors
+
+    threads = ([threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+               + [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)])
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    from sqlite_profile import writer as serialized_writer
+    results['writer_lock'] = serialized_writer.stats() if serialized_writer else None
+    with app.app_context():
+        results['journal_mode'] = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+    print(json.dumps(results))
+
+
+def run_mode(args, mode, workdir):
+    env = dict(os.environ,
+               DATABASE_URL=f'sqlite:///{os.path.join(workdir, f"{mode}.db")}',
+               SQLITE_PERFORMANCE_MODE=MODES[mode],
+               LOG_LEVEL='WARNING',
+               LOG_FILE=os.path.join(workdir, 'app.log'),
+               RATE_LIMIT_DB_PATH=os.path.join(workdir, 'rate-limits.db'),
+               REVOCATION_DB_PATH=os.path.join(workdir, 'revoked.db'),
+               LEADER_DB_PATH=os.path.join(workdir, 'leader.db'))
+    base = [sys.executable, os.path.abspath(__file__), '--users', str(args.users), '--writers', str(args.writers),
+            '--readers', str(args.readers), '--duration', str(args.duration)]
+    subprocess.run(base + ['--role', 'seed'], env=env, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    started = time.time()
+    children = [subprocess.Popen(base + ['--role', 'load'], env=env, cwd=ROOT, stdout=subprocess.PIPE, text=True)
+                for _ in range(args.processes)]
+    outputs = [json.loads(child.communicate()[0].strip().splitlines()[-1]) for child in children]
+    wall = time.time() - started
+
+    writes = [value for output in outputs for value in output['write']]
+    reads = [value for output in outputs for value in output['read']]
+
+    def summary(values):
+        if not values:
+            return '-'
+        p50, p99 = np.percentile(values, [50, 99]) * 1000
+        return f'p50 {p50:.1f} ms, p99 {p99:.1f} ms, max {max(values) * 1000:.0f} ms'
+
+    print(f'{mode} (journal_mode={outputs[0]["journal_mode"]}):')
+    print(f'  writes: {len(writes) / wall:8.1f}/s  {summary(writes)}, '
+          f'{sum(o["write_errors"] for o in outputs)} "database is locked"')
+    print(f'  reads:  {len(reads) / wall:8.1f}/s  {summary(reads)}, '
+          f'{sum(o["read_errors"] for o in outputs)} "database is locked"')
+    locks = [o['writer_lock'] for o in outputs if o['writer_lock']]
+    if locks:
+        print(f'  writer lock: max wait {max(lock["max_wait_ms"] for lock in locks):.0f} ms, '
+              f'{sum(lock["timeouts"] for lock in locks)} timeouts')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=3)
+    parser.add_argument('--writers', type=int, default=4, help='writer threads per process')
+    parser.add_argument('--readers', type=int, default=8, help='reader threads per process')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--mode', choices=('both',) + tuple(MODES), default='both')
+    parser.add_argument('--role', choices=('main', 'seed', 'load'), default='main', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.role == 'seed':
+        return seed(args)
+    if args.role == 'load':
+        return load(args)
+
+    workdir = tempfile.mkdtemp(prefix='sqlite-contention-')
+    print(f'{args.processes} processes x ({args.writers} writers + {args.readers} readers), '
+          f'{args.duration:.0f}s per mode, {os.cpu_count()} cores')
+    for mode in (MODES if args.mode == 'both' else (args.mode,)):
+        run_mode(args, mode, workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Synthetic data generator for benchmarks.
+
+Recreates the schema of --database-url (SQLite file or a local PostgreSQL
+database; its tables are dropped) and fills it with --users users, each with
+a trading config, IQ Option credentials for the broker simulator and --trades
+trades spread over the last --days days, plus --candles 1m MarketData candles
+per asset from broker_simulator's seeded random walk. The same --seed gives
+the same rows, so runs on different backends or commits compare like for
+like. Every user's password is --password.
+
+    python benchmarks/synthetic_data.py --database-url sqlite:////tmp/bench.db --users 100 --trades 500
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = 'bench123'
+BATCH_SIZE = 5000
+PATTERNS = ('hammer', 'doji', 'engulfing', 'shooting_star', 'morning_star')
+
+
+def _insert(session, model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        session.execute(model.__table__.insert(), rows[start:start + BATCH_SIZE])
+
+
+def user_rows(count, password_hash):
+    return [dict(name=f'Bench {i}', email=f'bench{i}@example.com', password_hash=password_hash,
+                 created_at=datetime.utcnow(), is_active=True, iq_email=f'bench{i}@sim', iq_password='sim',
+                 account_type='PRACTICE') for i in range(count)]
+
+
+def trade_rows(rng, user_id, count, assets, now, days):
+    rows = []
+    for _ in range(count):
+        asset = rng.choice(assets)
+        amount = rng.choice((5.0, 10.0, 10.0, 20.0))
+        level = 0 if rng.random() < 0.8 else rng.randint(1, 3)
+        amount *= 2.2 ** level
+        outcome = rng.random()
+        payout = rng.choice((80.0, 85.0, 87.0))
+        if outcome < 0.02:
+            result, profit = 'tie', 0.0
+        elif outcome < 0.57:
+            result, profit = 'win', round(amount * payout / 100, 2)
+        else:
+            result, profit = 'loss', -amount
+        entry = 150.0 if asset.endswith('JPY') else 1.1
+        rows.append(dict(
+            user_id=user_id, timestamp=now - timedelta(seconds=rng.uniform(0, days * 86400)),
+            asset=asset, direction=rng.choice(('call', 'put')), amount=amount,
+            expiration_time=rng.choice((60, 300)), entry_price=entry, exit_price=entry * rng.uniform(0.999, 1.001),
+            result=result, profit=profit, payout_percentage=payout,
+            martingale_level=level, is_martingale=level > 0,
+            signal_strength=rng.random(), rsi_value=rng.uniform(10, 90), macd_value=rng.gauss(0, 0.001),
+            macd_signal_value=rng.gauss(0, 0.001), ma_short_value=entry, ma_long_value=entry,
+            aroon_up=rng.uniform(0, 100), aroon_down=rng.uniform(0, 100),
+            patterns_detected=json.dumps(rng.sample(PATTERNS, rng.randint(0, 2))),
+            ml_confidence=rng.uniform(0.5, 0.95)))
+    return rows
+
+
+def candle_rows(assets, count, seed, now):
+    from broker_simulator import SimulatedMarket
+
+    market = SimulatedMarket.synthetic(assets=assets, candles=count, seed=seed)
+    first = now.replace(second=0, microsecond=0) - timedelta(minutes=count)
+    rows = []
+    for asset, series in market.series.items():
+        for i in range(count):
+            rows.append(dict(asset=asset, timestamp=first + timedelta(minutes=i), timeframe='1m',
+                             open_price=float(series['open'][i]), high_price=float(series['high'][i]),
+                             low_price=float(series['low'][i]), close_price=float(series['close'][i]),
+                             volume=float(series['volume'][i])))
+    return rows
+
+
+def generate(database_url, users=50, trades=200, candles=2000, seed=0, days=30, password=PASSWORD, assets=None):
+    """Recreate the schema at ``database_url`` and seed it; returns row counts and timings"""
+    from werkzeug.security import generate_password_hash
+    from app import create_app
+    from database import db, engine_options
+    from broker_simulator import DEFAULT_ASSETS
+    from models import User, TradingConfig, TradeHistory, MarketData
+
+    if database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+    assets = list(assets or DEFAULT_ASSETS)
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    started = time.perf_counter()
+
+    app = create_app('cli', config={'SQLALCHEMY_DATABASE_URI': database_url,
+                                    'SQLALCHEMY_ENGINE_OPTIONS': engine_options(database_url)})
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        # One hash for everyone: hashing is deliberately slow
+        _insert(db.session, User, user_rows(users, generate_password_hash(password)))
+        user_ids = [row[0] for row in db.session.query(User.id).order_by(User.id)]
+        _insert(db.session, TradingConfig, [dict(user_id=user_id) for user_id in user_ids])
+        for user_id in user_ids:
+            _insert(db.session, TradeHistory, trade_rows(rng, user_id, trades, assets, now, days))
+        _insert(db.session, MarketData, candle_rows(assets, candles, seed, now))
+        db.session.commit()
+        db.engine.dispose()
+
+    return {
+        'database': database_url.split(':')[0],
+        'users': users,
+        'trades': users * trades,
+        'candles': len(assets) * candles,
+        'seed': seed,
+        'user_ids': user_ids,
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--trades', type=int, default=200, help='trades per user')
+    parser.add_argument('--candles', type=int, default=2000, help='1m candles per asset')
+    parser.add_argument('--days', type=int, default=30, help='trades are spread over the last N days')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--password', default=PASSWORD)
+    args = parser.parse_args()
+
+    summary = generate(args.database_url, users=args.users, trades=args.trades, candles=args.candles,
+                       seed=args.seed, days=args.days, password=args.password)
+    summary.pop('user_ids')
+    print(json.dumps(summary))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+"""
+Registry of per-user trading bots sharing one bounded worker pool.
+
+Bots that implement ``run_cycle()`` are driven by the manager: ``setup()``
+(optional) runs once when the bot starts, ``run_cycle()`` runs every
+``cycle_interval`` seconds on the shared pool and ``teardown()`` (optional)
+runs when it stops. A bot is never run concurrently with itself, and its
+``get_status()`` snapshot is taken after each cycle so status reads are a dict
+lookup. Bots without ``run_cycle()`` keep their own ``start()``/``stop()``;
+once their thread ends on its own (or their status stops reporting
+``running``) the next lookup unregisters them.
+"""
+
+import os
+import heapq
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+BOT_WORKER_THREADS = int(os.getenv('BOT_WORKER_THREADS', 16))
+MAX_BOTS = int(os.getenv('MAX_BOTS', 500))
+DEFAULT_CYCLE_INTERVAL = float(os.getenv('BOT_CYCLE_INTERVAL', 1.0))
+MAX_CONSECUTIVE_ERRORS = int(os.getenv('BOT_MAX_CONSECUTIVE_ERRORS', 10))
+
+STOPPED_STATUS = {'running': False, 'balance': 0}
+
+
+def threaded_bot_ended(entry, read_status):
+    """True once a start()/stop() bot's thread has ended without stop_bot (target reached, crash)"""
+    thread = getattr(entry.bot, 'thread', None)
+    if isinstance(thread, threading.Thread):
+        return not thread.is_alive()
+    return read_status(entry).get('running') is False
+
+
+class ManagedBot:
+    """Lifecycle state of one user's bot inside the manager"""
+    __slots__ = ('user_id', 'bot', 'pooled', 'interval', 'status', 'in_flight',
+                 'stopping', 'errors', 'started_at')
+
+    def __init__(self, user_id, bot):
+        self.user_id = user_id
+        self.bot = bot
+        self.pooled = callable(getattr(bot, 'run_cycle', None))
+        self.interval = float(getattr(bot, 'cycle_interval', DEFAULT_CYCLE_INTERVAL))
+        self.status = {}
+        self.in_flight = False
+        self.stopping = False
+        self.errors = 0
+        self.started_at = time.time()
+
+
+class BotManager:
+    """Per-user bot registry with O(1) lookup by user_id"""
+
+    remote = False
+
+    def __init__(self, max_workers=BOT_WORKER_THREADS, max_bots=MAX_BOTS):
+        self.max_bots = max_bots
+        self._bots = {}
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        self._queue = []  # (due_time, seq, ManagedBot) for pooled bots
+        self._seq = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bot-worker')
+        self._dispatcher = None
+        self._shutdown = False
+
+    # Lifecycle
+
+    def start_bot(self, user_id, bot):
+        """Register and start a bot for a user.
+
+        Returns False if the user already has a running bot, the manager is
+        full or the bot fails to start.
+        """
+        with self._lock:
+            self._prune(user_id)
+            if user_id in self._bots:
+                logger.warning(f"Bot already running for user {user_id}")
+                return False
+            if len(self._bots) >= self.max_bots:
+                logger.error(f"Bot limit reached ({self.max_bots}), cannot start bot for user {user_id}")
+                return False
+            entry = ManagedBot(user_id, bot)
+            # Reserve the slot so concurrent starts for the same user fail fast
+            self._bots[user_id] = entry
+
+        try:
+            if entry.pooled:
+                setup = getattr(bot, 'setup', None)
+                started = (setup() if callable(setup) else True) is not False
+            else:
+                started = bool(bot.start())
+        except Exception as e:
+            logger.error(f"Error starting bot for user {user_id}: {str(e)}")
+            started = False
+
+        with self._lock:
+            if not started:
+                self._bots.pop(user_id, None)
+                return False
+            entry.status = self._read_status(entry)
+            if entry.pooled:
+                self._ensure_dispatcher()
+                self._schedule(entry, time.time())
+
+        logger.info(f"Bot started for user {user_id} ({'pooled' if entry.pooled else 'threaded'})")
+        return True
+
+    def stop_bot(self, user_id):
+        """Stop and unregister a user's bot. Returns False if none was running."""
+        with self._lock:
+            entry = self._bots.pop(user_id, None)
+            if entry is None:
+                return False
+            entry.stopping = True
+            # A cycle in progress tears the bot down itself when it returns
+            deferred = entry.in_flight
+
+        if entry.pooled:
+            if not deferred:
+                self._teardown(entry)
+        else:
+            try:
+                entry.bot.stop()
+            except Exception as e:
+                logger.error(f"Error stopping bot for user {user_id}: {str(e)}")
+
+        logger.info(f"Bot stopped for user {user_id}")
+        return True
+
+    def shutdown(self):
+        """Stop every bot and the worker pool"""
+        with self._lock:
+            self._shutdown = True
+            user_ids = list(self._bots)
+            self._wakeup.notify_all()
+        for user_id in user_ids:
+            self.stop_bot(user_id)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # Lookups
+
+    def is_running(self, user_id):
+        return self._prune(user_id) is not None
+
+    def get_bot(self, user_id):
+        """The user's bot instance, or None"""
+        entry = self._prune(user_id)
+        return entry.bot if entry else None
+
+    def running_user_ids(self):
+        with self._lock:
+            for user_id in list(self._bots):
+                self._prune(user_id)
+            return list(self._bots)
+
+    def get_status(self, user_id):
+        """Full status of the user's bot (same shape as TradingBot.get_status)"""
+        entry = self._prune(user_id)
+        if entry is None:
+            return dict(STOPPED_STATUS)
+        if entry.pooled:
+            return dict(entry.status)
+        return self._read_status(entry)
+
+    def get_bot_status(self, user_id):
+        """Short status of the user's bot (same shape as TradingBot.get_bot_status)"""
+        entry = self._prune(user_id)
+        if entry is None:
+            return dict(STOPPED_STATUS)
+        if not entry.pooled and hasattr(entry.bot, 'get_bot_status'):
+            return entry.bot.get_bot_status(user_id)
+        return self.get_status(user_id)
+
+    def stats(self):
+        """Counts for monitoring"""
+        with self._lock:
+            for user_id in list(self._bots):
+                self._prune(user_id)
+            return {
+                'engine': 'threaded',
+                'bots': len(self._bots),
+                'pooled': sum(1 for entry in self._bots.values() if entry.pooled),
+                'in_flight': sum(1 for entry in self._bots.values() if entry.in_flight),
+                'queued': len(self._queue),
+            }
+
+    def _prune(self, user_id):
+        """The user's registered entry, after dropping a threaded bot that ended on its own"""
+        entry = self._bots.get(user_id)
+        # An empty status means start_bot is still starting it
+        if (entry is None or entry.pooled or entry.stopping or not entry.status
+                or not threaded_bot_ended(entry, self._read_status)):
+            return entry
+        with self._lock:
+            if self._bots.get(user_id) is entry:
+                self._bots.pop(user_id)
+                entry.stopping = True
+                logger.info(f"Bot for user {user_id} finished")
+        return None
+
+    # Pooled execution
+
+    def _read_status(self, entry):
+        try:
+            status = entry.bot.get_status() if hasattr(entry.bot, 'get_status') else {}
+        except Exception as e:
+            logger.error(f"Error reading bot status for user {entry.user_id}: {str(e)}")
+            status = dict(entry.status)
+        status.setdefault('running', True)
+        return status
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name='bot-dispatcher', daemon=True)
+            self._dispatcher.start()
+
+    def _schedule(self, entry, due):
+        self._seq += 1
+        heapq.heappush(self._queue, (due, self._seq, entry))
+        self._wakeup.notify()
+
+    def _dispatch_loop(self):
+        """Submit each pooled bot's cycle to the pool when it is due"""
+        with self._lock:
+            while not self._shutdown:
+                if not self._queue:
+                    self._wakeup.wait()
+                    continue
+                due, _, entry = self._queue[0]
+                delay = due - time.time()
+                if delay > 0:
+                    self._wakeup.wait(delay)
+                    continue
+                heapq.heappop(self._queue)
+                if entry.stopping or entry.in_flight or self._bots.get(entry.user_id) is not entry:
+                    continue
+                entry.in_flight = True
+                self._executor.submit(self._run_cycle, entry)
+
+    def _teardown(self, entry):
+        teardown = getattr(entry.bot, 'teardown', None)
+        if callable(teardown):
+            try:
+                teardown()
+            except Exception as e:
+                logger.error(f"Error tearing down bot for user {entry.user_id}: {str(e)}")
+
+    def _run_cycle(self, entry):
+        try:
+            keep_running = entry.bot.run_cycle() is not False
+            entry.errors = 0
+        except Exception as e:
+            entry.errors += 1
+            logger.error(f"Bot cycle error for user {entry.user_id} ({entry.errors}): {str(e)}")
+            keep_running = entry.errors < MAX_CONSECUTIVE_ERRORS
+        entry.status = self._read_status(entry)
+
+        with self._lock:
+            entry.in_flight = False
+            registered = self._bots.get(entry.user_id) is entry
+            if keep_running and registered and not entry.stopping:
+                self._schedule(entry, time.time() + entry.interval)
+                return
+            # The bot finished on its own (take profit/stop loss), kept failing or was stopped mid-cycle
+            if registered:
+                self._bots.pop(entry.user_id)
+            entry.stopping = True
+
+        self._teardown(entry)
+        if registered:
+            logger.info(f"Bot for user {entry.user_id} finished")
+
+
+def create_bot_manager(engine=None):
+    """Bot registry for the configured BOT_ENGINE ('threaded' or 'asyncio')"""
+    engine = (engine or os.getenv('BOT_ENGINE', 'threaded')).lower()
+    if engine == 'asyncio':
+        from async_engine import AsyncBotEngine
+        return AsyncBotEngine()
+    if engine != 'threaded':
+        logger.warning(f"Unknown BOT_ENGINE '{engine}', using threaded")
+    return BotManager()
+
+
+def create_bot(user_id, config, app):
+    """A bot for the user of the configured BOT_IMPLEMENTATION. Needs an app context.
+
+    ``trading_bot`` (default) is the parent project's
+    ``src.services.trading_bot.TradingBot``; ``strategy`` is the in-tree
+    ``strategy_bot.StrategyBot``.
+    """
+    implementation = os.getenv('BOT_IMPLEMENTATION', 'trading_bot').lower()
+    if implementation == 'strategy':
+        from models import User
+        from strategy_bot import StrategyBot
+        user = User.query.get(user_id)
+        return StrategyBot(user_id, user.iq_email, user.iq_password)
+    if implementation != 'trading_bot':
+        logger.warning(f"Unknown BOT_IMPLEMENTATION '{implementation}', using trading_bot")
+    from src.services.trading_bot import TradingBot
+    return TradingBot(user_id, config, app=app)
+
+
+def _default_bot_manager():
+    """In-process registry, or a client of the bot worker when BOT_WORKER_MODE=external"""
+    if os.getenv('BOT_WORKER_MODE', 'inprocess').lower() == 'external':
+        from bot_worker import BotWorkerClient
+        return BotWorkerClient()
+    return create_bot_manager()
+
+
+bot_manager = _default_bot_manager()
@@ -0,0 +1,465 @@
+"""
+Out-of-process bot worker.
+
+With BOT_WORKER_MODE=external the web processes stop running bots. One
+``python bot_worker.py`` process owns every bot (through a BotManager or
+AsyncBotEngine), the web workers send it start/stop commands over a local
+socket (multiprocessing.connection) and read bot status from a shared-memory
+status board. Status reads never talk to the worker, so they are not held up
+by bot computation.
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import struct
+import logging
+import threading
+from multiprocessing import shared_memory, resource_tracker
+from multiprocessing.connection import Listener, Client
+
+import numpy as np
+
+from bot_manager import STOPPED_STATUS, MAX_BOTS, create_bot_manager, create_bot
+from strategy import strategies
+from trade_latency import latency_tracker
+
+logger = logging.getLogger(__name__)
+
+WORKER_ADDRESS = os.getenv(
+    'BOT_WORKER_ADDRESS',
+    '/tmp/iqbot-worker.sock' if hasattr(socket, 'AF_UNIX') else 'localhost:6100'
+)
+STATUS_BOARD_NAME = os.getenv('BOT_STATUS_BOARD', 'iqbot_status')
+STATUS_PUBLISH_SECONDS = float(os.getenv('BOT_STATUS_PUBLISH_SECONDS', 0.5))
+COMMAND_TIMEOUT = float(os.getenv('BOT_WORKER_TIMEOUT', 30))
+
+SLOT_BYTES = 2048
+_BOARD_HEADER = struct.Struct('<III')  # magic, slot count, live flag
+_LIVE_OFFSET = 8
+_SLOT_HEADER = struct.Struct('<II')  # sequence, payload length
+_BOARD_MAGIC = 0x42545354
+
+
+def _address(value):
+    """'host:port' -> TCP address tuple, anything else is a Unix socket path"""
+    if ':' in value and not value.startswith('/'):
+        host, port = value.rsplit(':', 1)
+        return host, int(port)
+    return value
+
+
+def _authkey():
+    return os.getenv('SECRET_KEY', 'dev-secret-key').encode()
+
+
+class StatusBoard:
+    """Shared-memory table of user_id -> latest bot status (JSON).
+
+    Layout: header, one int64 user_id per slot, then the slots. There is a
+    single writer (the worker); readers take no lock. Each slot has a sequence
+    number that is odd while it is being written (a seqlock), so a reader
+    retries instead of returning a torn status. The worker clears the header's
+    live flag before it unlinks a board (on shutdown, or when a restarted
+    worker replaces a crashed one's), telling readers still mapping it to
+    open the new one.
+    """
+
+    def __init__(self, name=STATUS_BOARD_NAME, slots=MAX_BOTS, create=False):
+        self.name = name
+        if create:
+            self._unlink_stale(name)
+            size = _BOARD_HEADER.size + slots * (8 + _SLOT_HEADER.size + SLOT_BYTES)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            _BOARD_HEADER.pack_into(self.shm.buf, 0, _BOARD_MAGIC, slots, 1)
+            # A crashed worker's board is retired and unlinked by its replacement, not by the
+            # resource tracker: unlinked without retiring, it would keep readers on it
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Readers must not unlink the segment when they exit
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+            magic, slots, _ = _BOARD_HEADER.unpack_from(self.shm.buf, 0)
+            if magic != _BOARD_MAGIC:
+                self.shm.close()
+                raise ValueError(f"Shared memory '{name}' is not a bot status board")
+
+        self.slots = slots
+        self.ids = np.ndarray((slots,), dtype=np.int64, buffer=self.shm.buf, offset=_BOARD_HEADER.size)
+        self._slots_offset = _BOARD_HEADER.size + slots * 8
+        # Writer-side bookkeeping
+        self._index = {}
+        self._free = list(range(slots - 1, -1, -1))
+
+    @staticmethod
+    def _unlink_stale(name):
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            return
+        if stale.size >= _BOARD_HEADER.size and _BOARD_HEADER.unpack_from(stale.buf, 0)[0] == _BOARD_MAGIC:
+            _retire(stale.buf)
+        stale.close()
+        stale.unlink()
+
+    @property
+    def live(self):
+        """False once the worker has replaced or removed this board"""
+        return _BOARD_HEADER.unpack_from(self.shm.buf, 0)[2] == 1
+
+    def _offset(self, slot):
+        return self._slots_offset + slot * (_SLOT_HEADER.size + SLOT_BYTES)
+
+    def _write(self, slot, user_id, payload):
+        offset = self._offset(slot)
+        seq = _SLOT_HEADER.unpack_from(self.shm.buf, offset)[0]
+        _SLOT_HEADER.pack_into(self.shm.buf, offset, seq + 1, 0)
+        start = offset + _SLOT_HEADER.size
+        self.shm.buf[start:start + len(payload)] = payload
+        self.ids[slot] = user_id
+        _SLOT_HEADER.pack_into(self.shm.buf, offset, seq + 2, len(payload))
+
+    def publish(self, user_id, status):
+        """Store a user's status (worker only)"""
+        payload = json.dumps(status, default=str).encode()
+        if len(payload) > SLOT_BYTES:
+            logger.warning(f"Bot status for user {user_id} is {len(payload)} bytes, publishing a summary")
+            payload = json.dumps({key: status.get(key) for key in ('running', 'balance', 'session_profit')}).encode()
+
+        slot = self._index.get(user_id)
+        if slot is None:
+            if not self._free:
+                logger.error(f"Status board full, cannot publish status for user {user_id}")
+                return False
+            slot = self._index[user_id] = self._free.pop()
+        self._write(slot, int(user_id), payload)
+        return True
+
+    def clear(self, user_id):
+        """Remove a user's status (worker only)"""
+        slot = self._index.pop(user_id, None)
+        if slot is not None:
+            self._write(slot, 0, b'')
+            self._free.append(slot)
+
+    def published_user_ids(self):
+        return list(self._index)
+
+    def read(self, user_id, retries=100):
+        """A user's latest status, or None if the worker has not published one"""
+        hits = np.flatnonzero(self.ids == int(user_id))
+        if not hits.size:
+            return None
+        slot = int(hits[0])
+        offset = self._offset(slot)
+        start = offset + _SLOT_HEADER.size
+
+        for _ in range(retries):
+            seq, length = _SLOT_HEADER.unpack_from(self.shm.buf, offset)
+            if seq & 1:
+                time.sleep(0)
+                continue
+            payload = bytes(self.shm.buf[start:start + min(length, SLOT_BYTES)])
+            if _SLOT_HEADER.unpack_from(self.shm.buf, offset)[0] != seq:
+                continue
+            if self.ids[slot] != int(user_id) or not payload:
+                return None
+            return json.loads(payload)
+        return None
+
+    def close(self, unlink=False):
+        if unlink:
+            _retire(self.shm.buf)
+            # unlink() unregisters the segment from the resource tracker
+            resource_tracker.register(self.shm._name, 'shared_memory')
+        del self.ids
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _retire(buf):
+    struct.pack_into('<I', buf, _LIVE_OFFSET, 0)
+
+
+class BotWorker:
+    """Bot-owning process: serves commands and publishes status"""
+
+    def __init__(self, app, manager, board, address=WORKER_ADDRESS):
+        self.app = app
+        self.manager = manager
+        self.board = board
+        self.address = _address(address)
+        self._board_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._listener = None
+
+    def handle(self, command, *args):
+        """Execute one command from a web worker"""
+        if command == 'start':
+            return self._start(*args)
+        if command == 'stop':
+            return self._stop(*args)
+        if command == 'stats':
+            return self.manager.stats()
+        if command == 'latency':
+            return latency_tracker.report(*args)
+        if command == 'strategy':
+            return self._reload_strategy(*args)
+        if command == 'ping':
+            return True
+        raise ValueError(f"Unknown bot worker command: {command}")
+
+    def _start(self, user_id):
+        if self.manager.is_running(user_id):
+            return False
+
+        with self.app.app_context():
+            from models import User, TradingConfig
+            user = User.query.get(user_id)
+            config = TradingConfig.query.filter_by(user_id=user_id).first()
+            if not user or not config:
+                logger.warning(f"Cannot start bot for user {user_id}: user or config not found")
+                return False
+
+            strategies.publish(config)
+            bot = create_bot(user_id, config, self.app)
+
+        started = self.manager.start_bot(user_id, bot)
+        if started:
+            self._publish(user_id)
+        return started
+
+    def _reload_strategy(self, user_id):
+        """Recompile the user's strategy after a config save in a web worker"""
+        with self.app.app_context():
+            from models import TradingConfig
+            config = TradingConfig.query.filter_by(user_id=user_id).first()
+            if config is None:
+                strategies.discard(user_id)
+                return None
+            return strategies.publish(config).content_hash
+
+    def _stop(self, user_id):
+        stopped = self.manager.stop_bot(user_id)
+        with self._board_lock:
+            self.board.clear(user_id)
+        return stopped
+
+    def _publish(self, user_id):
+        status = self.manager.get_status(user_id)
+        with self._board_lock:
+            if self.manager.is_running(user_id):
+                self.board.publish(user_id, status)
+
+    def publish_all(self):
+        """Refresh every running bot's status and drop bots that have finished"""
+        running = set(self.manager.running_user_ids())
+        for user_id in running:
+            try:
+                self._publish(user_id)
+            except Exception as e:
+                logger.error(f"Error publishing bot status for user {user_id}: {str(e)}")
+        with self._board_lock:
+            for user_id in set(self.board.published_user_ids()) - running:
+                self.board.clear(user_id)
+
+    def _publish_loop(self):
+        while not self._stopping.wait(STATUS_PUBLISH_SECONDS):
+            self.publish_all()
+
+    def _serve_connection(self, conn):
+        with conn:
+            while not self._stopping.is_set():
+                try:
+                    command, *args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = (True, self.handle(command, *args))
+                except Exception as e:
+                    logger.error(f"Bot worker command {command} failed: {str(e)}")
+                    reply = (False, str(e))
+                try:
+                    conn.send(reply)
+                except OSError:
+                    return
+
+    def serve_forever(self):
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+        self._listener = Listener(self.address, authkey=_authkey())
+        threading.Thread(target=self._publish_loop, name='bot-status-publisher', daemon=True).start()
+        logger.info(f"Bot worker listening on {self.address}")
+
+        while not self._stopping.is_set():
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                if self._stopping.is_set():
+                    break
+                logger.exception("Bot worker accept failed")
+                continue
+            threading.Thread(target=self._serve_connection, args=(conn,), name='bot-worker-conn', daemon=True).start()
+
+    def shutdown(self):
+        """Stop serving, stop every bot and remove the status board"""
+        self._stopping.set()
+        if self._listener is not None:
+            self._listener.close()
+        self.manager.shutdown()
+        self.board.close(unlink=True)
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+class BotWorkerClient:
+    """bot_manager stand-in for web processes when bots live in the bot worker"""
+
+    remote = True
+
+    def __init__(self, address=WORKER_ADDRESS, board_name=STATUS_BOARD_NAME):
+        self.address = _address(address)
+        self.board_name = board_name
+        self._local = threading.local()  # one connection per web thread
+        self._board = None
+        self._board_lock = threading.Lock()
+
+    def _request(self, command, *args):
+        for attempt in range(2):
+            conn = getattr(self._local, 'conn', None)
+            fresh = conn is None
+            try:
+                if fresh:
+                    conn = self._local.conn = Client(self.address, authkey=_authkey())
+                conn.send((command, *args))
+            except (OSError, EOFError):
+                self._drop_connection()
+                # A reused connection may have been closed by a worker restart; retry once
+                if fresh or attempt:
+                    raise
+                continue
+
+            if not conn.poll(COMMAND_TIMEOUT):
+                self._drop_connection()
+                raise TimeoutError(f"Bot worker did not answer '{command}' in {COMMAND_TIMEOUT}s")
+            ok, result = conn.recv()
+            if not ok:
+                raise RuntimeError(result)
+            return result
+
+    def _drop_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def _open_board(self):
+        """The worker's current board, reopened after a worker restart"""
+        board = self._board
+        if board is not None and board.live:
+            return board
+        with self._board_lock:
+            if self._board is not None and not self._board.live:
+                # The unlinked segment stays mapped until this object is collected; threads
+                # reading it right now still hold it, so it is not closed here
+                logger.info(f"Bot worker restarted, reopening status board '{self.board_name}'")
+                self._board = None
+            if self._board is None:
+                try:
+                    self._board = StatusBoard(self.board_name)
+                except FileNotFoundError:
+                    # Worker not started yet, or stopped
+                    return None
+            return self._board
+
+    def _read_status(self, user_id):
+        board = self._open_board()
+        return board.read(user_id) if board is not None else None
+
+    # BotManager surface
+
+    def start_bot(self, user_id, bot=None):
+        """Ask the worker to start the user's bot (the worker builds it)"""
+        try:
+            return bool(self._request('start', user_id))
+        except Exception as e:
+            logger.error(f"Bot worker start failed for user {user_id}: {str(e)}")
+            return False
+
+    def stop_bot(self, user_id):
+        try:
+            return bool(self._request('stop', user_id))
+        except Exception as e:
+            logger.error(f"Bot worker stop failed for user {user_id}: {str(e)}")
+            return False
+
+    def is_running(self, user_id):
+        status = self._read_status(user_id)
+        return bool(status and status.get('running', False))
+
+    def get_bot(self, user_id):
+        # Bot objects live in the worker process
+        return None
+
+    def get_status(self, user_id):
+        return self._read_status(user_id) or dict(STOPPED_STATUS)
+
+    def get_bot_status(self, user_id):
+        return self.get_status(user_id)
+
+    def running_user_ids(self):
+        board = self._open_board()
+        return [] if board is None else [int(user_id) for user_id in board.ids if user_id]
+
+    def latency_report(self, user_id):
+        """Stage latency report of the user's bot, kept in the worker process"""
+        return self._request('latency', user_id)
+
+    def reload_strategy(self, user_id):
+        """Have the worker recompile the user's strategy from the saved config"""
+        try:
+            return self._request('strategy', user_id)
+        except Exception as e:
+            logger.error(f"Bot worker strategy reload failed for user {user_id}: {str(e)}")
+            return None
+
+    def stats(self):
+        try:
+            return self._request('stats')
+        except Exception as e:
+            logger.error(f"Bot worker stats failed: {str(e)}")
+            return {}
+
+    def shutdown(self):
+        """Release this process's connection and board; the worker keeps running"""
+        self._drop_connection()
+        with self._board_lock:
+            if self._board is not None:
+                self._board.close()
+                self._board = None
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    from app import create_app
+
+    app = create_app('worker')
+    worker = BotWorker(app, create_bot_manager(), StatusBoard(create=True))
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    try:
+        worker.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        worker.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+"""
+Long-lived, per-user IQ Option sessions.
+
+One authenticated IQOptionService is kept per user and shared by the bot,
+balance queries and asset checks, so the login round trip is paid once per
+session instead of once per request. A periodic health check reconnects
+broken sessions with exponential backoff and disconnects sessions that have
+been idle (and not leased by a bot) for longer than BROKER_IDLE_TIMEOUT.
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from contextlib import contextmanager
+
+from metrics import instrument_broker
+
+logger = logging.getLogger(__name__)
+
+IDLE_TIMEOUT = int(os.getenv('BROKER_IDLE_TIMEOUT', 900))
+HEALTH_CHECK_SECONDS = int(os.getenv('BROKER_HEALTH_CHECK_SECONDS', 30))
+BACKOFF_BASE = float(os.getenv('BROKER_BACKOFF_BASE', 2.0))
+BACKOFF_MAX = float(os.getenv('BROKER_BACKOFF_MAX', 300.0))
+# iqoption (real broker) or simulator (broker_simulator, for load and latency tests)
+BACKEND = os.getenv('BROKER_BACKEND', 'iqoption')
+
+
+def default_service_factory(email, password):
+    """Create an IQOptionService the same way the routes do"""
+    if BACKEND == 'simulator':
+        from broker_simulator import SimulatedBrokerService
+        return SimulatedBrokerService(email, password)
+    from src.services.iq_option_service import IQOptionService
+    return IQOptionService(email, password)
+
+
+class BrokerSession:
+    """One user's broker connection and its bookkeeping"""
+    __slots__ = ('user_id', 'email', 'password', 'service', 'lock', 'connected',
+                 'leases', 'last_used', 'failures', 'next_attempt', 'logins')
+
+    def __init__(self, user_id, email, password, service):
+        self.user_id = user_id
+        self.email = email
+        self.password = password
+        self.service = service
+        # Serializes calls on the underlying client, which is not thread-safe
+        self.lock = threading.RLock()
+        self.connected = False
+        self.leases = 0
+        self.last_used = time.time()
+        self.failures = 0
+        self.next_attempt = 0.0
+        self.logins = 0
+
+
+class BrokerConnectionPool:
+    """Registry of per-user broker sessions"""
+
+    def __init__(self, service_factory=default_service_factory):
+        self.service_factory = service_factory
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _get_session(self, user_id, email, password):
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is not None and (session.email, session.password) == (email, password):
+                session.last_used = time.time()
+                return session
+            # Credentials changed: drop the old login
+            stale = self._sessions.pop(user_id, None)
+        if stale is not None:
+            self._disconnect(stale)
+
+        # Building a client can be slow (imports, sockets); other users' lookups are not held up
+        service = instrument_broker(self.service_factory(email, password))
+        with self._lock:
+            current = self._sessions.get(user_id)
+            if current is not None and (current.email, current.password) == (email, password):
+                # Another thread created it first; this client was never connected
+                current.last_used = time.time()
+                return current
+            session = self._sessions[user_id] = BrokerSession(user_id, email, password, service)
+        if current is not None:
+            self._disconnect(current)
+        return session
+
+    def _connect(self, session):
+        """Log in unless connected or still backing off. Caller holds session.lock."""
+        if session.connected and self._is_healthy(session):
+            return True
+        if time.time() < session.next_attempt:
+            return False
+
+        try:
+            ok = bool(session.service.connect())
+        except Exception as e:
+            logger.error(f"Broker connect error for user {session.user_id}: {str(e)}")
+            ok = False
+
+        session.logins += 1
+        session.connected = ok
+        if ok:
+            session.failures = 0
+            session.next_attempt = 0.0
+            logger.info(f"Broker session connected for user {session.user_id}")
+        else:
+            session.failures += 1
+            delay = min(BACKOFF_MAX, BACKOFF_BASE ** session.failures) * random.uniform(0.8, 1.2)
+            session.next_attempt = time.time() + delay
+            logger.warning(f"Broker connect failed for user {session.user_id}, retry in {delay:.0f}s")
+        return ok
+
+    @staticmethod
+    def _is_healthy(session):
+        service = session.service
+        check = getattr(service, 'check_connection', None)
+        try:
+            if callable(check):
+                return bool(check())
+            return bool(getattr(service, 'is_connected', True))
+        except Exception:
+            return False
+
+    @staticmethod
+    def _disconnect(session):
+        session.connected = False
+        try:
+            if hasattr(session.service, 'disconnect'):
+                session.service.disconnect()
+        except Exception as e:
+            logger.error(f"Broker disconnect error for user {session.user_id}: {str(e)}")
+
+    @contextmanager
+    def session(self, user_id, email, password):
+        """Connected service for a short call sequence, or None if unavailable.
+
+        Calls inside the block are serialized with other users of the session.
+        """
+        session = self._get_session(user_id, email, password)
+        with session.lock:
+            if not self._connect(session):
+                yield None
+                return
+            session.last_used = time.time()
+            yield session.service
+
+    def lease(self, user_id, email, password):
+        """Connected service held for a long time (a running bot); never evicted while leased"""
+        session = self._get_session(user_id, email, password)
+        with session.lock:
+            session.leases += 1
+            if not self._connect(session):
+                session.leases -= 1
+                return None
+            return session.service
+
+    def release(self, user_id):
+        """Give back a lease taken with lease()"""
+        with self._lock:
+            session = self._sessions.get(user_id)
+        if session is not None:
+            with session.lock:
+                session.leases = max(0, session.leases - 1)
+                session.last_used = time.time()
+
+    def get_balance(self, user_id, email, password):
+        """Current balance through the user's shared session, or None"""
+        with self.session(user_id, email, password) as service:
+            if service is None:
+                return None
+            return service.update_balance()
+
+    def is_asset_open(self, user_id, email, password, asset):
+        """Asset availability through the user's shared session, or None"""
+        with self.session(user_id, email, password) as service:
+            if service is None:
+                return None
+            return service.is_asset_open(asset)
+
+    def evict(self, user_id):
+        """Disconnect and forget a user's session (e.g. after a credential change)"""
+        with self._lock:
+            session = self._sessions.pop(user_id, None)
+        if session is not None:
+            with session.lock:
+                self._disconnect(session)
+
+    def health_check(self):
+        """Reconnect broken sessions and evict idle ones"""
+        now = time.time()
+        with self._lock:
+            sessions = list(self._sessions.values())
+
+        for session in sessions:
+            # Skip sessions busy with a call; they are checked next round
+            if not session.lock.acquire(blocking=False):
+                continue
+            try:
+                if session.leases == 0 and now - session.last_used > IDLE_TIMEOUT:
+                    with self._lock:
+                        if self._sessions.get(session.user_id) is session:
+                            self._sessions.pop(session.user_id)
+                    self._disconnect(session)
+                    logger.info(f"Evicted idle broker session for user {session.user_id}")
+                elif session.connected and not self._is_healthy(session):
+                    logger.warning(f"Broker session for user {session.user_id} lost, reconnecting")
+                    session.connected = False
+                    self._connect(session)
+                elif not session.connected and session.leases:
+                    self._connect(session)
+            finally:
+                session.lock.release()
+
+    def stats(self):
+        """Session counts for monitoring"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            'sessions': len(sessions),
+            'connected': sum(1 for s in sessions if s.connected),
+            'leased': sum(1 for s in sessions if s.leases),
+            'logins': sum(s.logins for s in sessions),
+        }
+
+    def shutdown(self):
+        """Disconnect every session"""
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            self._disconnect(session)
+
+
+broker_pool = BrokerConnectionPool()
+
+
+def register_broker_pool_jobs(scheduler, background=True):
+    """Run the pool health check on the scheduler and, with ``background``, disconnect at exit"""
+    import atexit
+
+    scheduler.add_job(
+        broker_pool.health_check,
+        'interval',
+        seconds=HEALTH_CHECK_SECONDS,
+        id='broker_pool_health_check',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    if background:
+        atexit.register(broker_pool.shutdown)
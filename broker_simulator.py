@@ -0,0 +1,467 @@
+"""
+Local stand-in for the IQ Option broker.
+
+``SimulatedMarket`` replays stored MarketData candles (or a seeded random
+walk when there is none) on a clock running ``speed`` times faster than real
+time, and settles binary options against the replayed price. It is shared by
+every ``SimulatedBrokerService``, which exposes the IQOptionService surface
+(connect, update_balance, get_candles, is_asset_open, buy, check_win, ...)
+for one user, so thousands of simulated users fit in one process.
+
+Faults are injected from the market: per-call latency, random disconnects,
+failed logins, and closing regular markets so bots have to switch to the
+"-OTC" assets. Set BROKER_BACKEND=simulator to make the broker pool use it.
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+import itertools
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+OTC_SUFFIX = '-OTC'
+DEFAULT_ASSETS = ('EURUSD', 'GBPUSD', 'USDJPY', 'AUDUSD', 'USDCAD', 'EURJPY')
+TIMEFRAMES = {'1m': 60, '5m': 300, '15m': 900, '30m': 1800, '1h': 3600}
+
+
+def timeframe_seconds(timeframe):
+    """60, '60' or '1m' -> 60"""
+    if isinstance(timeframe, str) and timeframe in TIMEFRAMES:
+        return TIMEFRAMES[timeframe]
+    return int(timeframe)
+
+
+def base_asset(asset):
+    return asset[:-len(OTC_SUFFIX)] if asset.endswith(OTC_SUFFIX) else asset
+
+
+class SimulatedMarket:
+    """Replayed prices, open orders and injected faults shared by all simulated users"""
+
+    def __init__(self, series, timeframe=60, speed=1.0, payout=0.87, otc_payout=0.80,
+                 latency=(0.0, 0.0), disconnect_rate=0.0, connect_failure_rate=0.0,
+                 initial_balance=10000.0, seed=None, history=200):
+        """``series`` maps asset -> dict of equal-length 'open'/'high'/'low'/'close' arrays"""
+        if not series:
+            raise ValueError('SimulatedMarket needs at least one asset series')
+        self.series = {asset: {key: np.asarray(values, dtype=float) for key, values in arrays.items()}
+                       for asset, arrays in series.items()}
+        self.timeframe = timeframe
+        self.speed = speed
+        self.payouts = {}
+        self.payout = payout
+        self.otc_payout = otc_payout
+        self.latency = latency
+        self.disconnect_rate = disconnect_rate
+        self.connect_failure_rate = connect_failure_rate
+        self.initial_balance = initial_balance
+        self.rng = random.Random(seed)
+
+        # Simulated time starts at the wall clock, aligned to a candle, with `history` candles behind it
+        self.wall_start = time.time()
+        self.sim_start = self.wall_start // timeframe * timeframe
+        self.offset = history
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._orders = {}
+        self._closed = set()
+        self._regular_closed = False
+        self._connection_epoch = 0
+        self.counters = dict.fromkeys(
+            ('calls', 'logins', 'failed_logins', 'disconnects', 'orders', 'settled', 'wins', 'losses', 'ties'), 0)
+
+    # Construction
+
+    @classmethod
+    def synthetic(cls, assets=DEFAULT_ASSETS, candles=5000, seed=None, **kwargs):
+        """Market over seeded random walks (no database needed)"""
+        generator = np.random.default_rng(seed)
+        series = {}
+        for asset in assets:
+            start = 150.0 if asset.endswith('JPY') else 1.1
+            closes = start * np.exp(np.cumsum(generator.normal(0, 0.0004, candles)))
+            opens = np.concatenate(([start], closes[:-1]))
+            spread = np.abs(generator.normal(0, 0.0002, candles)) * closes
+            series[asset] = {
+                'open': opens,
+                'high': np.maximum(opens, closes) + spread,
+                'low': np.minimum(opens, closes) - spread,
+                'close': closes,
+                'volume': generator.integers(50, 500, candles).astype(float),
+            }
+        return cls(series, seed=seed, **kwargs)
+
+    @classmethod
+    def from_database(cls, assets=None, timeframe='1m', limit=20000, **kwargs):
+        """Market replaying MarketData rows. Must run inside an application context."""
+        from models import MarketData
+
+        if assets is None:
+            assets = [row[0] for row in MarketData.query.with_entities(MarketData.asset)
+                      .filter_by(timeframe=timeframe).distinct()]
+        series = {}
+        for asset in assets:
+            rows = (MarketData.query
+                    .with_entities(MarketData.open_price, MarketData.high_price, MarketData.low_price,
+                                   MarketData.close_price, MarketData.volume)
+                    .filter_by(asset=asset, timeframe=timeframe)
+                    .order_by(MarketData.timestamp.desc())
+                    .limit(limit)
+                    .all())
+            if len(rows) < 2:
+                continue
+            data = np.array(rows[::-1], dtype=float)
+            series[base_asset(asset)] = {
+                'open': data[:, 0], 'high': data[:, 1], 'low': data[:, 2],
+                'close': data[:, 3], 'volume': np.nan_to_num(data[:, 4]),
+            }
+        return cls(series, timeframe=timeframe_seconds(timeframe), **kwargs)
+
+    def service(self, email=None, password=None):
+        """IQOptionService stand-in for one user"""
+        return SimulatedBrokerService(email, password, market=self)
+
+    # Clock and prices
+
+    def now(self):
+        """Current simulated time (epoch seconds)"""
+        return self.sim_start + (time.time() - self.wall_start) * self.speed
+
+    def wall_delay(self, sim_seconds):
+        return max(0.0, sim_seconds / self.speed)
+
+    def _arrays(self, asset):
+        arrays = self.series.get(base_asset(asset))
+        if arrays is None:
+            raise KeyError(asset)
+        return arrays
+
+    def _index(self, asset, candle):
+        """Row of the replayed series for candle number ``candle``; OTC replays half a series ahead"""
+        length = len(self._arrays(asset)['close'])
+        shift = length // 2 if asset.endswith(OTC_SUFFIX) else 0
+        return (candle + self.offset + shift) % length
+
+    def candle(self, asset, candle, sim_now=None):
+        """IQ Option style candle dict; the forming candle is cut at sim_now"""
+        arrays = self._arrays(asset)
+        row = self._index(asset, candle)
+        start = self.sim_start + candle * self.timeframe
+        data = {
+            'id': candle,
+            'from': int(start),
+            'to': int(start + self.timeframe),
+            'open': float(arrays['open'][row]),
+            'close': float(arrays['close'][row]),
+            'max': float(arrays['high'][row]),
+            'min': float(arrays['low'][row]),
+            'volume': float(arrays['volume'][row]) if 'volume' in arrays else 0.0,
+        }
+        if sim_now is not None and sim_now < start + self.timeframe:
+            data['close'] = self.price(asset, sim_now)
+            data['max'] = max(data['open'], data['close'])
+            data['min'] = min(data['open'], data['close'])
+        return data
+
+    def price(self, asset, sim_time=None):
+        """Price at sim_time, moving linearly from the candle's open to its close"""
+        sim_time = self.now() if sim_time is None else sim_time
+        elapsed = (sim_time - self.sim_start) / self.timeframe
+        candle = int(elapsed // 1)
+        arrays = self._arrays(asset)
+        row = self._index(asset, candle)
+        fraction = elapsed - candle
+        return float(arrays['open'][row] + (arrays['close'][row] - arrays['open'][row]) * fraction)
+
+    def candles(self, asset, timeframe, count, end=None):
+        """Last ``count`` candles of ``timeframe`` seconds up to end (forming one last)"""
+        sim_now = self.now()
+        end = sim_now if end is None else min(end, sim_now)
+        size = timeframe_seconds(timeframe)
+        if size == self.timeframe:
+            last = int((end - self.sim_start) // size)
+            numbers = np.arange(last - count + 1, last + 1)
+            arrays = self._arrays(asset)
+            length = len(arrays['close'])
+            shift = length // 2 if asset.endswith(OTC_SUFFIX) else 0
+            rows = (numbers + self.offset + shift) % length
+            starts = (self.sim_start + numbers * size).astype(np.int64).tolist()
+            volume = arrays['volume'][rows].tolist() if 'volume' in arrays else [0.0] * count
+            result = [
+                {'id': number, 'from': start, 'to': start + size, 'open': o, 'close': c, 'max': h, 'min': l,
+                 'volume': v}
+                for number, start, o, c, h, l, v in zip(
+                    numbers.tolist(), starts, arrays['open'][rows].tolist(), arrays['close'][rows].tolist(),
+                    arrays['high'][rows].tolist(), arrays['low'][rows].tolist(), volume)
+            ]
+            if result and sim_now < result[-1]['to']:
+                result[-1] = self.candle(asset, last, sim_now)
+            return result
+
+        # Larger timeframes are aggregated from the replayed candles
+        per = max(1, size // self.timeframe)
+        last = int((end - self.sim_start) // (per * self.timeframe))
+        result = []
+        for group in range(last - count + 1, last + 1):
+            parts = [self.candle(asset, group * per + i, sim_now) for i in range(per)
+                     if self.sim_start + (group * per + i) * self.timeframe <= sim_now]
+            result.append({
+                'id': group,
+                'from': parts[0]['from'],
+                'to': parts[0]['from'] + size,
+                'open': parts[0]['open'],
+                'close': parts[-1]['close'],
+                'max': max(p['max'] for p in parts),
+                'min': min(p['min'] for p in parts),
+                'volume': sum(p['volume'] for p in parts),
+            })
+        return result
+
+    # Market hours
+
+    def is_open(self, asset):
+        if base_asset(asset) not in self.series:
+            return False
+        if asset.endswith(OTC_SUFFIX):
+            return True
+        return not self._regular_closed and asset not in self._closed
+
+    def close_asset(self, asset):
+        self._closed.add(asset)
+
+    def open_asset(self, asset):
+        self._closed.discard(asset)
+
+    def set_regular_markets(self, open_):
+        """Close (weekend-like) or reopen every regular asset; OTC stays open"""
+        self._regular_closed = not open_
+
+    def assets(self):
+        names = []
+        for asset in self.series:
+            names.extend((asset, asset + OTC_SUFFIX))
+        return names
+
+    def payout_for(self, asset):
+        return self.payouts.get(asset, self.otc_payout if asset.endswith(OTC_SUFFIX) else self.payout)
+
+    # Fault injection
+
+    def disconnect_all(self):
+        """Drop every connected service at once (broker outage)"""
+        with self._lock:
+            self._connection_epoch += 1
+
+    def _delay(self):
+        low, high = self.latency
+        if high > 0:
+            time.sleep(self.rng.uniform(low, high))
+
+    def _roll(self, rate):
+        return rate > 0 and self.rng.random() < rate
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.counters[key] += amount
+
+    # Orders
+
+    def open_order(self, owner, amount, asset, direction, expiration):
+        """Register an order at the current price; expiration is in minutes, like IQ Option"""
+        sim_now = self.now()
+        order = {
+            'owner': owner,
+            'asset': asset,
+            'direction': direction.lower(),
+            'amount': float(amount),
+            'payout': self.payout_for(asset),
+            'entry_price': self.price(asset, sim_now),
+            'opened_at': sim_now,
+            'expires_at': sim_now + float(expiration) * 60,
+        }
+        with self._lock:
+            order_id = next(self._ids)
+            self._orders[order_id] = order
+            self.counters['orders'] += 1
+        return order_id
+
+    def settle(self, order_id):
+        """Profit of an expired order (win: amount * payout, loss: -amount, tie: 0); None if unknown"""
+        with self._lock:
+            order = self._orders.pop(order_id, None)
+        if order is None:
+            return None
+        exit_price = self.price(order['asset'], order['expires_at'])
+        if exit_price == order['entry_price']:
+            profit, outcome = 0.0, 'ties'
+        elif (exit_price > order['entry_price']) == (order['direction'] == 'call'):
+            profit, outcome = round(order['amount'] * order['payout'], 2), 'wins'
+        else:
+            profit, outcome = -order['amount'], 'losses'
+        order['exit_price'] = exit_price
+        with self._lock:
+            self.counters['settled'] += 1
+            self.counters[outcome] += 1
+        return profit, order
+
+    def order(self, order_id):
+        with self._lock:
+            return self._orders.get(order_id)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['open_orders'] = len(self._orders)
+        stats['sim_time'] = datetime.utcfromtimestamp(self.now()).isoformat()
+        stats['speed'] = self.speed
+        return stats
+
+
+class SimulatedBrokerService:
+    """One user's IQOptionService stand-in backed by a SimulatedMarket"""
+    __slots__ = ('email', 'password', 'market', 'balance', 'is_connected', '_epoch', '_settled', 'account_type')
+
+    def __init__(self, email=None, password=None, market=None):
+        self.email = email
+        self.password = password
+        self.market = market if market is not None else get_simulated_market()
+        self.balance = self.market.initial_balance
+        self.is_connected = False
+        self._epoch = None
+        self._settled = {}
+        self.account_type = 'PRACTICE'
+
+    def _call(self):
+        """Latency and random disconnects for one broker call; False when not connected"""
+        market = self.market
+        market._count('calls')
+        market._delay()
+        if self.is_connected and self._epoch != market._connection_epoch:
+            self.is_connected = False
+        if self.is_connected and market._roll(market.disconnect_rate):
+            self.is_connected = False
+            market._count('disconnects')
+        return self.is_connected
+
+    def connect(self):
+        market = self.market
+        market._delay()
+        if market._roll(market.connect_failure_rate):
+            market._count('failed_logins')
+            self.is_connected = False
+            return False
+        market._count('logins')
+        self.is_connected = True
+        self._epoch = market._connection_epoch
+        return True
+
+    def disconnect(self):
+        self.is_connected = False
+
+    def check_connection(self):
+        return self._call()
+
+    def update_balance(self):
+        if not self._call():
+            return None
+        return self.balance
+
+    def get_balance(self):
+        return self.update_balance()
+
+    def change_balance(self, account_type):
+        self.account_type = account_type.upper()
+        return True
+
+    def get_available_assets(self):
+        if not self._call():
+            return []
+        return [asset for asset in self.market.assets() if self.market.is_open(asset)]
+
+    def is_asset_open(self, asset):
+        if not self._call():
+            return False
+        return self.market.is_open(asset)
+
+    def get_candles(self, asset, timeframe=60, count=100, end_time=None):
+        if not self._call():
+            return None
+        try:
+            return self.market.candles(asset, timeframe, count, end_time)
+        except KeyError:
+            return None
+
+    def get_current_price(self, asset):
+        if not self._call():
+            return None
+        try:
+            return self.market.price(asset)
+        except KeyError:
+            return None
+
+    def buy(self, amount, asset, direction, expiration=1):
+        """(True, order_id) or (False, reason), like the IQ Option API"""
+        if not self._call():
+            return False, 'not connected'
+        if not self.market.is_open(asset):
+            return False, 'asset closed'
+        if amount > self.balance:
+            return False, 'insufficient balance'
+        self.balance -= amount
+        return True, self.market.open_order(self.email, amount, asset, direction, expiration)
+
+    def check_win(self, order_id, wait=True):
+        """Profit of an order once it expires (waits in simulated time); None if unknown or pending"""
+        if order_id in self._settled:
+            return self._settled[order_id]
+        order = self.market.order(order_id)
+        if order is None:
+            return None
+        remaining = order['expires_at'] - self.market.now()
+        if remaining > 0:
+            if not wait:
+                return None
+            time.sleep(self.market.wall_delay(remaining))
+        settled = self.market.settle(order_id)
+        if settled is None:
+            return None
+        profit, order = settled
+        self.balance += order['amount'] + profit
+        self._settled[order_id] = profit
+        return profit
+
+
+_market = None
+_market_lock = threading.Lock()
+
+
+def get_simulated_market():
+    """Process-wide market configured from SIM_* variables, built on first use"""
+    global _market
+    with _market_lock:
+        if _market is None:
+            latency_ms = [float(v) for v in os.getenv('SIM_LATENCY_MS', '0,0').split(',')]
+            options = dict(
+                speed=float(os.getenv('SIM_SPEED', 1.0)),
+                payout=float(os.getenv('SIM_PAYOUT', 0.87)),
+                otc_payout=float(os.getenv('SIM_OTC_PAYOUT', 0.80)),
+                latency=(latency_ms[0] / 1000, latency_ms[-1] / 1000),
+                disconnect_rate=float(os.getenv('SIM_DISCONNECT_RATE', 0.0)),
+                connect_failure_rate=float(os.getenv('SIM_CONNECT_FAILURE_RATE', 0.0)),
+                seed=int(os.getenv('SIM_SEED')) if os.getenv('SIM_SEED') else None,
+            )
+            try:
+                _market = SimulatedMarket.from_database(timeframe=os.getenv('SIM_TIMEFRAME', '1m'), **options)
+                logger.info(f"Broker simulator replaying MarketData for {len(_market.series)} assets")
+            except Exception as e:
+                # No app context, no table or no rows: fall back to random walks
+                logger.info(f"Broker simulator using synthetic prices ({str(e)})")
+                _market = SimulatedMarket.synthetic(**options)
+        return _market
@@ -1,3 +1,82 @@
+"""
+SQLAlchemy instance and connection pool settings.
+
+Each gunicorn worker has its own pool. With threaded workers every request
+thread may hold a connection, plus the scheduler, write-behind and leader
+election threads, so DB_POOL_SIZE + DB_MAX_OVERFLOW should cover
+GUNICORN_THREADS plus a few; across workers it must stay under the
+server's connection limit (Render's free PostgreSQL allows 97).
+``pool_stats()`` reports this process's connections.
+"""
+
+import os
+import threading
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+db = SQLAlchemy()
+
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+# Render's proxy drops idle connections; recycle before that and ping on checkout
+POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes', 'on')
+
+
+def engine_options(database_url):
+    """SQLALCHEMY_ENGINE_OPTIONS for ``database_url``"""
+    if database_url.startswith('sqlite'):
+        # SQLite connections are local files; SQLAlchemy picks the pool
+        return {}
+    return {
+        'pool_size': POOL_SIZE,
+        'max_overflow': MAX_OVERFLOW,
+        'pool_timeout': POOL_TIMEOUT,
+        'pool_recycle': POOL_RECYCLE,
+        'pool_pre_ping': POOL_PRE_PING,
+    }
+
+
+_pool_lock = threading.Lock()
+_pool_counters = dict.fromkeys(('opened', 'closed', 'checked_out', 'peak_checked_out', 'checkouts'), 0)
+
+
+def _on_connect(dbapi_connection, connection_record):
+    with _pool_lock:
+        _pool_counters['opened'] += 1
+
+
+def _on_close(dbapi_connection, connection_record):
+    with _pool_lock:
+        _pool_counters['closed'] += 1
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    with _pool_lock:
+        _pool_counters['checkouts'] += 1
+        _pool_counters['checked_out'] += 1
+        _pool_counters['peak_checked_out'] = max(_pool_counters['peak_checked_out'],
+                                                 _pool_counters['checked_out'])
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    with _pool_lock:
+        _pool_counters['checked_out'] = max(0, _pool_counters['checked_out'] - 1)
+
+
+event.listen(Pool, 'connect', _on_connect)
+event.listen(Pool, 'close', _on_close)
+event.listen(Pool, 'checkout', _on_checkout)
+event.listen(Pool, 'checkin', _on_checkin)
+
 
-db = SQLAlchemy()
\ No newline at end of file
+def pool_stats():
+    """Connections of this process: open now, checked out now and at peak, checkouts so far"""
+    with _pool_lock:
+        stats = dict(_pool_counters)
+    stats['open'] = stats['opened'] - stats['closed']
+    stats['pid'] = os.getpid()
+    return stats
@@ -0,0 +1,167 @@
+"""
+Read-through cache of user profiles and trading configs.
+
+Endpoints ask ``entity_cache.get_user(user_id)`` / ``get_config(user_id)``
+instead of querying. Lookups are deduplicated per request (``flask.g``) and
+shared across requests for ENTITY_CACHE_TTL seconds. Cached values are
+read-only snapshots of the row's columns, never ORM instances, so they are
+safe to hand between sessions and threads; code that modifies a row still
+loads it through the session.
+
+Commits that touch a User or TradingConfig drop its entries once the
+transaction commits (``save_config`` and ``iq_credentials`` also invalidate
+explicitly). Other workers see the change when their entry expires.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from flask import g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+TTL_SECONDS = float(os.getenv('ENTITY_CACHE_TTL', 30))
+MAX_ENTRIES = int(os.getenv('ENTITY_CACHE_MAX_ENTRIES', 10000))
+
+
+class Snapshot:
+    """Read-only copy of a row's column values"""
+
+    def __init__(self, values):
+        self.__dict__.update(values)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is read-only; load the row to modify it')
+
+    def __repr__(self):
+        return f'Snapshot({self.__dict__!r})'
+
+
+def snapshot(instance):
+    """Snapshot of a model instance's columns"""
+    return Snapshot({column.key: getattr(instance, column.key) for column in instance.__table__.columns})
+
+
+class EntityCache:
+    """Request-scoped plus TTL cache keyed by (kind, user_id)"""
+
+    def __init__(self, ttl=TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, snapshot)
+        self.counters = dict.fromkeys(('request_hits', 'hits', 'misses', 'invalidations'), 0)
+
+    def _request_cache(self):
+        if not has_app_context():
+            return None
+        cache = g.get('_entity_cache')
+        if cache is None:
+            cache = g._entity_cache = {}
+        return cache
+
+    def _get(self, key, load):
+        request_cache = self._request_cache()
+        if request_cache is not None and key in request_cache:
+            self.counters['request_hits'] += 1
+            return request_cache[key]
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.counters['hits'] += 1
+                value = entry[1]
+            else:
+                value = None
+        if value is None:
+            self.counters['misses'] += 1
+            instance = load()
+            if instance is None:
+                # Missing rows are not cached; they may be created at any moment
+                return None
+            value = snapshot(instance)
+            with self._lock:
+                self._entries[key] = (now + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        if request_cache is not None:
+            request_cache[key] = value
+        return value
+
+    def get_user(self, user_id):
+        from models import User
+
+        user_id = int(user_id)
+        return self._get(('user', user_id), lambda: User.query.get(user_id))
+
+    def get_config(self, user_id):
+        from models import TradingConfig
+
+        user_id = int(user_id)
+        return self._get(('config', user_id), lambda: TradingConfig.query.filter_by(user_id=user_id).first())
+
+    def invalidate(self, kind, user_id):
+        key = (kind, int(user_id))
+        with self._lock:
+            self._entries.pop(key, None)
+        request_cache = self._request_cache()
+        if request_cache is not None:
+            request_cache.pop(key, None)
+        self.counters['invalidations'] += 1
+
+    def invalidate_user(self, user_id):
+        self.invalidate('user', user_id)
+
+    def invalidate_config(self, user_id):
+        self.invalidate('config', user_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        return dict(self.counters, entries=size)
+
+
+entity_cache = EntityCache()
+
+
+def _track_changes(session, flush_context):
+    """Remember users and configs written in this transaction"""
+    from models import User, TradingConfig
+
+    changed = session.info.setdefault('entity_cache_keys', set())
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, User) and instance.id is not None:
+            changed.add(('user', instance.id))
+        elif isinstance(instance, TradingConfig) and instance.user_id is not None:
+            changed.add(('config', instance.user_id))
+
+
+def _invalidate_committed(session):
+    for kind, user_id in session.info.pop('entity_cache_keys', ()):
+        entity_cache.invalidate(kind, user_id)
+
+
+def _discard_changes(session, previous_transaction=None):
+    session.info.pop('entity_cache_keys', None)
+
+
+def register_entity_cache():
+    """Invalidate cached users and configs when a transaction that changed them commits"""
+    if event.contains(Session, 'after_commit', _invalidate_committed):
+        return
+    event.listen(Session, 'after_flush', _track_changes)
+    event.listen(Session, 'after_commit', _invalidate_committed)
+    event.listen(Session, 'after_soft_rollback', _discard_changes)
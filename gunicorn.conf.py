@@ -0,0 +1,50 @@
+"""
+Gunicorn settings: ``gunicorn -c gunicorn.conf.py wsgi:application``.
+
+The default ``gthread`` worker serves GUNICORN_THREADS requests at once per
+worker, including Socket.IO websockets (through simple-websocket), and keeps
+the app's background threads (scheduler, write-behind, password hashing
+pool) on real threads. ``gevent``/``eventlet`` workers are supported when
+those packages are installed; Flask-SocketIO is switched to the matching
+async mode.
+
+Bots run inside the web worker unless BOT_WORKER_MODE=external, and each
+worker process has its own bot registry: with several workers a user's bot
+would be invisible to (and could be started again by) the others. In that
+mode only one worker is started, whatever WEB_CONCURRENCY says; run the bots
+in ``python bot_worker.py`` to scale the web tier out.
+
+Socket.IO long-polling needs every request of a client on the same worker,
+which gunicorn cannot guarantee: with WEB_CONCURRENCY > 1 clients should
+connect with ``transports: ['websocket']``, and SOCKETIO_MESSAGE_QUEUE must
+be set so any worker can emit to any client.
+"""
+
+import os
+import sys
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+_bots_in_process = os.getenv('BOT_WORKER_MODE', 'inprocess').lower() != 'external'
+workers = int(os.getenv('WEB_CONCURRENCY', 1 if _bots_in_process else 2))
+if _bots_in_process and workers > 1:
+    print(f"gunicorn.conf.py: WEB_CONCURRENCY={workers} ignored, bots run in-process so only one worker "
+          f"is started (set BOT_WORKER_MODE=external and run bot_worker.py to use more)", file=sys.stderr)
+    workers = 1
+# More than one thread turns the 'sync' worker into gthread
+threads = int(os.getenv('GUNICORN_THREADS', 32))
+# Open connections per gevent/eventlet worker
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+
+if 'gevent' in worker_class:
+    _async_mode = 'gevent'
+elif 'eventlet' in worker_class:
+    _async_mode = 'eventlet'
+else:
+    _async_mode = 'threading'
+# Read by create_app in each worker (app is not preloaded, so every worker builds its own)
+os.environ.setdefault('SOCKETIO_ASYNC_MODE', _async_mode)
@@ -0,0 +1,342 @@
+"""
+One leader among the processes that run the scheduler.
+
+Every web worker (and the bot worker) runs its own APScheduler. Jobs that
+must happen once for the whole deployment (the ML retraining sweep, starting
+and stopping auto-mode sessions) are wrapped with ``leader_elector.guard``
+and return without doing anything unless this process holds the leadership.
+Jobs that act on per-process state (flushing this process's counters,
+health-checking its broker sessions) keep running everywhere.
+
+Leadership is held with:
+
+- PostgreSQL: a session-level advisory lock on a dedicated connection. The
+  server drops it when the leader's connection goes away, and followers
+  retry every LEADER_RENEW_SECONDS.
+- SQLite (single machine): a lease row in a file shared by the workers,
+  renewed every LEADER_RENEW_SECONDS and taken over once it is
+  LEADER_LEASE_SECONDS old.
+
+A leader that cannot renew for LEADER_LEASE_SECONDS stops acting as one, so
+two processes never both believe they lead for longer than that, and a dead
+leader is replaced within LEADER_LEASE_SECONDS + LEADER_RENEW_SECONDS.
+Per-job run/skip/error counts of this process are in ``stats()``.
+"""
+
+import os
+import re
+import time
+import socket
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+from local_store import LocalStore, default_path
+
+logger = logging.getLogger(__name__)
+
+# auto, postgresql, sqlite, or off (this process always leads; single-process deployments)
+BACKEND = os.getenv('LEADER_ELECTION', 'auto')
+LEASE_SECONDS = float(os.getenv('LEADER_LEASE_SECONDS', 30))
+RENEW_SECONDS = float(os.getenv('LEADER_RENEW_SECONDS', 10))
+DB_PATH = os.getenv('LEADER_DB_PATH', default_path('leader'))
+
+SCHEMA = ('CREATE TABLE IF NOT EXISTS leases '
+          '(name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL);')
+
+
+class SkippedRun:
+    """Return value of a guarded job that did not run on this process"""
+
+    def __repr__(self):
+        return 'SKIPPED'
+
+
+SKIPPED = SkippedRun()
+
+
+class SqliteLease:
+    """Expiring lease row in a machine-local SQLite file"""
+    name = 'sqlite'
+
+    def __init__(self, lease_name, lease_seconds=LEASE_SECONDS, path=DB_PATH):
+        self.lease_name = lease_name
+        self.lease_seconds = lease_seconds
+        self.store = LocalStore(path, SCHEMA)
+
+    def acquire(self, holder):
+        """Take or renew the lease; True while ``holder`` owns it"""
+        now = time.time()
+        with self.store.transaction() as conn:
+            row = conn.execute('SELECT holder, expires_at FROM leases WHERE name = ?',
+                               (self.lease_name,)).fetchone()
+            if row is not None and row[0] != holder and row[1] > now:
+                return False
+            conn.execute('INSERT OR REPLACE INTO leases (name, holder, expires_at) VALUES (?, ?, ?)',
+                         (self.lease_name, holder, now + self.lease_seconds))
+        return True
+
+    def release(self, holder):
+        self.store.execute('DELETE FROM leases WHERE name = ? AND holder = ?', (self.lease_name, holder))
+
+    def current_holder(self):
+        row = self.store.execute('SELECT holder, expires_at FROM leases WHERE name = ?',
+                                 (self.lease_name,)).fetchone()
+        return row[0] if row is not None and row[1] > time.time() else None
+
+
+class AdvisoryLock:
+    """PostgreSQL session-level advisory lock held on its own connection"""
+    name = 'postgresql'
+
+    def __init__(self, lease_name, engine):
+        from sqlalchemy import text
+
+        self.engine = engine
+        digest = hashlib.blake2b(lease_name.encode(), digest_size=8).digest()
+        self.key = int.from_bytes(digest, 'big', signed=True)
+        self._text = text
+        self._conn = None
+        self._held = False
+
+    def acquire(self, holder):
+        try:
+            if self._conn is None:
+                self._conn = self.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+                self._held = False
+            if self._held:
+                # The lock lives as long as the connection; make sure it still does
+                self._conn.execute(self._text('SELECT 1'))
+                return True
+            self._held = bool(self._conn.execute(
+                self._text('SELECT pg_try_advisory_lock(:key)'), {'key': self.key}).scalar())
+            return self._held
+        except Exception:
+            # A broken connection has lost the lock with it; never hand it back to the pool
+            self._drop(invalidate=True)
+            raise
+
+    def release(self, holder):
+        if self._conn is None:
+            return
+        try:
+            if self._held:
+                self._conn.execute(self._text('SELECT pg_advisory_unlock(:key)'), {'key': self.key})
+            self._drop()
+        except Exception:
+            self._drop(invalidate=True)
+
+    def _drop(self, invalidate=False):
+        conn, self._conn, self._held = self._conn, None, False
+        if conn is None:
+            return
+        try:
+            if invalidate:
+                conn.invalidate()
+            conn.close()
+        except Exception:
+            pass
+
+    def current_holder(self):
+        return None
+
+
+class AlwaysLeader:
+    """No election: the only scheduler process leads"""
+    name = 'off'
+
+    def acquire(self, holder):
+        return True
+
+    def release(self, holder):
+        pass
+
+    def current_holder(self):
+        return None
+
+
+def job_key(job_id):
+    """Counter key of a job: per-model/per-user ids share one key (ml_retrain_12 -> ml_retrain)"""
+    return re.sub(r'_\d+$', '', job_id or 'unknown')
+
+
+class LeaderElector:
+    """Campaigns for leadership in a background thread and gates leader-only jobs"""
+
+    def __init__(self, name='scheduler', lease_seconds=LEASE_SECONDS, renew_seconds=RENEW_SECONDS):
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.renew_seconds = renew_seconds
+        self.holder = f'{socket.gethostname()}:{os.getpid()}:{id(self):x}'
+        self.backend = None
+        self._valid_until = 0.0
+        self._leader = False
+        self._since = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._schedulers = set()
+        self.counters = dict.fromkeys(('elections', 'demotions', 'errors'), 0)
+        self.jobs = {}  # job key -> counts
+
+    # Election
+
+    def init_app(self, app, backend=BACKEND):
+        from database import db
+
+        if self.backend is not None:
+            # One election per process, whatever the number of apps
+            return
+        with app.app_context():
+            dialect = db.engine.dialect.name
+            engine = db.engine
+        if backend == 'auto':
+            backend = 'postgresql' if dialect == 'postgresql' else 'sqlite'
+        if backend == 'postgresql':
+            self.backend = AdvisoryLock(self.name, engine)
+        elif backend == 'sqlite':
+            self.backend = SqliteLease(self.name, self.lease_seconds)
+        elif backend == 'off':
+            self.backend = AlwaysLeader()
+        else:
+            raise ValueError(f"Unknown LEADER_ELECTION backend '{backend}'")
+
+    def add_listener(self, callback):
+        """Call ``callback(is_leader)`` from the election thread whenever leadership changes"""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    @property
+    def is_leader(self):
+        return self._leader and time.time() < self._valid_until
+
+    def campaign(self):
+        """One acquire/renew attempt; returns whether this process leads"""
+        try:
+            won = self.backend.acquire(self.holder)
+        except Exception as e:
+            self.counters['errors'] += 1
+            logger.warning(f"Leader election ({self.backend.name}) failed: {str(e)}")
+            # Keep leading until the lease would have run out; nobody else can take it sooner
+            won = self._leader and time.time() < self._valid_until
+        else:
+            if won:
+                self._valid_until = time.time() + self.lease_seconds
+        self._set_leader(won)
+        return won
+
+    def _set_leader(self, leader):
+        with self._lock:
+            if leader == self._leader:
+                return
+            self._leader = leader
+            if leader:
+                self._since = datetime.utcnow()
+                self.counters['elections'] += 1
+            else:
+                self._since = None
+                self._valid_until = 0.0
+                self.counters['demotions'] += 1
+        if leader:
+            logger.info(f"This process ({self.holder}) is now the scheduler leader ({self.backend.name})")
+        else:
+            logger.warning(f"This process ({self.holder}) lost the scheduler leadership")
+        for callback in list(self._listeners):
+            try:
+                callback(leader)
+            except Exception as e:
+                logger.error(f"Leadership listener error: {str(e)}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.campaign()
+            self._stop.wait(self.renew_seconds)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='leader-election', daemon=True)
+            self._thread.start()
+
+    def shutdown(self):
+        """Step down so a follower takes over on its next attempt instead of waiting for the lease"""
+        self._stop.set()
+        if self.backend is not None and self._leader:
+            try:
+                self.backend.release(self.holder)
+            except Exception as e:
+                logger.warning(f"Error releasing leadership: {str(e)}")
+            self._set_leader(False)
+
+    # Jobs
+
+    def guard(self, func, job_id):
+        """``func`` wrapped to run only on the leader (returns SKIPPED elsewhere)"""
+        def leader_only(*args, **kwargs):
+            if not self.is_leader:
+                return SKIPPED
+            return func(*args, **kwargs)
+
+        leader_only.__name__ = getattr(func, '__name__', job_id)
+        leader_only.__wrapped__ = func
+        return leader_only
+
+    def _counts(self, job_id):
+        key = job_key(job_id)
+        counts = self.jobs.get(key)
+        if counts is None:
+            counts = self.jobs.setdefault(key, {'runs': 0, 'skipped': 0, 'errors': 0, 'missed': 0,
+                                                'last_run': None})
+        return counts
+
+    def record(self, job_id, ran=True):
+        """Count a leader-only action that is not an APScheduler job (e.g. one session start)"""
+        counts = self._counts(job_id)
+        if ran:
+            counts['runs'] += 1
+            counts['last_run'] = datetime.utcnow().isoformat()
+        else:
+            counts['skipped'] += 1
+
+    def _on_job_event(self, event):
+        from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_MISSED
+
+        if event.code == EVENT_JOB_ERROR:
+            self._counts(event.job_id)['errors'] += 1
+        elif event.code == EVENT_JOB_MISSED:
+            self._counts(event.job_id)['missed'] += 1
+        else:
+            self.record(event.job_id, ran=event.retval is not SKIPPED)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'holder': self.holder,
+                'backend': self.backend.name if self.backend else None,
+                'leader': self.is_leader,
+                'leader_since': self._since.isoformat() if self._since else None,
+                'current_holder': self.backend.current_holder() if self.backend else None,
+                'counters': dict(self.counters),
+                'jobs': {key: dict(counts) for key, counts in self.jobs.items()},
+            }
+
+
+leader_elector = LeaderElector()
+
+
+def register_leader_election(app, scheduler, campaign=True):
+    """Count job runs on ``scheduler`` and, in processes that run it, campaign for leadership"""
+    import atexit
+    from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED
+
+    leader_elector.init_app(app)
+    if id(scheduler) not in leader_elector._schedulers:
+        leader_elector._schedulers.add(id(scheduler))
+        scheduler.add_listener(leader_elector._on_job_event,
+                               EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+    if campaign:
+        # Decide before the first jobs run, then keep renewing in the background
+        leader_elector.campaign()
+        leader_elector.start()
+        atexit.register(leader_elector.shutdown)
@@ -0,0 +1,121 @@
+"""
+Batched live-performance counters for MLModel.
+
+Trade results are accumulated in memory per model and flushed periodically as
+atomic ``live_trades = live_trades + n`` increments in a single executemany
+UPDATE, so concurrent results never overwrite each other and no model row is
+loaded per trade. Accuracy is derived from the counters when read
+(``MLModel.live_accuracy``), together with this process's pending results.
+"""
+
+import os
+import logging
+import threading
+
+from sqlalchemy import bindparam
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL_SECONDS = int(os.getenv('LIVE_PERFORMANCE_FLUSH_SECONDS', 5))
+
+
+class LivePerformanceAccumulator:
+    """Thread-safe in-memory (trades, wins) deltas per model id"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def record(self, model_id, is_win):
+        """Count one trade result for a model; O(1), never touches the DB"""
+        with self._lock:
+            counts = self._pending.get(model_id)
+            if counts is None:
+                counts = self._pending[model_id] = [0, 0]
+            counts[0] += 1
+            if is_win:
+                counts[1] += 1
+
+    def pending(self, model_id):
+        """Unflushed (trades, wins) for a model"""
+        with self._lock:
+            trades, wins = self._pending.get(model_id, (0, 0))
+            return trades, wins
+
+    def _merge(self, batch):
+        with self._lock:
+            for model_id, (trades, wins) in batch.items():
+                counts = self._pending.setdefault(model_id, [0, 0])
+                counts[0] += trades
+                counts[1] += wins
+
+    def flush(self):
+        """Apply all pending deltas as atomic increments in one statement.
+
+        Must be called inside an application context. On failure the deltas
+        are put back so they are retried on the next flush.
+        """
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+
+        # Imported here: models imports this module lazily for MLModel.update_live_performance
+        from models import MLModel
+
+        table = MLModel.__table__
+        stmt = table.update().where(
+            table.c.id == bindparam('b_model_id')
+        ).values(
+            live_trades=db.func.coalesce(table.c.live_trades, 0) + bindparam('b_trades'),
+            live_wins=db.func.coalesce(table.c.live_wins, 0) + bindparam('b_wins')
+        )
+        params = [
+            {'b_model_id': model_id, 'b_trades': trades, 'b_wins': wins}
+            for model_id, (trades, wins) in batch.items()
+        ]
+
+        try:
+            db.session.execute(stmt, params)
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Error flushing live performance counters: {str(e)}")
+            db.session.rollback()
+            self._merge(batch)
+            return 0
+
+        return sum(trades for trades, _ in batch.values())
+
+
+live_performance = LivePerformanceAccumulator()
+
+
+def flush_live_performance(app):
+    """Scheduler/atexit job: flush pending counters"""
+    with app.app_context():
+        try:
+            flushed = live_performance.flush()
+            if flushed:
+                logger.debug(f"Flushed {flushed} live trade results")
+        finally:
+            db.session.remove()
+
+
+def register_live_performance_flush(app, scheduler, background=True):
+    """Flush counters on an interval and, with ``background``, once more at shutdown"""
+    import atexit
+
+    scheduler.add_job(
+        flush_live_performance,
+        'interval',
+        seconds=FLUSH_INTERVAL_SECONDS,
+        args=[app],
+        id='live_performance_flush',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    if background:
+        atexit.register(flush_live_performance, app)
@@ -0,0 +1,53 @@
+"""
+Small SQLite files shared by every worker process on one machine.
+
+Used for state that has to agree across gunicorn workers but does not
+belong in the main database (revoked tokens, rate-limit buckets). Each
+thread gets its own connection in autocommit mode; the file runs in WAL
+mode so readers never wait for a writer.
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+
+
+def default_path(name):
+    """File under the system temp dir, e.g. /tmp/iqbot-<name>.sqlite3"""
+    return os.path.join(tempfile.gettempdir(), f'iqbot-{name}.sqlite3')
+
+
+class LocalStore:
+    """Per-thread connections to one SQLite file, created with ``schema`` on first use"""
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(self.schema)
+            self._local.conn = conn
+        return conn
+
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+    @contextmanager
+    def transaction(self):
+        """Write transaction taken up front, so read-modify-write is atomic across processes"""
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
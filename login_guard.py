@@ -0,0 +1,191 @@
+"""
+Bounded login pipeline: offloaded password hashing and rate limits.
+
+Password hashing (check_password_hash / generate_password_hash) is CPU-bound
+and runs in a pool of LOGIN_HASH_WORKERS threads; hashlib releases the GIL,
+so hashes run in parallel without tying up more threads than there are
+cores. At most LOGIN_HASH_QUEUE hashes may be queued or running; beyond that
+the request fails fast with 429 instead of waiting behind the burst.
+
+Token buckets in a SQLite file shared by all workers limit auth requests to
+RATE_LIMIT_PER_MINUTE per client IP and MAX_LOGIN_ATTEMPTS failed logins per
+email every LOGIN_ATTEMPT_WINDOW_SECONDS: every attempt takes an email token
+up front (so parallel guesses cannot get past the limit) and a successful
+login gives it back. The client IP is ``request.remote_addr``, which is the
+real client behind TRUSTED_PROXY_HOPS proxies (see create_app's ProxyFix).
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from local_store import LocalStore, default_path
+
+logger = logging.getLogger(__name__)
+
+HASH_WORKERS = int(os.getenv('LOGIN_HASH_WORKERS', os.cpu_count() or 2))
+HASH_QUEUE = int(os.getenv('LOGIN_HASH_QUEUE', 4 * HASH_WORKERS))
+HASH_TIMEOUT = float(os.getenv('LOGIN_HASH_TIMEOUT', 10.0))
+RATE_LIMIT_PER_MINUTE = int(os.getenv('RATE_LIMIT_PER_MINUTE', 60))
+MAX_LOGIN_ATTEMPTS = int(os.getenv('MAX_LOGIN_ATTEMPTS', 5))
+ATTEMPT_WINDOW_SECONDS = int(os.getenv('LOGIN_ATTEMPT_WINDOW_SECONDS', 900))
+DB_PATH = os.getenv('RATE_LIMIT_DB_PATH', default_path('rate-limits'))
+
+SCHEMA = ('CREATE TABLE IF NOT EXISTS rate_buckets '
+          '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL);')
+
+
+def _email_key(email):
+    return f'email:{email.strip().lower()}'
+
+
+class LoginOverloaded(Exception):
+    """Raised when the hashing queue is full; carries a Retry-After hint in seconds"""
+
+    def __init__(self, retry_after=1):
+        super().__init__('login pipeline overloaded')
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Bounded thread pool for password hashing"""
+
+    def __init__(self, workers=HASH_WORKERS, queue_size=HASH_QUEUE, timeout=HASH_TIMEOUT):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='login-hash')
+        self._slots = threading.BoundedSemaphore(max(workers, queue_size))
+        self.counters = dict.fromkeys(('hashed', 'rejected'), 0)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.counters['rejected'] += 1
+            raise LoginOverloaded()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            result = future.result(self.timeout)
+        except FutureTimeout:
+            raise LoginOverloaded()
+        self.counters['hashed'] += 1
+        return result
+
+    def check(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def generate(self, password):
+        return self._run(generate_password_hash, password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class RateLimiter:
+    """Token buckets shared across worker processes"""
+
+    def __init__(self, path=DB_PATH):
+        self.store = LocalStore(path, SCHEMA)
+
+    def take(self, key, capacity, per_seconds):
+        """Take one token from ``key``'s bucket; 0 when allowed, else seconds until a token is back"""
+        rate = capacity / per_seconds
+        now = time.time()
+        with self.store.transaction() as conn:
+            row = conn.execute('SELECT tokens, updated FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+            if tokens < 1:
+                return math.ceil((1 - tokens) / rate)
+            conn.execute('INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                         (key, tokens - 1, now))
+        return 0
+
+    def refund(self, key, capacity, per_seconds):
+        """Give back a token taken from ``key``'s bucket"""
+        rate = capacity / per_seconds
+        now = time.time()
+        with self.store.transaction() as conn:
+            row = conn.execute('SELECT tokens, updated FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return
+            tokens = min(capacity, row[0] + (now - row[1]) * rate + 1)
+            conn.execute('UPDATE rate_buckets SET tokens = ?, updated = ? WHERE key = ?', (tokens, now, key))
+
+    def purge(self, idle_seconds):
+        """Forget buckets that have been full again for a while"""
+        return self.store.execute(
+            'DELETE FROM rate_buckets WHERE updated < ?', (time.time() - idle_seconds,)).rowcount
+
+
+class LoginGuard:
+    """Rate limits plus the bounded hasher used by the auth routes"""
+
+    def __init__(self, hasher=None, limiter=None):
+        self.hasher = hasher or PasswordHasher()
+        self.limiter = limiter or RateLimiter()
+
+    def check_rate(self, ip, email=None):
+        """Seconds to wait before retrying, or 0 when the request may go on"""
+        try:
+            wait = self.limiter.take(f'ip:{ip}', RATE_LIMIT_PER_MINUTE, 60)
+            if not wait and email:
+                wait = self.limiter.take(_email_key(email), MAX_LOGIN_ATTEMPTS, ATTEMPT_WINDOW_SECONDS)
+            return wait
+        except Exception as e:
+            # A broken limiter store must not lock everyone out
+            logger.error(f"Rate limiter error: {str(e)}")
+            return 0
+
+    def login_succeeded(self, email):
+        """Give back the attempt taken by check_rate: only failed logins count against the email"""
+        try:
+            self.limiter.refund(_email_key(email), MAX_LOGIN_ATTEMPTS, ATTEMPT_WINDOW_SECONDS)
+        except Exception as e:
+            logger.error(f"Rate limiter error: {str(e)}")
+
+    def check_password(self, password_hash, password):
+        return self.hasher.check(password_hash, password)
+
+    def hash_password(self, password):
+        return self.hasher.generate(password)
+
+    def stats(self):
+        return dict(self.hasher.counters)
+
+
+login_guard = LoginGuard()
+
+
+def too_many_requests(retry_after):
+    """429 response in the API's format"""
+    from flask import jsonify
+
+    response = jsonify({'message': 'Muitas tentativas. Tente novamente em instantes.'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(int(retry_after) or 1)
+    return response
+
+
+def register_login_guard(scheduler, background=True):
+    """Purge idle rate-limit buckets and, with ``background``, stop the hashing pool at exit"""
+    import atexit
+
+    scheduler.add_job(
+        login_guard.limiter.purge,
+        'interval',
+        args=(2 * max(ATTEMPT_WINDOW_SECONDS, 60),),
+        seconds=3600,
+        id='purge_rate_buckets',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    if background:
+        atexit.register(login_guard.hasher.shutdown)
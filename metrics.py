@@ -0,0 +1,364 @@
+"""
+Request, SQL and broker metrics in the Prometheus text format.
+
+- ``http_request_duration_seconds{method,route,status}``: latency histogram
+  per route (the URL rule, so ``/api/bot/<id>`` is one series)
+- ``http_request_sql_statements{route}`` / ``http_request_sql_seconds{route}``:
+  statements and database time per request, from the engine's cursor events
+- ``sql_statements_total{route}``: statements issued, ``route="background"``
+  for the scheduler, bots and write-behind
+- ``broker_calls_total{method,outcome}`` / ``broker_call_duration_seconds{method}``:
+  calls on the pooled broker sessions
+- ``http_request_query_budget_exceeded_total{route}``: requests that went over
+  METRICS_QUERY_BUDGET statements, or ran one statement more than
+  METRICS_REPEAT_BUDGET times (the N+1 pattern); each one is also logged
+  with the repeated SQL
+
+Every process dumps its counters to METRICS_DIR and ``GET /metrics`` adds up
+the files, so a scrape answered by any gunicorn worker covers all of them
+(plus the bot worker sharing the directory).
+"""
+
+import os
+import hmac
+import json
+import time
+import logging
+import tempfile
+import threading
+from collections import Counter
+
+from flask import g, request, has_request_context, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes', 'on')
+QUERY_BUDGET = int(os.getenv('METRICS_QUERY_BUDGET', 20))
+REPEAT_BUDGET = int(os.getenv('METRICS_REPEAT_BUDGET', 5))
+METRICS_DIR = os.getenv('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'iqbot-metrics')
+SYNC_SECONDS = int(os.getenv('METRICS_SYNC_SECONDS', 15))
+# Dumps not rewritten for this long belong to processes gone since (old deploys)
+STALE_SECONDS = 24 * 3600
+# Optional bearer token for GET /metrics
+TOKEN = os.getenv('METRICS_TOKEN', '')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class CounterMetric:
+    """Monotonic counter per label set"""
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def merge(self, labels, value):
+        self.inc(labels, value)
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, labels, value
+
+
+class HistogramMetric:
+    """Cumulative histogram per label set: bucket counts, sum and count"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+
+    def observe(self, labels, value):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[0][i] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def merge(self, labels, value):
+        entry = self.values.get(labels)
+        if entry is None:
+            self.values[labels] = [list(value[0]), value[1], value[2]]
+            return
+        entry[0] = [a + b for a, b in zip(entry[0], value[0])]
+        entry[1] += value[1]
+        entry[2] += value[2]
+
+    def samples(self):
+        for labels, (buckets, total, count) in self.values.items():
+            for bound, value in zip(self.buckets, buckets):
+                yield f'{self.name}_bucket', labels + (('le', _number(bound)),), value
+            yield f'{self.name}_bucket', labels + (('le', '+Inf'),), count
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, count
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    """This process's metrics, and the text exposition of all processes"""
+
+    def __init__(self, directory=METRICS_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.metrics = {}
+
+    def add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labels):
+        return self.add(CounterMetric(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels, buckets=LATENCY_BUCKETS):
+        return self.add(HistogramMetric(name, help_text, labels, buckets))
+
+    def inc(self, metric, labels, amount=1):
+        with self._lock:
+            metric.inc(tuple(zip(metric.labels, labels)), amount)
+
+    def observe(self, metric, labels, value):
+        with self._lock:
+            metric.observe(tuple(zip(metric.labels, labels)), value)
+
+    def snapshot(self):
+        """Metric name -> [(labels, value)] as plain JSON data"""
+        with self._lock:
+            return {name: [[list(labels), value] for labels, value in metric.values.items()]
+                    for name, metric in self.metrics.items()}
+
+    def _path(self):
+        return os.path.join(self.directory, f'{os.getpid()}.json')
+
+    def dump(self):
+        """Write this process's counters for the other processes' /metrics"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = f'{self._path()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp, self._path())
+        except OSError as e:
+            logger.warning(f"Could not write metrics to {self.directory}: {str(e)}")
+
+    def _load_others(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        own = os.path.basename(self._path())
+        snapshots = []
+        now = time.time()
+        for name in names:
+            if not name.endswith('.json') or name == own:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > STALE_SECONDS:
+                    os.remove(path)
+                    continue
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                # Being replaced or left half-written by a killed process
+                continue
+        return snapshots
+
+    def render(self):
+        """Prometheus text format (0.0.4) summed over every process's dump"""
+        self.dump()
+        merged = {name: type(metric)(*self._definition(metric)) for name, metric in self.metrics.items()}
+        for snapshot in [self.snapshot()] + self._load_others():
+            for name, series in snapshot.items():
+                metric = merged.get(name)
+                if metric is None:
+                    continue
+                for labels, value in series:
+                    metric.merge(tuple(tuple(pair) for pair in labels), value)
+
+        lines = []
+        for metric in merged.values():
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels)
+                lines.append(f'{name}{{{label_text}}} {_number(value)}' if label_text else f'{name} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _definition(metric):
+        if isinstance(metric, HistogramMetric):
+            return metric.name, metric.help, metric.labels, metric.buckets
+        return metric.name, metric.help, metric.labels
+
+
+registry = MetricsRegistry()
+
+http_duration = registry.histogram(
+    'http_request_duration_seconds', 'Request latency by route', ('method', 'route', 'status'))
+http_sql_statements = registry.histogram(
+    'http_request_sql_statements', 'SQL statements per request', ('route',), COUNT_BUCKETS)
+http_sql_seconds = registry.histogram(
+    'http_request_sql_seconds', 'Database time per request', ('route',))
+sql_statements = registry.counter(
+    'sql_statements_total', 'SQL statements executed', ('route',))
+query_budget_exceeded = registry.counter(
+    'http_request_query_budget_exceeded_total', 'Requests over the SQL statement budget', ('route',))
+broker_calls = registry.counter(
+    'broker_calls_total', 'Calls on pooled broker sessions', ('method', 'outcome'))
+broker_duration = registry.histogram(
+    'broker_call_duration_seconds', 'Broker call latency', ('method',))
+
+
+def _route():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+# Requests
+
+def _before_request():
+    g._metrics = {'started': time.perf_counter(), 'statements': Counter(), 'sql_seconds': 0.0, 'done': False}
+
+
+def _finish(status):
+    state = g.get('_metrics')
+    if state is None or state['done']:
+        return
+    state['done'] = True
+    route = _route()
+    elapsed = time.perf_counter() - state['started']
+    count = sum(state['statements'].values())
+    registry.observe(http_duration, (request.method, route, str(status)), elapsed)
+    registry.observe(http_sql_statements, (route,), count)
+    registry.observe(http_sql_seconds, (route,), state['sql_seconds'])
+
+    if not count:
+        return
+    statement, repeats = state['statements'].most_common(1)[0]
+    if count > QUERY_BUDGET or repeats > REPEAT_BUDGET:
+        registry.inc(query_budget_exceeded, (route,))
+        logger.warning(
+            f"Query budget exceeded on {request.method} {route}: {count} statements "
+            f"({state['sql_seconds'] * 1000:.1f} ms), most repeated x{repeats}: {' '.join(statement.split())[:200]}")
+
+
+def _after_request(response):
+    _finish(response.status_code)
+    return response
+
+
+def _teardown_request(exc):
+    # after_request is skipped when the view raised
+    if exc is not None:
+        _finish(500)
+
+
+# SQL
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_started')
+    elapsed = time.perf_counter() - started.pop() if started else 0.0
+    state = g.get('_metrics') if has_request_context() else None
+    if state is None:
+        registry.inc(sql_statements, ('background',))
+        return
+    state['statements'][statement] += 1
+    state['sql_seconds'] += elapsed
+    registry.inc(sql_statements, (_route(),))
+
+
+# Broker
+
+class InstrumentedBrokerService:
+    """Proxy timing every method called on a broker service"""
+
+    def __init__(self, service):
+        self._service = service
+
+    def __getattr__(self, name):
+        attribute = getattr(self._service, name)
+        if name.startswith('_') or not callable(attribute):
+            return attribute
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = 'error'
+            try:
+                result = attribute(*args, **kwargs)
+                outcome = 'ok'
+                return result
+            finally:
+                registry.inc(broker_calls, (name, outcome))
+                registry.observe(broker_duration, (name,), time.perf_counter() - started)
+
+        return timed
+
+
+def instrument_broker(service):
+    """``service`` wrapped for broker call metrics (unchanged with METRICS_ENABLED=false)"""
+    return InstrumentedBrokerService(service) if ENABLED else service
+
+
+# Endpoint
+
+def metrics_endpoint():
+    if TOKEN:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(supplied, TOKEN):
+            return Response('unauthorized\n', status=401, mimetype='text/plain')
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def register_metrics(app, scheduler=None, background=True):
+    """Time the requests, SQL statements and broker calls of ``app`` and serve GET /metrics"""
+    if not ENABLED:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
+
+    if not event.contains(Engine, 'after_cursor_execute', _after_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        if background:
+            import atexit
+            atexit.register(registry.dump)
+
+    if scheduler is not None:
+        # Processes that are never scraped (the bot worker) still show up in the sum
+        scheduler.add_job(
+            registry.dump,
+            'interval',
+            seconds=SYNC_SECONDS,
+            id='metrics_dump',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
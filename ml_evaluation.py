@@ -0,0 +1,183 @@
+"""
+Walk-forward evaluation of the ML model types.
+
+History for each asset is split into rolling windows: train on ``train_size``
+consecutive trades, test on the following ``test_size`` trades, then slide by
+``step``. Only the latest WALK_FORWARD_MAX_WINDOWS windows of an asset are
+evaluated. Every (asset, model type, window) fit is independent, so they run in
+a process pool across all cores. Per-window out-of-sample metrics are stored
+in ModelEvaluation and can be averaged to pick models for production.
+"""
+
+import os
+import uuid
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from database import db
+from models import MLModel, ModelEvaluation, TradeHistory
+from ml_training import MODEL_TYPES, load_trade_matrix
+
+logger = logging.getLogger(__name__)
+
+WALK_FORWARD_TRAIN_SIZE = int(os.getenv('WALK_FORWARD_TRAIN_SIZE', 500))
+WALK_FORWARD_TEST_SIZE = int(os.getenv('WALK_FORWARD_TEST_SIZE', 100))
+WALK_FORWARD_WORKERS = int(os.getenv('WALK_FORWARD_WORKERS', 0)) or os.cpu_count() or 1
+WALK_FORWARD_MAX_WINDOWS = int(os.getenv('WALK_FORWARD_MAX_WINDOWS', 200))
+# Upper bounds for request parameters
+MAX_TRAIN_SIZE = 100000
+MAX_TEST_SIZE = 10000
+MAX_ASSETS = 50
+
+
+def rolling_windows(n_samples, train_size, test_size, step=None, max_windows=None):
+    """Yield (train_slice, test_slice) pairs over ``n_samples`` ordered samples.
+
+    With ``max_windows`` only the latest windows are produced.
+    """
+    step = test_size if step is None else step
+    if step <= 0 or train_size <= 0 or test_size <= 0:
+        raise ValueError('train_size, test_size and step must be positive')
+    start = 0
+    total = (n_samples - train_size - test_size) // step + 1
+    if max_windows is not None and total > max_windows:
+        start = (total - max_windows) * step
+    while start + train_size + test_size <= n_samples:
+        train_end = start + train_size
+        yield slice(start, train_end), slice(train_end, train_end + test_size)
+        start += step
+
+
+def _evaluate_window(model_type, X_train, y_train, X_test, y_test):
+    """Fit one model type on a training window and score it on the test window.
+
+    Runs in a worker process, so it only receives arrays and returns a dict.
+    """
+    import numpy as np
+    from ml_training import _fit_full, score_predictions
+
+    if len(np.unique(y_train)) < 2:
+        return None
+    artifact = _fit_full(model_type, X_train, y_train)
+    y_pred = artifact['estimator'].predict(artifact['scaler'].transform(X_test))
+    return score_predictions(y_test, y_pred)
+
+
+def run_walk_forward(user_id, assets=None, model_types=MODEL_TYPES, train_size=None,
+                     test_size=None, step=None, max_workers=None, run_id=None):
+    """Evaluate every model type on rolling windows of each asset's history.
+
+    Must be called inside an application context. Returns the run id; the
+    per-window rows are stored in ModelEvaluation under it.
+    """
+    train_size = train_size or WALK_FORWARD_TRAIN_SIZE
+    test_size = test_size or WALK_FORWARD_TEST_SIZE
+    run_id = run_id or uuid.uuid4().hex
+
+    if assets is None:
+        assets = [row[0] for row in db.session.query(TradeHistory.asset)
+                  .filter(TradeHistory.user_id == user_id).distinct().all()]
+
+    # Load every asset's history in the parent; workers never touch the DB
+    tasks = []
+    for asset in assets:
+        timestamps, X, y = load_trade_matrix(user_id, asset)
+        windows = rolling_windows(len(y), train_size, test_size, step, max_windows=WALK_FORWARD_MAX_WINDOWS)
+        for index, (train, test) in enumerate(windows):
+            window = {
+                'asset': asset,
+                'window_index': index,
+                'train_start': timestamps[train.start].astype(datetime),
+                'train_end': timestamps[train.stop - 1].astype(datetime),
+                'test_start': timestamps[test.start].astype(datetime),
+                'test_end': timestamps[test.stop - 1].astype(datetime),
+                'train_samples': train.stop - train.start,
+                'test_samples': test.stop - test.start,
+            }
+            for model_type in model_types:
+                tasks.append((window, model_type, (X[train], y[train], X[test], y[test])))
+
+    if not tasks:
+        logger.info(f"Walk-forward run {run_id}: not enough history for user {user_id}")
+        return run_id
+
+    # spawn: forking a process that runs scheduler/server threads is unsafe
+    context = multiprocessing.get_context('spawn')
+    workers = min(max_workers or WALK_FORWARD_WORKERS, len(tasks))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {
+            executor.submit(_evaluate_window, model_type, *arrays): (window, model_type)
+            for window, model_type, arrays in tasks
+        }
+        for future in as_completed(futures):
+            window, model_type = futures[future]
+            try:
+                metrics = future.result()
+            except Exception as e:
+                logger.error(f"Walk-forward window failed ({model_type}, {window['asset']}): {str(e)}")
+                continue
+            if metrics is None:
+                continue
+            db.session.add(ModelEvaluation(run_id=run_id, user_id=user_id, model_type=model_type,
+                                           **window, **metrics))
+
+    db.session.commit()
+    logger.info(f"Walk-forward run {run_id}: {len(tasks)} fits for user {user_id} on {workers} workers")
+    return run_id
+
+
+def summarize_run(run_id):
+    """Average out-of-sample metrics per (asset, model type) for a run"""
+    rows = db.session.query(
+        ModelEvaluation.asset,
+        ModelEvaluation.model_type,
+        db.func.count(ModelEvaluation.id),
+        db.func.avg(ModelEvaluation.accuracy),
+        db.func.avg(ModelEvaluation.precision),
+        db.func.avg(ModelEvaluation.recall),
+        db.func.avg(ModelEvaluation.f1_score),
+        db.func.sum(ModelEvaluation.test_samples),
+    ).filter(
+        ModelEvaluation.run_id == run_id
+    ).group_by(
+        ModelEvaluation.asset, ModelEvaluation.model_type
+    ).all()
+
+    return [{
+        'asset': asset,
+        'model_type': model_type,
+        'windows': windows,
+        'accuracy': accuracy,
+        'precision': precision,
+        'recall': recall,
+        'f1_score': f1,
+        'test_samples': int(test_samples or 0),
+    } for asset, model_type, windows, accuracy, precision, recall, f1, test_samples in rows]
+
+
+def apply_run_to_models(user_id, run_id):
+    """Store a run's averaged metrics on the user's matching MLModel rows"""
+    summary = {(row['asset'], row['model_type']): row for row in summarize_run(run_id)}
+    for ml_model in MLModel.query.filter_by(user_id=user_id).all():
+        row = summary.get((ml_model.asset, ml_model.model_type))
+        if row:
+            ml_model.accuracy = row['accuracy']
+            ml_model.precision = row['precision']
+            ml_model.recall = row['recall']
+            ml_model.f1_score = row['f1_score']
+    db.session.commit()
+
+
+def run_walk_forward_job(app, user_id, run_id, **kwargs):
+    """Scheduler job wrapper for run_walk_forward"""
+    with app.app_context():
+        try:
+            run_walk_forward(user_id, run_id=run_id, **kwargs)
+            apply_run_to_models(user_id, run_id)
+        except Exception as e:
+            logger.error(f"Walk-forward run {run_id} failed: {str(e)}")
+            db.session.rollback()
+        finally:
+            db.session.remove()
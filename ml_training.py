@@ -0,0 +1,330 @@
+"""
+Incremental retraining of the per-user ML models.
+
+Each MLModel keeps a serialized estimator under ML_MODELS_DIR. Instead of
+refitting on the whole trade history, a retraining run only reads the trades
+closed after ``MLModel.training_end_date`` and updates the estimator in place:
+``partial_fit`` for the SVM (linear, hinge loss) and neural network models and
+warm-started extra trees/stages for the random forest and gradient boosting
+models. An ensemble that has grown to ML_RETRAIN_MAX_TREES is rebuilt from the
+full history instead. Runs are dispatched as jobs on the application's
+APScheduler instance; a run that finds the user at the concurrency limit is
+rescheduled ML_RETRAIN_DEFER_SECONDS later.
+"""
+
+import os
+import pickle
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from database import db
+from models import MLModel, TradeHistory
+
+logger = logging.getLogger(__name__)
+
+ML_MODELS_DIR = os.getenv('ML_MODELS_DIR', 'ml_models')
+RETRAIN_INTERVAL_MINUTES = int(os.getenv('ML_RETRAIN_INTERVAL_MINUTES', 30))
+MAX_CONCURRENT_RETRAINS_PER_USER = int(os.getenv('ML_RETRAIN_MAX_CONCURRENT_PER_USER', 1))
+MIN_NEW_SAMPLES = int(os.getenv('ML_RETRAIN_MIN_SAMPLES', 20))
+TREES_PER_INCREMENT = int(os.getenv('ML_RETRAIN_TREES_PER_INCREMENT', 10))
+MAX_TREES = int(os.getenv('ML_RETRAIN_MAX_TREES', 300))
+DEFER_SECONDS = int(os.getenv('ML_RETRAIN_DEFER_SECONDS', 60))
+
+# Numeric TradeHistory columns used as model inputs, in column order
+NUMERIC_FEATURES = (
+    'signal_strength', 'rsi_value', 'macd_value', 'macd_signal_value',
+    'ma_short_value', 'ma_long_value', 'aroon_up', 'aroon_down',
+    'ml_confidence', 'volatility', 'martingale_level',
+)
+FEATURE_NAMES = NUMERIC_FEATURES + ('direction', 'trend_direction')
+
+MODEL_TYPES = ('random_forest', 'gradient_boost', 'svm', 'neural_network')
+
+_DIRECTION_CODES = {'call': 1.0, 'put': -1.0}
+_TREND_CODES = {'up': 1.0, 'down': -1.0, 'sideways': 0.0}
+
+# Per-user semaphores limiting how many retraining jobs run at once
+_user_slots = {}
+_user_slots_lock = threading.Lock()
+
+
+def load_trade_matrix(user_id, asset=None, since=None, until=None):
+    """Load closed trades as a (timestamps, X, y) columnar extract.
+
+    Only the feature columns are selected, so no ORM instances are built.
+    Trades are ordered by timestamp; ties are excluded from the labels.
+    """
+    import numpy as np
+
+    columns = [getattr(TradeHistory, name) for name in NUMERIC_FEATURES]
+    query = db.session.query(
+        TradeHistory.timestamp,
+        TradeHistory.direction,
+        TradeHistory.trend_direction,
+        TradeHistory.result,
+        *columns
+    ).filter(
+        TradeHistory.user_id == user_id,
+        TradeHistory.result.in_(('win', 'loss'))
+    )
+    if asset:
+        query = query.filter(TradeHistory.asset == asset)
+    if since is not None:
+        query = query.filter(TradeHistory.timestamp > since)
+    if until is not None:
+        query = query.filter(TradeHistory.timestamp <= until)
+
+    rows = query.order_by(TradeHistory.timestamp).all()
+    if not rows:
+        return np.empty(0, dtype='datetime64[us]'), np.empty((0, len(FEATURE_NAMES))), np.empty(0, dtype=np.int8)
+
+    timestamps, directions, trends, results, *numeric = zip(*rows)
+    numeric = np.array(numeric, dtype=np.float64).T  # None -> nan
+    direction_col = np.array([_DIRECTION_CODES.get(d, 0.0) for d in directions])
+    trend_col = np.array([_TREND_CODES.get(t, 0.0) for t in trends])
+
+    X = np.nan_to_num(np.column_stack([numeric, direction_col, trend_col]), nan=0.0)
+    y = (np.array(results) == 'win').astype(np.int8)
+    return np.array(timestamps, dtype='datetime64[us]'), X, y
+
+
+def build_estimator(model_type):
+    """Create an untrained estimator that supports incremental updates"""
+    from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.neural_network import MLPClassifier
+
+    if model_type == 'random_forest':
+        return RandomForestClassifier(n_estimators=50, max_depth=8, warm_start=True, random_state=42)
+    if model_type == 'gradient_boost':
+        return GradientBoostingClassifier(n_estimators=50, max_depth=3, warm_start=True, random_state=42)
+    if model_type == 'svm':
+        # Linear SVM trained by SGD so it can be updated with partial_fit
+        return SGDClassifier(loss='hinge', alpha=1e-4, random_state=42)
+    if model_type == 'neural_network':
+        return MLPClassifier(hidden_layer_sizes=(32, 16), learning_rate_init=1e-3, random_state=42)
+    raise ValueError(f"Unsupported model type: {model_type}")
+
+
+def score_predictions(y_true, y_pred):
+    """Classification metrics as stored on MLModel (fractions between 0 and 1)"""
+    from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+
+    return {
+        'accuracy': float(accuracy_score(y_true, y_pred)),
+        'precision': float(precision_score(y_true, y_pred, zero_division=0)),
+        'recall': float(recall_score(y_true, y_pred, zero_division=0)),
+        'f1_score': float(f1_score(y_true, y_pred, zero_division=0)),
+    }
+
+
+def model_path(ml_model):
+    """Path of the serialized estimator for an MLModel row"""
+    return os.path.join(ML_MODELS_DIR, f'user_{ml_model.user_id}_model_{ml_model.id}.pkl')
+
+
+def load_artifact(ml_model):
+    """Load the stored scaler/estimator bundle, or None if never trained"""
+    path = model_path(ml_model)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def save_artifact(ml_model, artifact):
+    """Persist the scaler/estimator bundle atomically"""
+    os.makedirs(ML_MODELS_DIR, exist_ok=True)
+    path = model_path(ml_model)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(artifact, f)
+    os.replace(tmp_path, path)
+
+
+def _fit_full(model_type, X, y):
+    """Initial fit used when a model has no stored estimator yet"""
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler().fit(X)
+    estimator = build_estimator(model_type)
+    estimator.fit(scaler.transform(X), y)
+    return {'scaler': scaler, 'estimator': estimator, 'model_type': model_type}
+
+
+def _fit_incremental(artifact, X, y):
+    """Update a trained bundle with a new batch of samples"""
+    import numpy as np
+
+    scaler = artifact['scaler']
+    estimator = artifact['estimator']
+
+    if hasattr(estimator, 'partial_fit'):
+        scaler.partial_fit(X)
+        estimator.partial_fit(scaler.transform(X), y, classes=np.array([0, 1]))
+    elif getattr(estimator, 'warm_start', False):
+        # Tree ensembles cannot learn from a single-class batch
+        if len(np.unique(y)) < 2:
+            return False
+        # Keep the scaling the existing trees were grown with
+        estimator.n_estimators += TREES_PER_INCREMENT
+        estimator.fit(scaler.transform(X), y)
+    else:
+        return False
+    return True
+
+
+def _at_tree_limit(artifact):
+    """True when another warm-start increment would grow the ensemble past MAX_TREES"""
+    estimator = artifact['estimator']
+    return (getattr(estimator, 'warm_start', False)
+            and estimator.n_estimators + TREES_PER_INCREMENT > MAX_TREES)
+
+
+def retrain_model(model_id, incremental=True):
+    """Retrain one MLModel and update its stored metrics.
+
+    In incremental mode only trades newer than ``training_end_date`` are used.
+    The new batch is scored with the current estimator before it is learned
+    from (test-then-train), so the metrics always come from unseen trades.
+    Must be called inside an application context.
+    """
+    ml_model = db.session.get(MLModel, model_id)
+    if not ml_model or not ml_model.is_active:
+        return False
+
+    artifact = load_artifact(ml_model) if incremental else None
+    if artifact is not None and _at_tree_limit(artifact):
+        logger.info(f"Model {model_id} reached {MAX_TREES} trees, rebuilding it from the full history")
+        artifact = None
+    since = ml_model.training_end_date if artifact is not None else None
+    timestamps, X, y = load_trade_matrix(ml_model.user_id, ml_model.asset, since=since)
+
+    if len(y) < MIN_NEW_SAMPLES:
+        logger.info(f"Skipping retrain of model {model_id}: {len(y)} new samples")
+        return False
+
+    if artifact is None:
+        # Chronological hold-out for the metrics of the initial fit
+        split = max(1, int(len(y) * 0.8))
+        if len(set(y[:split])) < 2:
+            logger.info(f"Skipping retrain of model {model_id}: single-class history")
+            return False
+        holdout = _fit_full(ml_model.model_type, X[:split], y[:split])
+        metrics = score_predictions(y[split:], holdout['estimator'].predict(holdout['scaler'].transform(X[split:]))) \
+            if split < len(y) else None
+        artifact = _fit_full(ml_model.model_type, X, y)
+        ml_model.training_samples = len(y)
+        ml_model.training_start_date = timestamps[0].astype(datetime)
+    else:
+        metrics = score_predictions(y, artifact['estimator'].predict(artifact['scaler'].transform(X)))
+        if not _fit_incremental(artifact, X, y):
+            logger.info(f"Skipping retrain of model {model_id}: batch not usable for {ml_model.model_type}")
+            return False
+        ml_model.training_samples = (ml_model.training_samples or 0) + len(y)
+
+    save_artifact(ml_model, artifact)
+
+    if metrics:
+        ml_model.accuracy = metrics['accuracy']
+        ml_model.precision = metrics['precision']
+        ml_model.recall = metrics['recall']
+        ml_model.f1_score = metrics['f1_score']
+    ml_model.training_end_date = timestamps[-1].astype(datetime)
+    ml_model.last_retrained = datetime.utcnow()
+    db.session.commit()
+
+    logger.info(f"Model {model_id} retrained on {len(y)} samples (incremental={incremental}): {metrics}")
+    return True
+
+
+def _user_slot(user_id):
+    """Get the semaphore bounding concurrent retrains for a user"""
+    with _user_slots_lock:
+        slot = _user_slots.get(user_id)
+        if slot is None:
+            slot = threading.BoundedSemaphore(MAX_CONCURRENT_RETRAINS_PER_USER)
+            _user_slots[user_id] = slot
+        return slot
+
+
+def _defer(app, model_id, user_id, incremental):
+    """Run the retrain again DEFER_SECONDS from now (a later sweep replaces it)"""
+    scheduler = app.extensions.get('scheduler')
+    if scheduler is None:
+        logger.warning(f"Retrain of model {model_id} dropped: user {user_id} at concurrency limit")
+        return
+    scheduler.add_job(
+        run_retrain_job,
+        'date',
+        run_date=datetime.now() + timedelta(seconds=DEFER_SECONDS),
+        args=[app, model_id, user_id, incremental],
+        id=f'ml_retrain_{model_id}',
+        replace_existing=True,
+        max_instances=1,
+        misfire_grace_time=RETRAIN_INTERVAL_MINUTES * 60
+    )
+    logger.info(f"Retrain of model {model_id} deferred {DEFER_SECONDS}s: user {user_id} at concurrency limit")
+
+
+def run_retrain_job(app, model_id, user_id, incremental=True):
+    """Scheduler job: retrain a model while holding one of the user's slots"""
+    slot = _user_slot(user_id)
+    if not slot.acquire(blocking=False):
+        _defer(app, model_id, user_id, incremental)
+        return False
+
+    try:
+        with app.app_context():
+            try:
+                return retrain_model(model_id, incremental=incremental)
+            except Exception as e:
+                logger.error(f"Error retraining model {model_id}: {str(e)}")
+                db.session.rollback()
+                return False
+            finally:
+                db.session.remove()
+    finally:
+        slot.release()
+
+
+def schedule_retraining(app, scheduler):
+    """Sweep job: queue an incremental retrain for every active model"""
+    try:
+        import sklearn  # noqa: F401
+    except ImportError:
+        logger.warning("scikit-learn not available, skipping ML retraining")
+        return
+
+    with app.app_context():
+        models = db.session.query(MLModel.id, MLModel.user_id).filter(MLModel.is_active.is_(True)).all()
+        db.session.remove()
+
+    for model_id, user_id in models:
+        # One pending job per model; a sweep never stacks duplicates
+        scheduler.add_job(
+            run_retrain_job,
+            args=[app, model_id, user_id],
+            id=f'ml_retrain_{model_id}',
+            replace_existing=True,
+            max_instances=1,
+            misfire_grace_time=RETRAIN_INTERVAL_MINUTES * 60
+        )
+
+
+def register_retraining_jobs(app, scheduler):
+    """Register the periodic retraining sweep on the scheduler (run by the leader only)"""
+    from leader_election import leader_elector
+
+    scheduler.add_job(
+        leader_elector.guard(schedule_retraining, 'ml_retrain_sweep'),
+        'interval',
+        minutes=RETRAIN_INTERVAL_MINUTES,
+        args=[app, scheduler],
+        id='ml_retrain_sweep',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    logger.info(f"ML retraining sweep scheduled every {RETRAIN_INTERVAL_MINUTES} minutes")
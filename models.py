@@ -1,5 +1,7 @@
 from datetime import datetime
 import json
+from sqlalchemy import case
+from sqlalchemy.ext.hybrid import hybrid_property
 from database import db
 
 class User(db.Model):
@@ -182,10 +184,11 @@ class MLModel(db.Model):
     recall = db.Column(db.Float)
     f1_score = db.Column(db.Float)
     
-    # Live performance
+    # Live performance (incremented atomically by live_performance.flush). Databases created
+    # before these counters keep their stored live_accuracy column: it is left in place,
+    # nullable and no longer written, and can be dropped once no older deploy reads it
     live_trades = db.Column(db.Integer, default=0)
     live_wins = db.Column(db.Integer, default=0)
-    live_accuracy = db.Column(db.Float, default=0.0)
     
     # Model status
     is_active = db.Column(db.Boolean, default=True)
@@ -204,16 +207,60 @@ class MLModel(db.Model):
             return json.loads(self.parameters)
         return {}
     
+    @hybrid_property
+    def live_accuracy(self):
+        """Live win rate in percent, including this process's results not flushed yet"""
+        from live_performance import live_performance
+        pending_trades, pending_wins = live_performance.pending(self.id) if self.id is not None else (0, 0)
+        trades = (self.live_trades or 0) + pending_trades
+        if not trades:
+            return 0.0
+        return ((self.live_wins or 0) + pending_wins) / trades * 100
+
+    @live_accuracy.expression
+    def live_accuracy(cls):
+        # In SQL only the flushed counters are visible
+        return case((cls.live_trades > 0, cls.live_wins * 100.0 / cls.live_trades), else_=0.0)
+
     def update_live_performance(self, is_win):
-        """Update live performance metrics"""
-        self.live_trades += 1
-        if is_win:
-            self.live_wins += 1
-        self.live_accuracy = (self.live_wins / self.live_trades) * 100 if self.live_trades > 0 else 0
+        """Record a live trade result; counters are flushed in batches"""
+        from live_performance import live_performance
+        live_performance.record(self.id, is_win)
     
     def __repr__(self):
         return f'<MLModel {self.model_name} {self.asset} Acc:{self.accuracy}>'
 
+class ModelEvaluation(db.Model):
+    """Walk-forward evaluation metrics for one model type on one train/test window"""
+    __tablename__ = 'model_evaluations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.String(32), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+
+    asset = db.Column(db.String(20), nullable=False)
+    model_type = db.Column(db.String(30), nullable=False)  # 'random_forest', 'gradient_boost', 'svm', 'neural_network'
+    window_index = db.Column(db.Integer, nullable=False)
+
+    # Window boundaries
+    train_start = db.Column(db.DateTime)
+    train_end = db.Column(db.DateTime)
+    test_start = db.Column(db.DateTime)
+    test_end = db.Column(db.DateTime)
+    train_samples = db.Column(db.Integer, default=0)
+    test_samples = db.Column(db.Integer, default=0)
+
+    # Out-of-sample metrics
+    accuracy = db.Column(db.Float)
+    precision = db.Column(db.Float)
+    recall = db.Column(db.Float)
+    f1_score = db.Column(db.Float)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ModelEvaluation {self.model_type} {self.asset} #{self.window_index} Acc:{self.accuracy}>'
+
 class SystemLog(db.Model):
     """System logs for debugging and monitoring"""
     __tablename__ = 'system_logs'
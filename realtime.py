@@ -0,0 +1,252 @@
+"""
+Socket.IO push channel for the dashboard.
+
+Clients connect with their JWT (``io({auth: {token}})`` or ``?token=``) and
+join a private ``user_<id>`` room. Instead of polling ``/api/bot/status`` and
+``/api/dashboard/stats`` they receive:
+
+- ``bot_status``: the bot's status whenever it changes
+- ``trades``: trades created or updated since the last push
+- ``stats_delta``: increments to add to the ``/api/dashboard/stats`` counters
+
+Changes are coalesced per user and flushed every SOCKETIO_PUSH_SECONDS, so a
+burst of trades becomes a single message per event type.
+"""
+
+import os
+import logging
+import threading
+import itertools
+from collections import defaultdict
+from datetime import datetime
+from types import SimpleNamespace
+
+from flask import request
+from flask_jwt_extended import decode_token
+from flask_socketio import join_room, leave_room
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from token_revocation import revocation_store
+from write_behind import write_behind
+
+logger = logging.getLogger(__name__)
+
+PUSH_SECONDS = float(os.getenv('SOCKETIO_PUSH_SECONDS', 1.0))
+MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+
+CLOSED_RESULTS = ('win', 'loss', 'tie')
+_STAT_KEYS = ('total_trades', 'win_trades', 'loss_trades', 'total_profit', 'today_profit')
+
+
+def user_room(user_id):
+    return f'user_{user_id}'
+
+
+def trade_payload(trade):
+    return {
+        'id': trade.id,
+        'asset': trade.asset,
+        'direction': trade.direction,
+        'amount': trade.amount,
+        'result': trade.result,
+        'profit': trade.profit,
+        'timestamp': trade.timestamp.isoformat() if trade.timestamp else None,
+    }
+
+
+def stats_delta(trade, is_new, old_result=None, old_profit=0.0):
+    """Increments to the /api/dashboard/stats counters caused by a trade insert/update"""
+    won = int(trade.result == 'win') - int(old_result == 'win')
+    trades = 1 if is_new else 0
+    profit = (trade.profit or 0.0) - (old_profit or 0.0)
+    today = trade.timestamp is None or trade.timestamp.date() == datetime.utcnow().date()
+    return {
+        'total_trades': trades,
+        'win_trades': won,
+        # The dashboard counts every non-win trade as a loss
+        'loss_trades': trades - won,
+        'total_profit': profit,
+        'today_profit': profit if today else 0.0,
+    }
+
+
+class RealtimePublisher:
+    """Per-user coalescing buffer flushed to Socket.IO rooms"""
+
+    def __init__(self):
+        self.socketio = None
+        self._lock = threading.Lock()
+        self._trades = defaultdict(dict)  # user_id -> trade id -> payload (latest wins)
+        self._unkeyed = itertools.count()  # keys for trades inserted without their id
+        self._deltas = {}  # user_id -> summed stat increments
+        self._connections = defaultdict(int)  # user_id -> connected sockets in this process
+        self._last_status = {}
+        self._task = None
+
+    def init_app(self, socketio):
+        self.socketio = socketio
+
+    # Producers
+
+    def trade_changed(self, user_id, trade, delta):
+        with self._lock:
+            if not self._listening(user_id):
+                return
+            key = trade['id'] if trade['id'] is not None else ('new', next(self._unkeyed))
+            self._trades[user_id][key] = trade
+            if any(delta.values()):
+                totals = self._deltas.setdefault(user_id, dict.fromkeys(_STAT_KEYS, 0))
+                for key, value in delta.items():
+                    totals[key] += value
+
+    # Connections
+
+    def connected(self, user_id):
+        with self._lock:
+            self._connections[user_id] += 1
+            self._last_status.pop(user_id, None)  # send the current status on the next flush
+        self.start()
+
+    def disconnected(self, user_id):
+        with self._lock:
+            self._connections[user_id] -= 1
+            if self._connections[user_id] <= 0:
+                self._connections.pop(user_id, None)
+                self._last_status.pop(user_id, None)
+
+    # Flushing
+
+    def start(self):
+        with self._lock:
+            if self._task is None and self.socketio is not None:
+                self._task = self.socketio.start_background_task(self._run)
+
+    def _listening(self, user_id):
+        # Nothing is buffered without the flush task to drain it (e.g. a process with background
+        # jobs off); with a message queue another process may hold the user's socket
+        return self._task is not None and (MESSAGE_QUEUE or user_id in self._connections)
+
+    def flush(self):
+        """Emit everything accumulated since the last flush"""
+        with self._lock:
+            trades, self._trades = self._trades, defaultdict(dict)
+            deltas, self._deltas = self._deltas, {}
+            users = list(self._connections)
+
+        for user_id, changes in trades.items():
+            if self._listening(user_id):
+                self.socketio.emit('trades', list(changes.values()), to=user_room(user_id))
+        for user_id, delta in deltas.items():
+            if self._listening(user_id):
+                self.socketio.emit('stats_delta', delta, to=user_room(user_id))
+
+        from bot_manager import bot_manager
+        statuses = [(user_id, bot_manager.get_status(user_id)) for user_id in users]
+        with self._lock:
+            # Users who disconnected meanwhile get no entry back
+            changed = [(user_id, status) for user_id, status in statuses
+                       if user_id in self._connections and status != self._last_status.get(user_id)]
+            for user_id, status in changed:
+                self._last_status[user_id] = status
+        for user_id, status in changed:
+            self.socketio.emit('bot_status', status, to=user_room(user_id))
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(PUSH_SECONDS)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Realtime flush error: {str(e)}")
+
+
+publisher = RealtimePublisher()
+
+
+def _track_trade_changes(session, flush_context):
+    """Remember new and changed trades until the transaction commits"""
+    from models import TradeHistory
+
+    pending = session.info.setdefault('realtime_trades', [])
+    for trade in session.new:
+        if isinstance(trade, TradeHistory):
+            pending.append((trade.user_id, trade_payload(trade), stats_delta(trade, True)))
+    for trade in session.dirty:
+        if not isinstance(trade, TradeHistory):
+            continue
+        attrs = sa_inspect(trade).attrs
+        result, profit = attrs.result.history, attrs.profit.history
+        if not (result.has_changes() or profit.has_changes()):
+            continue
+        old_result = result.deleted[0] if result.deleted else trade.result
+        old_profit = profit.deleted[0] if profit.deleted else trade.profit
+        pending.append((trade.user_id, trade_payload(trade), stats_delta(trade, False, old_result, old_profit)))
+
+
+def _publish_committed_trades(session):
+    for user_id, trade, delta in session.info.pop('realtime_trades', []):
+        publisher.trade_changed(user_id, trade, delta)
+
+
+def _discard_trade_changes(session, previous_transaction=None):
+    session.info.pop('realtime_trades', None)
+
+
+def _publish_bulk_trades(rows):
+    """Trades inserted by the write-behind buffer bypass ORM events"""
+    for row in rows:
+        fields = dict.fromkeys(('id', 'asset', 'direction', 'amount', 'result', 'timestamp'))
+        fields['profit'] = 0.0
+        fields.update(row)
+        trade = SimpleNamespace(**fields)
+        publisher.trade_changed(trade.user_id, trade_payload(trade), stats_delta(trade, True))
+
+
+def register_realtime(app, socketio, background=True):
+    """Wire JWT-authenticated rooms, trade events and the push loop"""
+    publisher.init_app(socketio)
+    if MESSAGE_QUEUE and background:
+        # Trades may be produced here (e.g. the bot worker) for clients of other processes
+        publisher.start()
+
+    # after_flush: new trades have their ids, attribute history is still available
+    # (listeners are per process; a second app must not publish every trade twice)
+    if not event.contains(Session, 'after_commit', _publish_committed_trades):
+        event.listen(Session, 'after_flush', _track_trade_changes)
+        event.listen(Session, 'after_commit', _publish_committed_trades)
+        event.listen(Session, 'after_soft_rollback', _discard_trade_changes)
+    write_behind.add_listener(_publish_bulk_trades)
+
+    connected_users = {}  # socket id -> user_id
+
+    def _authenticate(auth):
+        token = (auth or {}).get('token') or request.args.get('token')
+        if not token:
+            return None
+        try:
+            decoded = decode_token(token)
+        except Exception:
+            return None
+        # decode_token does not run the blocklist check
+        if revocation_store.is_revoked(decoded.get('jti', '')):
+            return None
+        return decoded[app.config.get('JWT_IDENTITY_CLAIM', 'sub')]
+
+    @socketio.on('connect')
+    def on_connect(auth=None):
+        user_id = _authenticate(auth)
+        if user_id is None:
+            return False
+        user_id = int(user_id)
+        connected_users[request.sid] = user_id
+        join_room(user_room(user_id))
+        publisher.connected(user_id)
+        logger.info(f"Realtime client connected for user {user_id}")
+
+    @socketio.on('disconnect')
+    def on_disconnect(*args):
+        user_id = connected_users.pop(request.sid, None)
+        if user_id is not None:
+            leave_room(user_room(user_id))
+            publisher.disconnected(user_id)
@@ -0,0 +1,174 @@
+"""
+Vectorized Monte Carlo simulation of trading sessions under a TradingConfig.
+
+All sessions advance together as NumPy arrays, one trade per step: the stake
+follows the martingale ladder (base stake * multiplier ** level), wins pay
+``payout`` times the stake, ties return it. A session stops when the take
+profit or stop loss (percent of the starting balance) is reached, when the
+balance can no longer cover the next stake (bust), or after ``max_trades``.
+"""
+
+import os
+import logging
+
+import numpy as np
+
+from database import db
+from models import TradeHistory
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSIONS = int(os.getenv('RISK_SIM_SESSIONS', 200000))
+MAX_SESSIONS = int(os.getenv('RISK_SIM_MAX_SESSIONS', 1000000))
+DEFAULT_MAX_TRADES = int(os.getenv('RISK_SIM_MAX_TRADES', 100))
+MAX_TRADES = int(os.getenv('RISK_SIM_MAX_TRADES_LIMIT', 1000))
+# Profit per unit staked on a win when the user has no trades with a payout yet
+DEFAULT_PAYOUT = 0.8
+MAX_PAYOUT = 1.0
+MAX_BALANCE = 1e9
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+
+def empirical_trade_stats(user_id, asset=None):
+    """Win/tie rates and mean payout from the user's closed trades"""
+    query = db.session.query(
+        db.func.count(TradeHistory.id),
+        db.func.sum(db.case((TradeHistory.result == 'win', 1), else_=0)),
+        db.func.sum(db.case((TradeHistory.result == 'tie', 1), else_=0)),
+        db.func.avg(TradeHistory.payout_percentage)
+    ).filter(
+        TradeHistory.user_id == user_id,
+        TradeHistory.result.in_(('win', 'loss', 'tie'))
+    )
+    if asset:
+        query = query.filter(TradeHistory.asset == asset)
+
+    total, wins, ties, payout = query.one()
+    if not total:
+        return None
+    return {
+        'trades': total,
+        'win_rate': (wins or 0) / total,
+        'tie_rate': (ties or 0) / total,
+        'payout': (payout / 100) if payout else DEFAULT_PAYOUT,
+    }
+
+
+def simulate_sessions(balance, base_stake, win_rate, payout, take_profit, stop_loss,
+                      martingale_enabled=True, max_martingale_levels=3, martingale_multiplier=2.2,
+                      tie_rate=0.0, sessions=DEFAULT_SESSIONS, max_trades=DEFAULT_MAX_TRADES, seed=None):
+    """Simulate ``sessions`` independent sessions and summarize the outcomes.
+
+    ``take_profit`` and ``stop_loss`` are percentages of ``balance``;
+    ``payout`` is the profit per unit staked on a win (0.87 for 87%).
+    """
+    rng = np.random.default_rng(seed)
+    sessions = int(min(max(sessions, 1), MAX_SESSIONS))
+    # A session cannot climb past one level per trade, so deeper ladders are never used
+    max_levels = min(max(int(max_martingale_levels), 0), max_trades) if martingale_enabled else 0
+    tp_amount = balance * take_profit / 100
+    sl_amount = balance * stop_loss / 100
+    # Stake for each martingale level, indexed by the per-session level array
+    with np.errstate(over='ignore'):
+        # Stakes past the float range are inf: no balance covers them and the session busts
+        ladder = base_stake * martingale_multiplier ** np.arange(max_levels + 1)
+
+    # Final outcome per session
+    pnl = np.zeros(sessions)
+    max_drawdown = np.zeros(sessions)
+    trades = np.full(sessions, max_trades, dtype=np.int64)
+    busted = np.zeros(sessions, dtype=bool)
+
+    # State of the sessions still running, compacted as sessions finish
+    ids = np.arange(sessions, dtype=np.int32)
+    run_pnl = np.zeros(sessions)
+    run_peak = np.zeros(sessions)
+    run_drawdown = np.zeros(sessions)
+    level = np.zeros(sessions, dtype=np.int32)
+
+    def finish(done, trade_count):
+        nonlocal ids, run_pnl, run_peak, run_drawdown, level
+        finished = ids[done]
+        pnl[finished] = run_pnl[done]
+        max_drawdown[finished] = run_drawdown[done]
+        trades[finished] = trade_count
+        keep = ~done
+        ids, run_pnl, run_peak, run_drawdown, level = ids[keep], run_pnl[keep], run_peak[keep], run_drawdown[keep], level[keep]
+        return finished
+
+    for step in range(max_trades):
+        if ids.size == 0:
+            break
+
+        stake = ladder[level]
+        cannot_cover = balance + run_pnl < stake
+        if cannot_cover.any():
+            busted[finish(cannot_cover, step)] = True
+            stake = stake[~cannot_cover]
+            if ids.size == 0:
+                break
+
+        draw = rng.random(ids.size, dtype=np.float32)
+        win = draw < win_rate
+        loss = draw >= win_rate + tie_rate
+
+        delta = np.where(win, stake * payout, -stake)
+        if tie_rate > 0:
+            delta[~win & ~loss] = 0.0
+        run_pnl += delta
+
+        # Martingale: step up after a loss, reset after a win or after the last level
+        level = np.where(win, 0, level + loss)
+        level[level > max_levels] = 0
+
+        np.maximum(run_peak, run_pnl, out=run_peak)
+        np.maximum(run_drawdown, run_peak - run_pnl, out=run_drawdown)
+
+        done = (run_pnl >= tp_amount) | (run_pnl <= -sl_amount)
+        if done.any():
+            finish(done, step + 1)
+
+    # Sessions that hit max_trades
+    pnl[ids] = run_pnl
+    max_drawdown[ids] = run_drawdown
+
+    hist_counts, hist_edges = np.histogram(pnl, bins=20)
+    return {
+        'sessions': sessions,
+        'bust_probability': float(busted.mean()),
+        'take_profit_probability': float((pnl >= tp_amount).mean()),
+        'stop_loss_probability': float(((pnl <= -sl_amount) & ~busted).mean()),
+        'pnl': {
+            'mean': float(pnl.mean()),
+            'std': float(pnl.std()),
+            'percentiles': dict(zip(map(str, PERCENTILES), np.percentile(pnl, PERCENTILES).round(2).tolist())),
+            'histogram': {'counts': hist_counts.tolist(), 'edges': hist_edges.round(2).tolist()},
+        },
+        'max_drawdown': {
+            'mean': float(max_drawdown.mean()),
+            'percentiles': dict(zip(map(str, PERCENTILES), np.percentile(max_drawdown, PERCENTILES).round(2).tolist())),
+        },
+        'trades_per_session': {
+            'mean': float(trades.mean()),
+            'max': int(trades.max()),
+        },
+    }
+
+
+def simulate_config(config, balance, stats, **overrides):
+    """Run simulate_sessions with the parameters of a TradingConfig"""
+    base_stake = balance * config.balance_percentage / 100 if config.use_balance_percentage else config.trade_amount
+    params = {
+        'balance': balance,
+        'base_stake': base_stake,
+        'win_rate': stats['win_rate'],
+        'tie_rate': stats['tie_rate'],
+        'payout': stats['payout'],
+        'take_profit': config.take_profit,
+        'stop_loss': config.stop_loss,
+        'martingale_enabled': config.martingale_enabled,
+        'max_martingale_levels': config.max_martingale_levels,
+        'martingale_multiplier': config.martingale_multiplier,
+    }
+    params.update({key: value for key, value in overrides.items() if value is not None})
+    return params, simulate_sessions(**params)
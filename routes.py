@@ -1,6 +1,5 @@
 from flask import Blueprint, request, jsonify, render_template, redirect, url_for, current_app
 from flask_jwt_extended import jwt_required, create_access_token, get_jwt_identity, get_jwt
-from werkzeug.security import check_password_hash, generate_password_hash
 from datetime import datetime, timedelta
 from sqlalchemy import and_, or_, desc
 import logging
@@ -11,41 +10,17 @@ from sqlalchemy.orm import joinedload
 
 # Import models
 try:
-    from models import db, User, TradingConfig, TradeHistory, MLModel, SystemLog, MarketData
+    from models import db, User, TradingConfig, TradeHistory, MLModel, SystemLog, MarketData, ModelEvaluation
 except ImportError as e:
     logging.error(f"Error importing models in routes: {e}")
     raise
 
-# Import services with robust fallback system
-try:
-    from src.services import TradingBot, IQOptionService, SignalAnalyzer, MLService
-    logging.info("Services imported successfully in routes")
-except ImportError as e:
-    logging.error(f"Error importing services in routes: {e}")
-    # Create dummy classes to prevent import errors
-    class TradingBot:
-        def __init__(self, *args, **kwargs):
-            self.is_running = False
-        def start(self):
-            return False
-        def stop(self):
-            return True
-    class IQOptionService:
-        def __init__(self, *args, **kwargs):
-            self.is_connected = False
-            self.balance = 0.0
-        def connect(self):
-            return False
-    class SignalAnalyzer:
-        def __init__(self, *args, **kwargs):
-            pass
-        def analyze(self, *args, **kwargs):
-            return {'signal': 'HOLD', 'confidence': 0.0}
-    class MLService:
-        def __init__(self, *args, **kwargs):
-            pass
-        def predict(self, *args, **kwargs):
-            return {'prediction': 'HOLD', 'confidence': 0.0}
+from bot_manager import bot_manager
+from broker_pool import broker_pool
+from session_scheduler import session_scheduler, session_windows, session_labels, next_session_start
+from token_revocation import revocation_store
+from login_guard import login_guard, LoginOverloaded, too_many_requests
+from entity_cache import entity_cache
 
 # Create blueprints
 api = Blueprint('api', __name__, url_prefix='/api')
@@ -79,8 +54,21 @@ def set_cached_balance(user_id: int, balance: float):
     }
     logger.info(f"Cached balance for user {user_id}: ${balance}")
 
-# Blacklist for JWT tokens
-blacklisted_tokens = set()
+def number_param(data, name, kind, minimum, maximum):
+    """``data[name]`` as ``kind`` within [minimum, maximum], or None when absent.
+
+    Raises ValueError with a message for the client otherwise.
+    """
+    value = data.get(name)
+    if value is None:
+        return None
+    try:
+        number = kind(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f'{name} deve ser numérico')
+    if isinstance(value, bool) or (kind is int and float(value) != number) or not minimum <= number <= maximum:
+        raise ValueError(f'{name} deve estar entre {minimum} e {maximum}')
+    return number
 
 # Main routes
 @main.route('/')
@@ -102,10 +90,20 @@ def login():
     if not email or not password:
         return jsonify({'success': False, 'message': 'Email e senha são obrigatórios'}), 400
     
+    retry_after = login_guard.check_rate(request.remote_addr, email)
+    if retry_after:
+        return too_many_requests(retry_after)
+    
     user = User.query.filter_by(email=email).first()
     
-    if not user or not check_password_hash(user.password_hash, password):
-        return jsonify({'success': False, 'message': 'Credenciais inválidas'}), 401
+    try:
+        if not user or not login_guard.check_password(user.password_hash, password):
+            return jsonify({'success': False, 'message': 'Credenciais inválidas'}), 401
+    except LoginOverloaded as e:
+        # The password was never checked: not a failed attempt
+        login_guard.login_succeeded(email)
+        return too_many_requests(e.retry_after)
+    login_guard.login_succeeded(email)
     
     # Update last login
     user.last_login = datetime.utcnow()
@@ -152,6 +150,10 @@ def register():
     try:
         data = request.get_json()
         
+        retry_after = login_guard.check_rate(request.remote_addr)
+        if retry_after:
+            return too_many_requests(retry_after)
+        
         # Validate required fields
         required_fields = ['name', 'email', 'password', 'iq_email', 'iq_password']
         for field in required_fields:
@@ -162,11 +164,16 @@ def register():
         if User.query.filter_by(email=data['email']).first():
             return jsonify({'message': 'Email já cadastrado'}), 400
         
+        try:
+            password_hash = login_guard.hash_password(data['password'])
+        except LoginOverloaded as e:
+            return too_many_requests(e.retry_after)
+        
         # Create new user
         user = User(
             name=data['name'],
             email=data['email'],
-            password_hash=generate_password_hash(data['password']),
+            password_hash=password_hash,
             iq_email=data['iq_email'],
             iq_password=data['iq_password'],  # This should be encrypted in production
             account_type=data.get('account_type', 'PRACTICE')
@@ -215,10 +222,20 @@ def login_api():
         if not data.get('email') or not data.get('password'):
             return jsonify({'message': 'Email e senha são obrigatórios'}), 400
         
+        retry_after = login_guard.check_rate(request.remote_addr, data['email'])
+        if retry_after:
+            return too_many_requests(retry_after)
+        
         user = User.query.filter_by(email=data['email']).first()
         
-        if not user or not check_password_hash(user.password_hash, data['password']):
-            return jsonify({'message': 'Credenciais inválidas'}), 401
+        try:
+            if not user or not login_guard.check_password(user.password_hash, data['password']):
+                return jsonify({'message': 'Credenciais inválidas'}), 401
+        except LoginOverloaded as e:
+            # The password was never checked: not a failed attempt
+            login_guard.login_succeeded(data['email'])
+            return too_many_requests(e.retry_after)
+        login_guard.login_succeeded(data['email'])
         
         # Update last login
         user.last_login = datetime.utcnow()
@@ -251,8 +268,8 @@ def login_api():
 def logout_api():
     """Logout user and blacklist token"""
     try:
-        jti = get_jwt()['jti']
-        blacklisted_tokens.add(jti)
+        claims = get_jwt()
+        revocation_store.revoke(claims['jti'], claims['exp'])
         
         logger.info(f"User logged out: {get_jwt_identity()}")
         
@@ -269,7 +286,7 @@ def get_user_profile():
     """Get user profile information"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = entity_cache.get_user(user_id)
         
         if not user:
             return jsonify({'message': 'Usuário não encontrado'}), 404
@@ -294,7 +311,7 @@ def get_config():
     """Get user's trading configuration"""
     try:
         user_id = get_jwt_identity()
-        config = TradingConfig.query.filter_by(user_id=user_id).first()
+        config = entity_cache.get_config(user_id)
         
         if not config:
             return jsonify({'message': 'Configuração não encontrada'}), 404
@@ -309,7 +326,9 @@ def get_config():
             'martingale_enabled': config.martingale_enabled,
             'max_martingale_levels': config.max_martingale_levels,
             'morning_start': config.morning_start,
+            'morning_end': config.morning_end,
             'afternoon_start': config.afternoon_start,
+            'afternoon_end': config.afternoon_end,
             'operation_mode': config.operation_mode
         }), 200
         
@@ -340,12 +359,21 @@ def save_config():
         config.martingale_enabled = data.get('martingale_enabled', config.martingale_enabled)
         config.max_martingale_levels = data.get('max_martingale_levels', config.max_martingale_levels)
         config.morning_start = data.get('morning_start', config.morning_start)
+        config.morning_end = data.get('morning_end', config.morning_end)
         config.afternoon_start = data.get('afternoon_start', config.afternoon_start)
+        config.afternoon_end = data.get('afternoon_end', config.afternoon_end)
         config.operation_mode = data.get('operation_mode', config.operation_mode)
         config.updated_at = datetime.utcnow()
         
         db.session.add(config)
         db.session.commit()
+        entity_cache.invalidate_config(user_id)
+        session_scheduler.update_user(config)
+        # Running bots read the new strategy on their next tick
+        from strategy import strategies
+        strategies.publish(config)
+        if bot_manager.remote:
+            bot_manager.reload_strategy(user_id)
         
         logger.info(f"Configuration updated for user: {user_id}")
         
@@ -363,23 +391,29 @@ def start_bot():
     """Start the trading bot"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = entity_cache.get_user(user_id)
+        # The bot keeps its config for the whole session, so it gets a session-bound row
         config = TradingConfig.query.filter_by(user_id=user_id).first()
         
         if not user or not config:
             return jsonify({'message': 'Usuário ou configuração não encontrados'}), 404
         
-        # Create new bot instance and start it
-        from src.services.trading_bot import TradingBot
-        from flask import current_app
-        import app as app_module
+        if bot_manager.is_running(user_id):
+            return jsonify({'message': 'Bot já está em execução'}), 409
         
-        new_trading_bot = TradingBot(user_id, config, app=current_app._get_current_object())
-        success = new_trading_bot.start()
+        if bot_manager.remote:
+            # The bot worker process builds and owns the bot
+            success = bot_manager.start_bot(user_id)
+        else:
+            # Create new bot instance and start it under the user's registry slot
+            from bot_manager import create_bot
+            from strategy import strategies
+
+            strategies.publish(config)
+            new_trading_bot = create_bot(user_id, config, current_app._get_current_object())
+            success = bot_manager.start_bot(user_id, new_trading_bot)
         
         if success:
-            # Store the bot instance globally so it can be accessed by other endpoints
-            app_module.trading_bot = new_trading_bot
             logger.info(f"Bot started for user: {user_id}")
             return jsonify({'message': 'Bot iniciado com sucesso'}), 200
         else:
@@ -394,35 +428,13 @@ def start_bot():
 def stop_bot():
     """Stop the trading bot"""
     try:
-        from app import get_or_create_trading_bot
-        import app as app_module
-        
         user_id = get_jwt_identity()
-        trading_bot = get_or_create_trading_bot()
-        
-        # Check if bot has stop method
-        if not hasattr(trading_bot, 'stop'):
-            logger.warning(f"Bot instance does not have stop method for user: {user_id}")
-            # Clear the global bot instance anyway
-            app_module.trading_bot = None
-            return jsonify({'message': 'Bot parado com sucesso'}), 200
         
-        # Stop the bot
-        try:
-            success = trading_bot.stop()
-            if success:
-                # Clear the global bot instance
-                app_module.trading_bot = None
-                logger.info(f"Bot stopped successfully for user: {user_id}")
-                return jsonify({'message': 'Bot parado com sucesso'}), 200
-            else:
-                logger.error(f"Bot stop method returned False for user: {user_id}")
-                return jsonify({'message': 'Erro ao parar bot'}), 500
-        except Exception as stop_error:
-            logger.error(f"Error calling bot stop method for user {user_id}: {str(stop_error)}")
-            # Clear the global bot instance anyway
-            app_module.trading_bot = None
-            return jsonify({'message': 'Bot parado com sucesso'}), 200
+        if bot_manager.stop_bot(user_id):
+            logger.info(f"Bot stopped successfully for user: {user_id}")
+        else:
+            logger.info(f"No running bot to stop for user: {user_id}")
+        return jsonify({'message': 'Bot parado com sucesso'}), 200
         
     except Exception as e:
         logger.error(f"Stop bot error for user {get_jwt_identity()}: {str(e)}")
@@ -433,16 +445,8 @@ def stop_bot():
 def get_bot_status():
     """Get bot status"""
     try:
-        import app as app_module
-        
         user_id = get_jwt_identity()
-        
-        # Check if there's a real bot instance running
-        if app_module.trading_bot is not None:
-            status = app_module.trading_bot.get_bot_status(user_id)
-        else:
-            # No bot running, return default status
-            status = {'running': False, 'balance': 0}
+        status = bot_manager.get_bot_status(user_id)
         
         return jsonify(status), 200
         
@@ -498,15 +502,8 @@ def get_dashboard_stats():
         # Get profit history for chart (last 7 days)
         profit_history = get_profit_history(user_id, days=7)
         
-        # Get bot status and real balance
-        import app as app_module
-        
-        # Check if there's a real bot instance running
-        if app_module.trading_bot is not None:
-            bot_status = app_module.trading_bot.get_bot_status(user_id)
-        else:
-            # No bot running, return default status
-            bot_status = {'running': False, 'balance': 0}
+        # Get the user's bot status and real balance
+        bot_status = bot_manager.get_bot_status(user_id)
         
         # Get real balance from IQ Option efficiently with cache
         balance = 1000.0  # Default fallback
@@ -524,26 +521,20 @@ def get_dashboard_stats():
             if cached_balance is not None:
                 balance = cached_balance
             else:
-                # If no cache, connect temporarily to get real balance
+                # If no cache, read it through the user's pooled broker session
                 try:
-                    user = User.query.get(user_id)
+                    user = entity_cache.get_user(user_id)
                     if user and user.iq_email and user.iq_password:
-                        from src.services.iq_option_service import IQOptionService
-                        temp_service = IQOptionService(user.iq_email, user.iq_password)
-                        logger.info("Connecting to IQ Option to get real balance...")
-                        if temp_service.connect():
-                            real_balance = temp_service.update_balance()
-                            if real_balance > 0:
-                                balance = real_balance
-                                logger.info(f"Retrieved real balance from IQ Option: ${balance}")
-                                # Cache the balance
-                                set_cached_balance(user_id, balance)
-                            else:
-                                logger.warning("IQ Option returned 0 balance")
-                            temp_service.disconnect()
-                            logger.info("Disconnected from IQ Option")
+                        real_balance = broker_pool.get_balance(user.id, user.iq_email, user.iq_password)
+                        if real_balance:
+                            balance = real_balance
+                            logger.info(f"Retrieved real balance from IQ Option: ${balance}")
+                            # Cache the balance
+                            set_cached_balance(user_id, balance)
+                        elif real_balance is None:
+                            logger.error("Broker session unavailable for balance")
                         else:
-                            logger.error("Failed to connect to IQ Option for balance")
+                            logger.warning("IQ Option returned 0 balance")
                     else:
                         logger.warning("No IQ Option credentials found for user")
                 except Exception as e:
@@ -568,8 +559,8 @@ def get_dashboard_stats():
         }
         
         # Add Take Profit and Stop Loss information if bot is running
-        if bot_status.get('running', False) and app_module.trading_bot is not None:
-            full_status = app_module.trading_bot.get_status()
+        if bot_status.get('running', False) and bot_manager.is_running(user_id):
+            full_status = bot_manager.get_status(user_id)
             response_data.update({
                 'session_profit': full_status.get('session_profit', 0),
                 'take_profit_target': full_status.get('take_profit_target', 0),
@@ -655,6 +646,367 @@ def get_trade_history():
         logger.error(f"Get trade history error: {str(e)}")
         return jsonify({'message': 'Erro interno do servidor'}), 500
 
+# Broker credentials, trades and statistics routes
+@api.route('/iq-credentials', methods=['GET', 'POST'])
+@jwt_required()
+def iq_credentials():
+    """Get or update IQ Option credentials"""
+    user_id = get_jwt_identity()
+    
+    if request.method == 'GET':
+        cached_user = entity_cache.get_user(user_id)
+        if not cached_user:
+            return jsonify({'success': False, 'message': 'Usuário não encontrado'}), 404
+        return jsonify({
+            'success': True,
+            'has_credentials': bool(cached_user.iq_email and cached_user.iq_password),
+            'iq_email': cached_user.iq_email or ''
+        })
+    
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({'success': False, 'message': 'Usuário não encontrado'}), 404
+    
+    # POST - Update credentials
+    data = request.get_json()
+    iq_email = data.get('iq_email')
+    iq_password = data.get('iq_password')
+    
+    if not iq_email or not iq_password:
+        return jsonify({'success': False, 'message': 'Email e senha são obrigatórios'}), 400
+    
+    user.iq_email = iq_email
+    user.iq_password = iq_password
+    
+    db.session.commit()
+    entity_cache.invalidate_user(user.id)
+    
+    # Drop the pooled session logged in with the old credentials
+    broker_pool.evict(user.id)
+    
+    return jsonify({'success': True, 'message': 'Credenciais atualizadas com sucesso'})
+
+@api.route('/trades')
+@jwt_required()
+def get_trades():
+    """Get trade history"""
+    user_id = get_jwt_identity()
+    
+    # Get query parameters
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    page = int(request.args.get('page', 1))
+    per_page = int(request.args.get('per_page', 50))
+    
+    query = TradeHistory.query.filter_by(user_id=user_id)
+    
+    if start_date:
+        query = query.filter(TradeHistory.timestamp >= datetime.fromisoformat(start_date))
+    if end_date:
+        query = query.filter(TradeHistory.timestamp <= datetime.fromisoformat(end_date))
+    
+    trades = query.order_by(TradeHistory.timestamp.desc()).paginate(
+        page=page, per_page=per_page, error_out=False
+    )
+    
+    return jsonify({
+        'success': True,
+        'trades': [{
+            'id': trade.id,
+            'timestamp': trade.timestamp.isoformat(),
+            'asset': trade.asset,
+            'direction': trade.direction,
+            'amount': trade.amount,
+            'result': trade.result,
+            'profit': trade.profit,
+            'martingale_level': trade.martingale_level,
+            'signal_strength': trade.signal_strength
+        } for trade in trades.items],
+        'pagination': {
+            'page': trades.page,
+            'pages': trades.pages,
+            'per_page': trades.per_page,
+            'total': trades.total
+        }
+    })
+
+@api.route('/statistics')
+@jwt_required()
+def get_statistics():
+    """Get trading statistics"""
+    user_id = get_jwt_identity()
+    
+    # Get date range
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    
+    query = TradeHistory.query.filter_by(user_id=user_id)
+    
+    if start_date:
+        query = query.filter(TradeHistory.timestamp >= datetime.fromisoformat(start_date))
+    if end_date:
+        query = query.filter(TradeHistory.timestamp <= datetime.fromisoformat(end_date))
+    
+    trades = query.all()
+    
+    if not trades:
+        return jsonify({
+            'success': True,
+            'statistics': {
+                'total_trades': 0,
+                'wins': 0,
+                'losses': 0,
+                'win_rate': 0,
+                'total_profit': 0,
+                'best_streak': 0,
+                'worst_streak': 0,
+                'avg_profit_per_trade': 0
+            }
+        })
+    
+    total_trades = len(trades)
+    wins = len([t for t in trades if t.result == 'win'])
+    losses = total_trades - wins
+    win_rate = (wins / total_trades) * 100 if total_trades > 0 else 0
+    total_profit = sum(t.profit for t in trades)
+    avg_profit = total_profit / total_trades if total_trades > 0 else 0
+    
+    # Calculate streaks
+    current_streak = 0
+    best_streak = 0
+    worst_streak = 0
+    
+    for trade in trades:
+        if trade.result == 'win':
+            current_streak = max(0, current_streak) + 1
+            best_streak = max(best_streak, current_streak)
+        else:
+            current_streak = min(0, current_streak) - 1
+            worst_streak = min(worst_streak, current_streak)
+    
+    return jsonify({
+        'success': True,
+        'statistics': {
+            'total_trades': total_trades,
+            'wins': wins,
+            'losses': losses,
+            'win_rate': round(win_rate, 2),
+            'total_profit': round(total_profit, 2),
+            'best_streak': best_streak,
+            'worst_streak': abs(worst_streak),
+            'avg_profit_per_trade': round(avg_profit, 2)
+        }
+    })
+
+# ML evaluation routes
+@api.route('/ml/walk-forward', methods=['POST'])
+@jwt_required()
+def start_walk_forward():
+    """Queue a walk-forward evaluation of all model types"""
+    try:
+        import uuid
+        from ml_evaluation import run_walk_forward_job, MAX_TRAIN_SIZE, MAX_TEST_SIZE, MAX_ASSETS
+
+        user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+        try:
+            train_size = number_param(data, 'train_size', int, 20, MAX_TRAIN_SIZE)
+            test_size = number_param(data, 'test_size', int, 1, MAX_TEST_SIZE)
+            step = number_param(data, 'step', int, 1, MAX_TRAIN_SIZE)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        assets = data.get('assets')
+        if assets is not None and (not isinstance(assets, list) or len(assets) > MAX_ASSETS
+                                   or not all(isinstance(asset, str) and asset for asset in assets)):
+            return jsonify({'message': f'assets deve ser uma lista de até {MAX_ASSETS} ativos'}), 400
+
+        scheduler = current_app.extensions['scheduler']
+        job_id = f'walk_forward_{user_id}'
+        if scheduler.get_job(job_id):
+            return jsonify({'message': 'Avaliação já em andamento'}), 409
+
+        run_id = uuid.uuid4().hex
+        scheduler.add_job(
+            run_walk_forward_job,
+            args=[current_app._get_current_object(), user_id, run_id],
+            kwargs={
+                'assets': assets,
+                'train_size': train_size,
+                'test_size': test_size,
+                'step': step
+            },
+            id=job_id
+        )
+
+        logger.info(f"Walk-forward evaluation {run_id} queued for user: {user_id}")
+        return jsonify({'message': 'Avaliação iniciada', 'run_id': run_id}), 202
+
+    except Exception as e:
+        logger.error(f"Start walk-forward error: {str(e)}")
+        return jsonify({'message': 'Erro interno do servidor'}), 500
+
+@api.route('/ml/walk-forward/<run_id>', methods=['GET'])
+@jwt_required()
+def get_walk_forward(run_id):
+    """Get per-window metrics and averages of a walk-forward evaluation"""
+    try:
+        from ml_evaluation import summarize_run
+
+        user_id = get_jwt_identity()
+        windows = ModelEvaluation.query.filter_by(run_id=run_id, user_id=user_id)\
+            .order_by(ModelEvaluation.asset, ModelEvaluation.model_type, ModelEvaluation.window_index).all()
+
+        if not windows:
+            return jsonify({'message': 'Avaliação não encontrada ou em andamento'}), 404
+
+        return jsonify({
+            'run_id': run_id,
+            'summary': summarize_run(run_id),
+            'windows': [{
+                'asset': w.asset,
+                'model_type': w.model_type,
+                'window_index': w.window_index,
+                'train_start': w.train_start.isoformat() if w.train_start else None,
+                'train_end': w.train_end.isoformat() if w.train_end else None,
+                'test_start': w.test_start.isoformat() if w.test_start else None,
+                'test_end': w.test_end.isoformat() if w.test_end else None,
+                'train_samples': w.train_samples,
+                'test_samples': w.test_samples,
+                'accuracy': w.accuracy,
+                'precision': w.precision,
+                'recall': w.recall,
+                'f1_score': w.f1_score
+            } for w in windows]
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Get walk-forward error: {str(e)}")
+        return jsonify({'message': 'Erro interno do servidor'}), 500
+
+# Risk routes
+@api.route('/risk/simulate', methods=['POST'])
+@jwt_required()
+def simulate_risk():
+    """Monte Carlo simulation of sessions under the user's martingale settings"""
+    try:
+        from risk_simulator import (empirical_trade_stats, simulate_config, DEFAULT_PAYOUT, MAX_PAYOUT,
+                                    MAX_SESSIONS, MAX_TRADES, MAX_BALANCE)
+
+        user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+        try:
+            # win_rate in percent, payout as the profit per unit staked (0.87 for 87%)
+            win_rate = number_param(data, 'win_rate', float, 0, 100)
+            payout = number_param(data, 'payout', float, 0.01, MAX_PAYOUT)
+            sessions = number_param(data, 'sessions', int, 1, MAX_SESSIONS)
+            max_trades = number_param(data, 'max_trades', int, 1, MAX_TRADES)
+            balance = number_param(data, 'balance', float, 1, MAX_BALANCE)
+            seed = number_param(data, 'seed', int, 0, 2 ** 32 - 1)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+
+        config = entity_cache.get_config(user_id)
+        if not config:
+            return jsonify({'message': 'Configuração não encontrada'}), 404
+
+        stats = empirical_trade_stats(user_id, data.get('asset'))
+        if stats is None and win_rate is None:
+            return jsonify({'message': 'Histórico insuficiente: informe win_rate'}), 400
+        stats = stats or {'trades': 0, 'win_rate': None, 'tie_rate': 0.0, 'payout': DEFAULT_PAYOUT}
+
+        balance = balance or float(get_cached_balance(user_id) or 1000.0)
+
+        start = time.perf_counter()
+        params, result = simulate_config(
+            config, balance, stats,
+            win_rate=win_rate / 100 if win_rate is not None else None,
+            payout=payout,
+            sessions=sessions,
+            max_trades=max_trades,
+            seed=seed
+        )
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        return jsonify({
+            'parameters': params,
+            'empirical_trades': stats['trades'],
+            'elapsed_ms': round(elapsed_ms, 1),
+            **result
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Risk simulation error: {str(e)}")
+        return jsonify({'message': 'Erro interno do servidor'}), 500
+
+# Analytics routes
+@api.route('/analytics/signals', methods=['GET'])
+@jwt_required()
+def get_signal_analytics():
+    """Get confidence calibration, pattern and indicator outcome tables"""
+    try:
+        from signal_analytics import compute_signal_analytics
+
+        user_id = get_jwt_identity()
+        asset = request.args.get('asset')
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+
+        try:
+            start_datetime = datetime.fromisoformat(start_date) if start_date else None
+            end_datetime = datetime.fromisoformat(end_date) + timedelta(days=1) if end_date else None
+        except ValueError:
+            return jsonify({'message': 'Formato de data inválido'}), 422
+
+        return jsonify(compute_signal_analytics(user_id, asset, start_datetime, end_datetime)), 200
+
+    except Exception as e:
+        logger.error(f"Signal analytics error: {str(e)}")
+        return jsonify({'message': 'Erro interno do servidor'}), 500
+
+@api.route('/latency/report', methods=['GET'])
+@jwt_required()
+def get_latency_report():
+    """Get p50/p95/p99 per stage of the candle-close -> order path"""
+    try:
+        user_id = get_jwt_identity()
+
+        if bot_manager.remote:
+            # Bots, and their timings, live in the bot worker process
+            report = bot_manager.latency_report(user_id)
+        else:
+            from trade_latency import latency_tracker
+            report = latency_tracker.report(user_id)
+
+        return jsonify(report), 200
+
+    except Exception as e:
+        logger.error(f"Latency report error: {str(e)}")
+        return jsonify({'message': 'Erro interno do servidor'}), 500
+
+@api.route('/health', methods=['GET'])
+def health():
+    """Liveness plus this worker's database connection counts"""
+    from database import pool_stats
+
+    return jsonify({
+        'status': 'ok',
+        'role': current_app.config.get('APP_ROLE'),
+        'db_pool': pool_stats()
+    }), 200
+
+@api.route('/scheduler/status', methods=['GET'])
+@jwt_required()
+def get_scheduler_status():
+    """Get the leader election state and job run counts of the worker answering"""
+    try:
+        from leader_election import leader_elector
+
+        return jsonify(leader_elector.stats()), 200
+
+    except Exception as e:
+        logger.error(f"Scheduler status error: {str(e)}")
+        return jsonify({'message': 'Erro interno do servidor'}), 500
+
 # Helper functions
 def calculate_best_streak(trades):
     """Calculate the best winning streak"""
@@ -677,26 +1029,28 @@ def get_profit_history(user_id, days=7):
     """Get profit history for the last N days"""
     end_date = datetime.utcnow().date()
     start_date = end_date - timedelta(days=days-1)
-    
+
+    # One query for the whole range, summed per day here
+    rows = db.session.query(TradeHistory.timestamp, TradeHistory.profit).filter(
+        and_(
+            TradeHistory.user_id == user_id,
+            TradeHistory.timestamp >= start_date,
+            TradeHistory.timestamp < end_date + timedelta(days=1)
+        )
+    ).all()
+    day_profits = {}
+    for timestamp, profit in rows:
+        day = timestamp.date()
+        day_profits[day] = day_profits.get(day, 0) + (profit or 0)
+
     labels = []
     data = []
     cumulative_profit = 0
-    
+
     for i in range(days):
         current_date = start_date + timedelta(days=i)
         labels.append(current_date.strftime('%d/%m'))
-        
-        # Get trades for this date
-        day_trades = TradeHistory.query.filter(
-            and_(
-                TradeHistory.user_id == user_id,
-                TradeHistory.timestamp >= current_date,
-                TradeHistory.timestamp < current_date + timedelta(days=1)
-            )
-        ).all()
-        
-        day_profit = sum(trade.profit for trade in day_trades)
-        cumulative_profit += day_profit
+        cumulative_profit += day_profits.get(current_date, 0)
         data.append(cumulative_profit)
     
     return {
@@ -706,35 +1060,14 @@ def get_profit_history(user_id, days=7):
 
 def get_next_schedule(user_id):
     """Get next scheduled trading session"""
-    config = TradingConfig.query.filter_by(user_id=user_id).first()
-    if not config or config.operation_mode != 'auto':
-        return None
-    
-    now = datetime.now()
-    morning_time = datetime.strptime(config.morning_start, '%H:%M').time()
-    afternoon_time = datetime.strptime(config.afternoon_start, '%H:%M').time()
-    
-    # Check if we're before morning session
-    if now.time() < morning_time:
-        return config.morning_start
-    # Check if we're before afternoon session
-    elif now.time() < afternoon_time:
-        return config.afternoon_start
-    # Next session is tomorrow morning
-    else:
-        return f"Amanhã {config.morning_start}"
-
-# JWT token blacklist check
-@api.before_request
-def check_if_token_revoked():
-    """Check if JWT token is blacklisted"""
-    if request.endpoint and 'auth' not in request.endpoint:
-        try:
-            jti = get_jwt()['jti']
-            if jti in blacklisted_tokens:
-                return jsonify({'message': 'Token inválido'}), 401
-        except:
-            pass  # No JWT token present
+    user_id = int(user_id)
+    next_session = session_scheduler.next_session(user_id)
+    if next_session is None:
+        # Processes that did not load the scheduler (or have not synced this user yet) use the config
+        config = entity_cache.get_config(user_id)
+        if config is not None and config.operation_mode == 'auto' and session_windows(config):
+            next_session = next_session_start(session_labels(config), datetime.now())
+    return next_session
 
 # Error handlers
 @api.errorhandler(404)
@@ -0,0 +1,352 @@
+"""
+Start and stop bots at the session times of auto-mode users.
+
+Every auto user's next session boundary (start or end of the morning or
+afternoon window) sits in one min-heap. A single APScheduler 'date' job is
+armed for the earliest boundary; when it fires, only the due entries are
+popped, acted on and re-pushed with the user's following boundary, so no
+tick ever scans all configs. ``save_config`` calls ``update_user`` to replace
+a user's entry (older heap entries are skipped by version), and a periodic
+sync picks up configs changed by other processes.
+
+Every scheduler process keeps the heap up to date, but only the elected
+leader (see leader_election) starts and stops bots, so a session starts once
+however many workers there are. A newly elected leader picks up the sessions
+that are in progress.
+"""
+
+import os
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+SYNC_SECONDS = int(os.getenv('SESSION_SYNC_SECONDS', 60))
+START_WORKERS = int(os.getenv('SESSION_START_WORKERS', 8))
+JOB_ID = 'auto_session_boundary'
+START_JOB = 'auto_session_start'
+
+
+def parse_minutes(value):
+    """'HH:MM' -> minutes after midnight, or None"""
+    try:
+        hours, minutes = value.split(':')
+        return int(hours) * 60 + int(minutes)
+    except (AttributeError, ValueError):
+        return None
+
+
+def session_windows(config):
+    """(start, end) minute pairs of the config's trading windows"""
+    windows = []
+    for start, end in ((config.morning_start, config.morning_end),
+                       (config.afternoon_start, config.afternoon_end)):
+        start, end = parse_minutes(start), parse_minutes(end)
+        if start is not None and end is not None and start < end:
+            windows.append((start, end))
+    return tuple(windows)
+
+
+def session_labels(config):
+    """Window start minutes -> 'HH:MM' as saved in the config"""
+    labels = {}
+    for start in (config.morning_start, config.afternoon_start):
+        minutes = parse_minutes(start)
+        if minutes is not None:
+            labels[minutes] = start
+    return labels
+
+
+def next_session_start(labels, now):
+    """'HH:MM' of the next session start after now, 'Amanhã HH:MM' past the last one, or None"""
+    if not labels:
+        return None
+    minute = now.hour * 60 + now.minute
+    starts = sorted(labels)
+    for start in starts:
+        if minute < start:
+            return labels[start]
+    return f"Amanhã {labels[starts[0]]}"
+
+
+def next_boundary(windows, now):
+    """(datetime, 'start'|'stop') of the first window boundary after now"""
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    best = None
+    for day in (0, 1):
+        for start, end in windows:
+            for minute, action in ((start, 'start'), (end, 'stop')):
+                when = midnight + timedelta(days=day, minutes=minute)
+                if when > now and (best is None or when < best[0]):
+                    best = (when, action)
+    return best
+
+
+def in_session(windows, now):
+    minute = now.hour * 60 + now.minute
+    return any(start <= minute < end for start, end in windows)
+
+
+class UserSessions:
+    """Parsed session windows of one auto-mode user"""
+    __slots__ = ('user_id', 'windows', 'labels', 'version')
+
+    def __init__(self, user_id, windows, labels, version):
+        self.user_id = user_id
+        self.windows = windows
+        self.labels = labels  # minutes -> original 'HH:MM' of the window starts
+        self.version = version
+
+
+class SessionScheduler:
+    """Heap of the next session boundary of every auto-mode user"""
+
+    def __init__(self):
+        self.app = None
+        self.scheduler = None
+        self._lock = threading.RLock()
+        self._heap = []  # (when, seq, user_id, action, version)
+        self._seq = 0
+        self._users = {}
+        self._armed_for = None
+        self._started = set()  # bots this scheduler started
+        self._synced_until = None
+        self._executor = ThreadPoolExecutor(max_workers=START_WORKERS, thread_name_prefix='session')
+
+    def init_app(self, app, scheduler):
+        self.app = app
+        self.scheduler = scheduler
+
+    # Maintaining the heap
+
+    def load_all(self):
+        """Build the heap from every auto-mode config (once per process)"""
+        from models import TradingConfig
+
+        with self.app.app_context():
+            configs = TradingConfig.query.filter_by(operation_mode='auto').all()
+            self._synced_until = max((c.updated_at for c in configs if c.updated_at), default=datetime.utcnow())
+            with self._lock:
+                for config in configs:
+                    self._set_user(config)
+                self._arm()
+        logger.info(f"Session scheduler loaded {len(configs)} auto-mode users")
+
+    def update_user(self, config):
+        """Re-plan one user after their config changed"""
+        with self._lock:
+            self._set_user(config)
+            self._arm()
+
+    def _set_user(self, config):
+        user_id = config.user_id
+        windows = session_windows(config) if config.operation_mode == 'auto' else ()
+        labels = session_labels(config) if windows else {}
+        previous = self._users.get(user_id)
+        if previous is not None and (previous.windows, previous.labels) == (windows, labels):
+            # Nothing to re-plan (the sync re-reads the configs saved at its watermark)
+            return
+        self._users.pop(user_id, None)
+        now = datetime.now()
+        # A session this scheduler started ends when the user leaves auto mode or moves the
+        # windows so that it is no longer session time
+        if user_id in self._started and not in_session(windows, now):
+            self._executor.submit(self._stop_session, user_id)
+        if not windows:
+            return
+
+        entry = self._users[user_id] = UserSessions(
+            user_id, windows, labels, (previous.version + 1) if previous else 1)
+
+        # Joining mid-session (startup, switch to auto, new times) starts the bot right away
+        if (previous is None or previous.windows != windows) and in_session(windows, now):
+            self._executor.submit(self._start_session, user_id)
+        self._push_next(entry, now)
+
+    def _push(self, when, user_id, action, version):
+        self._seq += 1
+        heapq.heappush(self._heap, (when, self._seq, user_id, action, version))
+
+    def _push_next(self, entry, now):
+        boundary = next_boundary(entry.windows, now)
+        if boundary:
+            self._push(boundary[0], entry.user_id, boundary[1], entry.version)
+
+    def _arm(self):
+        """Point the APScheduler job at the earliest live boundary"""
+        while self._heap:
+            when, _, user_id, _, version = self._heap[0]
+            entry = self._users.get(user_id)
+            if entry is not None and entry.version == version:
+                break
+            heapq.heappop(self._heap)  # superseded by a config change
+        if not self._heap or self.scheduler is None:
+            return
+        when = self._heap[0][0]
+        if self._armed_for is not None and self._armed_for <= when:
+            return
+        self._armed_for = when
+        self.scheduler.add_job(
+            self._fire,
+            'date',
+            run_date=when,
+            id=JOB_ID,
+            replace_existing=True,
+            misfire_grace_time=None
+        )
+
+    # Firing
+
+    def _fire(self):
+        now = datetime.now()
+        due = []
+        with self._lock:
+            self._armed_for = None
+            while self._heap and self._heap[0][0] <= now:
+                _, _, user_id, action, version = heapq.heappop(self._heap)
+                entry = self._users.get(user_id)
+                if entry is None or entry.version != version:
+                    continue
+                due.append((user_id, action))
+                self._push_next(entry, now)
+            self._arm()
+
+        for user_id, action in due:
+            self._executor.submit(self._start_session if action == 'start' else self._stop_session, user_id)
+
+    def _start_session(self, user_id, adopt=False):
+        from bot_manager import bot_manager
+        from leader_election import leader_elector
+
+        if not leader_elector.is_leader:
+            leader_elector.record(START_JOB, ran=False)
+            return
+        leader_elector.record(START_JOB)
+        try:
+            if bot_manager.is_running(user_id):
+                if adopt:
+                    # Started by the previous leader; this one ends it with the session
+                    self._started.add(user_id)
+                return
+            if bot_manager.remote:
+                started = bot_manager.start_bot(user_id)
+            else:
+                with self.app.app_context():
+                    from models import TradingConfig
+                    config = TradingConfig.query.filter_by(user_id=user_id).first()
+                    if not config or config.operation_mode != 'auto':
+                        return
+                    from strategy import strategies
+                    strategies.publish(config)
+                    from bot_manager import create_bot
+                    bot = create_bot(user_id, config, self.app)
+                started = bot_manager.start_bot(user_id, bot)
+            if started:
+                self._started.add(user_id)
+                logger.info(f"Auto session started for user {user_id}")
+        except Exception as e:
+            logger.error(f"Error starting auto session for user {user_id}: {str(e)}")
+
+    def _stop_session(self, user_id):
+        from bot_manager import bot_manager
+
+        # Bots the user started by hand are left alone
+        if user_id not in self._started:
+            return
+        self._started.discard(user_id)
+        try:
+            if bot_manager.stop_bot(user_id):
+                logger.info(f"Auto session ended for user {user_id}")
+        except Exception as e:
+            logger.error(f"Error stopping auto session for user {user_id}: {str(e)}")
+
+    def on_leadership(self, leader):
+        """Take over the running sessions when elected; hand them over when demoted"""
+        from bot_manager import bot_manager
+
+        if leader:
+            now = datetime.now()
+            with self._lock:
+                in_progress = [entry.user_id for entry in self._users.values() if in_session(entry.windows, now)]
+            for user_id in in_progress:
+                self._executor.submit(self._start_session, user_id, True)
+            return
+        started, self._started = self._started, set()
+        if not bot_manager.remote:
+            # In-process bots would keep trading next to the new leader's
+            for user_id in started:
+                try:
+                    bot_manager.stop_bot(user_id)
+                except Exception as e:
+                    logger.error(f"Error handing over auto session of user {user_id}: {str(e)}")
+
+    def sync(self):
+        """Apply configs saved by other processes since the last sync"""
+        from models import TradingConfig
+
+        with self.app.app_context():
+            # >= : a save committed late in the same clock tick is not skipped; unchanged users are left as is
+            changed = TradingConfig.query.filter(TradingConfig.updated_at >= self._synced_until).all()
+            if not changed:
+                return
+            self._synced_until = max(c.updated_at for c in changed)
+            with self._lock:
+                for config in changed:
+                    self._set_user(config)
+                self._arm()
+
+    # Queries
+
+    def next_session(self, user_id):
+        """Start time of the user's next session ('HH:MM' or 'Amanhã HH:MM'), or None"""
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        return next_session_start(entry.labels, datetime.now())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._users),
+                'queued': len(self._heap),
+                'next_boundary': self._heap[0][0].isoformat() if self._heap else None,
+                'running_sessions': len(self._started),
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+session_scheduler = SessionScheduler()
+
+
+def register_session_scheduler(app, scheduler, load=True):
+    """Load auto-mode users and keep their session jobs on the shared scheduler"""
+    import atexit
+    from leader_election import leader_elector
+
+    session_scheduler.init_app(app, scheduler)
+    leader_elector.add_listener(session_scheduler.on_leadership)
+    if not load:
+        # Processes that do not run the scheduler never start sessions
+        return
+    try:
+        session_scheduler.load_all()
+    except Exception as e:
+        # Tables may not exist yet on a fresh database; the sync job picks configs up later
+        logger.warning(f"Session scheduler not loaded: {str(e)}")
+        session_scheduler._synced_until = datetime.utcnow()
+
+    scheduler.add_job(
+        session_scheduler.sync,
+        'interval',
+        seconds=SYNC_SECONDS,
+        id='auto_session_sync',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    atexit.register(session_scheduler.shutdown)
@@ -0,0 +1,291 @@
+"""
+Signal quality analytics over the trade history.
+
+Each user's closed trades are kept in memory as an append-only columnar copy
+(NumPy arrays, categories encoded as integer codes). A request only fetches
+the trades closed since the last one, then every table is computed with
+NumPy masks, bucketing and ``bincount`` instead of per-trade Python loops:
+confidence calibration, win rate per price-action pattern and outcome tables
+per indicator bucket.
+"""
+
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select, case, or_
+
+from database import db
+from models import TradeHistory
+
+logger = logging.getLogger(__name__)
+
+MAX_CACHED_USERS = int(os.getenv('SIGNAL_ANALYTICS_MAX_USERS', 16))
+MIN_TRADES_FOR_THRESHOLD = 30
+# Unsettled trades older than this are treated as abandoned and stop holding the watermark back
+OPEN_TRADE_GRACE = timedelta(hours=1)
+
+CONFIDENCE_EDGES = np.linspace(0.0, 1.0, 11)
+RSI_EDGES = np.array([0, 20, 30, 40, 50, 60, 70, 80, 100], dtype=float)
+AROON_OSCILLATOR_EDGES = np.array([-100, -50, -20, 0, 20, 50, 100], dtype=float)
+THRESHOLDS = np.round(np.arange(0.5, 1.0, 0.05), 2)
+
+CLOSED_RESULTS = ('win', 'loss', 'tie')
+_RESULT_CODES = {'loss': 0, 'win': 1, 'tie': 2}
+_TREND_CATEGORIES = ('up', 'down', 'sideways')
+
+_FLOAT_COLUMNS = ('payout', 'ml_confidence', 'signal_strength', 'rsi', 'macd', 'aroon_oscillator')
+_CODE_COLUMNS = ('result', 'asset', 'trend', 'patterns')
+
+
+class SignalColumns:
+    """Append-only columnar copy of one user's closed trades.
+
+    ``watermark`` is the highest trade id copied so far. It never passes an
+    open (unsettled) trade, so trades that settle later are still picked up.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.lock = threading.Lock()
+        self.watermark = 0
+        self.timestamp = np.empty(0, dtype='datetime64[us]')
+        self.arrays = {name: np.empty(0, dtype=np.float32) for name in _FLOAT_COLUMNS}
+        self.arrays.update({name: np.empty(0, dtype=np.int32) for name in _CODE_COLUMNS})
+        # label -> code for the encoded columns
+        self.labels = {'asset': {}, 'trend': {}, 'patterns': {}}
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def refresh(self):
+        """Append trades closed since the last refresh"""
+        is_open = or_(TradeHistory.result.is_(None), TradeHistory.result.notin_(CLOSED_RESULTS))
+        max_id, min_open = db.session.query(
+            db.func.max(TradeHistory.id),
+            db.func.min(case(
+                (is_open & (TradeHistory.timestamp >= datetime.utcnow() - OPEN_TRADE_GRACE), TradeHistory.id)
+            ))
+        ).filter(
+            TradeHistory.user_id == self.user_id,
+            TradeHistory.id > self.watermark
+        ).one()
+
+        high = (min_open - 1) if min_open else (max_id or 0)
+        if high <= self.watermark:
+            return 0
+
+        rows = db.session.execute(select(
+            TradeHistory.result,
+            TradeHistory.asset,
+            # Raw text is parsed by NumPy far faster than by the DateTime type
+            db.cast(TradeHistory.timestamp, db.String),
+            TradeHistory.payout_percentage,
+            TradeHistory.ml_confidence,
+            TradeHistory.signal_strength,
+            TradeHistory.rsi_value,
+            TradeHistory.macd_value,
+            TradeHistory.aroon_up,
+            TradeHistory.aroon_down,
+            TradeHistory.trend_direction,
+            TradeHistory.patterns_detected
+        ).where(
+            TradeHistory.user_id == self.user_id,
+            TradeHistory.id > self.watermark,
+            TradeHistory.id <= high,
+            TradeHistory.result.in_(CLOSED_RESULTS)
+        ).order_by(TradeHistory.id)).all()
+        self.watermark = high
+        if not rows:
+            return 0
+
+        (results, assets, timestamps, payout, confidence, strength,
+         rsi, macd, aroon_up, aroon_down, trends, patterns) = zip(*rows)
+
+        new = {
+            'result': np.array([_RESULT_CODES[r] for r in results], dtype=np.int32),
+            'asset': self._encode('asset', assets),
+            'trend': self._encode('trend', trends),
+            'patterns': self._encode('patterns', patterns),
+            'payout': np.array(payout, dtype=np.float32),
+            'ml_confidence': np.array(confidence, dtype=np.float32),
+            'signal_strength': np.array(strength, dtype=np.float32),
+            'rsi': np.array(rsi, dtype=np.float32),
+            'macd': np.array(macd, dtype=np.float32),
+            'aroon_oscillator': np.array(aroon_up, dtype=np.float32) - np.array(aroon_down, dtype=np.float32),
+        }
+        for name, values in new.items():
+            self.arrays[name] = np.concatenate([self.arrays[name], values])
+        self.timestamp = np.concatenate([self.timestamp, np.array(timestamps, dtype='datetime64[us]')])
+        return len(rows)
+
+    def _encode(self, column, values):
+        """Integer codes for a categorical column; None is encoded as -1"""
+        codes = self.labels[column]
+        return np.array([-1 if v is None else codes.setdefault(v, len(codes)) for v in values], dtype=np.int32)
+
+    def decode(self, column):
+        """Code -> label list for an encoded column"""
+        return sorted(self.labels[column], key=self.labels[column].get)
+
+    def mask(self, asset=None, start_date=None, end_date=None):
+        """Boolean mask of win/loss trades matching the filters"""
+        mask = self.arrays['result'] != _RESULT_CODES['tie']
+        if asset:
+            mask &= self.arrays['asset'] == self.labels['asset'].get(asset, -2)
+        if start_date:
+            mask &= self.timestamp >= np.datetime64(start_date, 'us')
+        if end_date:
+            mask &= self.timestamp < np.datetime64(end_date, 'us')
+        return mask
+
+
+# user_id -> SignalColumns, least recently used first
+_stores = OrderedDict()
+_stores_lock = threading.Lock()
+
+
+def get_signal_columns(user_id):
+    """Get the user's columnar store, refreshed with newly closed trades"""
+    with _stores_lock:
+        store = _stores.get(user_id)
+        if store is None:
+            store = _stores[user_id] = SignalColumns(user_id)
+        _stores.move_to_end(user_id)
+        while len(_stores) > MAX_CACHED_USERS:
+            _stores.popitem(last=False)
+
+    with store.lock:
+        added = store.refresh()
+    if added:
+        logger.debug(f"Signal analytics: appended {added} trades for user {user_id}")
+    return store
+
+
+def _rows(labels, trades, wins):
+    """Turn bucket count arrays into response rows, skipping empty buckets"""
+    win_rate = np.divide(wins, trades, out=np.zeros(len(trades)), where=trades > 0)
+    return [{
+        'bucket': label,
+        'trades': int(n),
+        'wins': int(w),
+        'win_rate': round(float(rate), 4),
+    } for label, n, w, rate in zip(labels, trades, wins, win_rate) if n > 0]
+
+
+def bucket_table(values, win, edges):
+    """Trades, wins and win rate per [edge_i, edge_i+1) bucket; NaNs are ignored"""
+    valid = ~np.isnan(values)
+    index = np.clip(np.digitize(values[valid], edges[1:-1]), 0, len(edges) - 2)
+    trades = np.bincount(index, minlength=len(edges) - 1)
+    wins = np.bincount(index, weights=win[valid], minlength=len(edges) - 1).astype(int)
+    labels = [f'{lo:g}-{hi:g}' for lo, hi in zip(edges[:-1], edges[1:])]
+    return _rows(labels, trades, wins)
+
+
+def category_table(codes, win, labels, order=None):
+    """Trades, wins and win rate per category code; -1 (missing) is ignored"""
+    valid = codes >= 0
+    trades = np.bincount(codes[valid], minlength=len(labels))
+    wins = np.bincount(codes[valid], weights=win[valid], minlength=len(labels)).astype(int)
+    index = list(range(len(labels)))
+    if order:
+        index.sort(key=lambda i: order.index(labels[i]) if labels[i] in order else len(order))
+    return _rows([labels[i] for i in index], trades[index], wins[index])
+
+
+def pattern_table(codes, win, combos):
+    """Win rate per detected pattern.
+
+    Trades share a small number of pattern combinations, so counts are taken
+    per combination code and each distinct JSON value is parsed once.
+    """
+    valid = codes >= 0
+    combo_trades = np.bincount(codes[valid], minlength=len(combos))
+    combo_wins = np.bincount(codes[valid], weights=win[valid], minlength=len(combos))
+
+    totals = {}
+    for combo, n, w in zip(combos, combo_trades, combo_wins):
+        if not n:
+            continue
+        try:
+            names = json.loads(combo)
+        except ValueError:
+            continue
+        if isinstance(names, dict):
+            names = [name for name, detected in names.items() if detected]
+        for name in set(names or ['none']):
+            entry = totals.setdefault(name, [0, 0])
+            entry[0] += n
+            entry[1] += w
+
+    labels = sorted(totals, key=lambda name: -totals[name][0])
+    trades = np.array([totals[name][0] for name in labels], dtype=int)
+    wins = np.array([totals[name][1] for name in labels], dtype=int)
+    return _rows(labels, trades, wins)
+
+
+def threshold_table(confidence, win, breakeven):
+    """Win rate and trade count if only trades with confidence >= t were taken"""
+    valid = ~np.isnan(confidence)
+    confidence, win = confidence[valid], win[valid]
+    order = np.argsort(confidence)
+    sorted_conf = confidence[order]
+    # Suffix sums: trades/wins at or above each threshold
+    wins_from = np.concatenate([np.cumsum(win[order][::-1])[::-1], [0]])
+    starts = np.searchsorted(sorted_conf, THRESHOLDS.astype(sorted_conf.dtype), side='left')
+    trades = len(sorted_conf) - starts
+    wins = wins_from[starts]
+
+    table = []
+    recommended = None
+    for threshold, n, w in zip(THRESHOLDS, trades, wins):
+        rate = float(w / n) if n else 0.0
+        table.append({'threshold': float(threshold), 'trades': int(n), 'win_rate': round(rate, 4)})
+        if recommended is None and n >= MIN_TRADES_FOR_THRESHOLD and rate > breakeven:
+            recommended = float(threshold)
+    return table, recommended
+
+
+def compute_signal_analytics(user_id, asset=None, start_date=None, end_date=None):
+    """Calibration, pattern and indicator outcome tables for a user's trades"""
+    store = get_signal_columns(user_id)
+    mask = store.mask(asset, start_date, end_date)
+    if not mask.any():
+        return {'total_trades': 0}
+
+    columns = {name: values[mask] for name, values in store.arrays.items()}
+    win = columns['result'] == _RESULT_CODES['win']
+
+    payout = columns['payout'][~np.isnan(columns['payout'])]
+    payout = float(payout.mean()) / 100 if payout.size else 0.8
+    # Win rate at which a binary option with this payout breaks even
+    breakeven = 1 / (1 + payout)
+    thresholds, recommended = threshold_table(columns['ml_confidence'], win, breakeven)
+
+    macd = columns['macd'][~np.isnan(columns['macd'])]
+    macd_edges = np.unique(np.quantile(macd, np.linspace(0, 1, 6))) if macd.size else np.empty(0)
+
+    return {
+        'total_trades': int(win.size),
+        'win_rate': round(float(win.mean()), 4),
+        'avg_payout': round(payout, 4),
+        'breakeven_win_rate': round(breakeven, 4),
+        'calibration': {
+            'ml_confidence': bucket_table(columns['ml_confidence'], win, CONFIDENCE_EDGES),
+            'signal_strength': bucket_table(columns['signal_strength'], win, CONFIDENCE_EDGES),
+        },
+        'confidence_thresholds': thresholds,
+        'recommended_ml_confidence_threshold': recommended,
+        'patterns': pattern_table(columns['patterns'], win, store.decode('patterns')),
+        'indicators': {
+            'rsi': bucket_table(columns['rsi'], win, RSI_EDGES),
+            'macd_quintile': bucket_table(columns['macd'], win, macd_edges) if macd_edges.size > 1 else [],
+            'aroon_oscillator': bucket_table(columns['aroon_oscillator'], win, AROON_OSCILLATOR_EDGES),
+            'trend_direction': category_table(columns['trend'], win, store.decode('trend'), _TREND_CATEGORIES),
+        },
+    }
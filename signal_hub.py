@@ -0,0 +1,302 @@
+"""
+Shared technical analysis for bots trading the same market.
+
+Indicator values and candle patterns depend only on the candles and the
+indicator parameters, not on the user. The hub keys each analysis by
+(asset, timeframe, indicator-parameter hash) and computes it at most once per
+closed candle: bots either subscribe and receive it when a candle closes, or
+call ``analyze()`` and get the cached result if another bot already asked.
+Subscribed bots call ``feed()`` when they see a new candle; only the first one
+per market fetches the candles, and every subscriber gets the analysis.
+Each bot then applies its own thresholds and risk logic (``bot_view``), so
+CPU cost grows with the number of distinct configurations, not of users.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+import itertools
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Cached analyses (and their locks) kept for analyze() callers, least recently used evicted
+MAX_ANALYSES = int(os.getenv('SIGNAL_HUB_MAX_ANALYSES', 4096))
+
+# TradingConfig columns that change indicator values; thresholds and pattern toggles are per-bot
+ANALYSIS_PARAMS = (
+    'rsi_period', 'macd_fast', 'macd_slow', 'macd_signal',
+    'ma_short_period', 'ma_long_period', 'aroon_period'
+)
+PATTERN_TOGGLES = {
+    'bullish_engulfing': 'enable_engulfing',
+    'bearish_engulfing': 'enable_engulfing',
+    'hammer': 'enable_hammer',
+    'shooting_star': 'enable_shooting_star',
+    'doji': 'enable_doji',
+}
+
+
+def analysis_params(config):
+    """Indicator parameters of a TradingConfig (or dict) that the analysis depends on"""
+    get = config.get if isinstance(config, dict) else lambda name: getattr(config, name, None)
+    return {name: get(name) for name in ANALYSIS_PARAMS}
+
+
+def params_hash(params):
+    """Stable short hash of indicator parameters"""
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def candle_arrays(candles):
+    """open/high/low/close arrays and last candle time from IQ Option or MarketData-style dicts"""
+    first = candles[0]
+    high_key = 'max' if 'max' in first else 'high'
+    low_key = 'min' if 'min' in first else 'low'
+    arrays = {
+        'open': np.fromiter((c['open'] for c in candles), dtype=float, count=len(candles)),
+        'high': np.fromiter((c[high_key] for c in candles), dtype=float, count=len(candles)),
+        'low': np.fromiter((c[low_key] for c in candles), dtype=float, count=len(candles)),
+        'close': np.fromiter((c['close'] for c in candles), dtype=float, count=len(candles)),
+    }
+    return arrays, _candle_time(candles[-1])
+
+
+def _candle_time(candle):
+    return candle.get('from', candle.get('timestamp', candle.get('to')))
+
+
+def _ema(values, alpha):
+    out = np.empty_like(values)
+    acc = values[0]
+    for i, value in enumerate(values):
+        acc = alpha * value + (1 - alpha) * acc
+        out[i] = acc
+    return out
+
+
+def _rsi(close, period):
+    delta = np.diff(close)
+    if delta.size < period:
+        return None
+    gain = _ema(np.clip(delta, 0, None), 1 / period)[-1]
+    loss = _ema(np.clip(-delta, 0, None), 1 / period)[-1]
+    return 100.0 if loss == 0 else float(100 - 100 / (1 + gain / loss))
+
+
+def _aroon(high, low, period):
+    if high.size < period + 1:
+        return None, None
+    window_high, window_low = high[-(period + 1):], low[-(period + 1):]
+    # Bars since the latest high/low in the window
+    since_high = period - int(np.flatnonzero(window_high == window_high.max())[-1])
+    since_low = period - int(np.flatnonzero(window_low == window_low.min())[-1])
+    return 100.0 * (period - since_high) / period, 100.0 * (period - since_low) / period
+
+
+def _patterns(o, h, l, c):
+    """Price action patterns on the last closed candle (and the one before it)"""
+    body = abs(c[-1] - o[-1])
+    span = h[-1] - l[-1]
+    upper = h[-1] - max(o[-1], c[-1])
+    lower = min(o[-1], c[-1]) - l[-1]
+    prev_bull, bull = c[-2] > o[-2], c[-1] > o[-1]
+    return {
+        'bullish_engulfing': bool(not prev_bull and bull and o[-1] <= c[-2] and c[-1] >= o[-2]),
+        'bearish_engulfing': bool(prev_bull and not bull and o[-1] >= c[-2] and c[-1] <= o[-2]),
+        'hammer': bool(span > 0 and lower >= 2 * body and upper <= body),
+        'shooting_star': bool(span > 0 and upper >= 2 * body and lower <= body),
+        'doji': bool(span > 0 and body <= 0.1 * span),
+    }
+
+
+def compute_analysis(candles, params):
+    """Indicators and patterns for the last closed candle"""
+    arrays, candle_time = candle_arrays(candles)
+    o, h, l, c = arrays['open'], arrays['high'], arrays['low'], arrays['close']
+
+    macd_line = _ema(c, 2 / (params['macd_fast'] + 1)) - _ema(c, 2 / (params['macd_slow'] + 1))
+    macd_signal = _ema(macd_line, 2 / (params['macd_signal'] + 1))
+    ma_short = float(c[-params['ma_short_period']:].mean())
+    ma_long = float(c[-params['ma_long_period']:].mean())
+    aroon_up, aroon_down = _aroon(h, l, params['aroon_period'])
+
+    return {
+        'candle_time': candle_time,
+        'close': float(c[-1]),
+        'rsi': _rsi(c, params['rsi_period']),
+        'macd': float(macd_line[-1]),
+        'macd_signal': float(macd_signal[-1]),
+        'macd_histogram': float(macd_line[-1] - macd_signal[-1]),
+        'ma_short': ma_short,
+        'ma_long': ma_long,
+        'aroon_up': aroon_up,
+        'aroon_down': aroon_down,
+        'trend_direction': 'up' if ma_short > ma_long else 'down' if ma_short < ma_long else 'sideways',
+        'patterns': _patterns(o, h, l, c) if len(candles) > 1 else {},
+    }
+
+
+def bot_view(analysis, config):
+    """Shared analysis with one bot's own thresholds and pattern toggles applied.
+
+    ``config`` is a compiled Strategy, a TradingConfig or a dict.
+    """
+    rsi = analysis['rsi']
+    view = dict(analysis)
+    mask = getattr(config, 'pattern_mask', None)
+    if mask is not None:
+        from strategy import PATTERN_BITS
+
+        view['patterns'] = {name: detected for name, detected in analysis['patterns'].items()
+                            if mask & PATTERN_BITS[name]}
+        oversold, overbought = config.rsi_oversold, config.rsi_overbought
+    else:
+        get = config.get if isinstance(config, dict) else lambda name: getattr(config, name, None)
+        view['patterns'] = {name: detected for name, detected in analysis['patterns'].items()
+                            if get(PATTERN_TOGGLES[name]) is not False}
+        oversold, overbought = get('rsi_oversold'), get('rsi_overbought')
+    view['rsi_oversold'] = rsi is not None and rsi <= oversold
+    view['rsi_overbought'] = rsi is not None and rsi >= overbought
+    return view
+
+
+class SignalHub:
+    """Computes each (asset, timeframe, params) analysis once per candle and fans it out"""
+
+    def __init__(self, max_analyses=MAX_ANALYSES):
+        self.max_analyses = max_analyses
+        self._lock = threading.Lock()
+        # (asset, timeframe, hash) -> [key lock, candle_time, analysis], least recently used first
+        self._latest = OrderedDict()
+        # (asset, timeframe) -> hash -> {'params': ..., 'callbacks': {token: callback}}
+        self._subscriptions = defaultdict(dict)
+        self._tokens = {}
+        # (asset, timeframe) -> last candle handed to on_candle_closed by feed()
+        self._fed = {}
+        self._counter = itertools.count(1)
+        self.computed = 0
+        self.served = 0
+        self.delivered = 0
+
+    def _entry(self, key):
+        """The key's cache slot; the oldest slots are evicted past max_analyses. Caller holds _lock."""
+        entry = self._latest.get(key)
+        if entry is None:
+            entry = self._latest[key] = [threading.Lock(), None, None]
+            while len(self._latest) > self.max_analyses:
+                self._latest.popitem(last=False)
+        else:
+            self._latest.move_to_end(key)
+        return entry
+
+    def analyze(self, asset, timeframe, params, candles):
+        """Analysis of the last closed candle, computed once for all callers (treat as read-only)"""
+        digest = params_hash(params)
+        key = (asset, timeframe, digest)
+        candle_time = _candle_time(candles[-1])
+
+        with self._lock:
+            entry = self._entry(key)
+        # Concurrent callers for the same key wait for the first computation
+        with entry[0]:
+            if entry[2] is not None and candle_time is not None and entry[1] == candle_time:
+                analysis, computed = entry[2], False
+            else:
+                analysis, computed = compute_analysis(candles, params), True
+                entry[1], entry[2] = candle_time, analysis
+        with self._lock:
+            self.served += 1
+            if computed:
+                self.computed += 1
+        return analysis
+
+    def subscribe(self, asset, timeframe, params, callback):
+        """Call ``callback(analysis)`` on every closed candle; returns a token for unsubscribe"""
+        digest = params_hash(params)
+        with self._lock:
+            token = next(self._counter)
+            group = self._subscriptions[(asset, timeframe)].setdefault(digest, {'params': dict(params), 'callbacks': {}})
+            group['callbacks'][token] = callback
+            self._tokens[token] = (asset, timeframe, digest)
+        return token
+
+    def unsubscribe(self, token):
+        with self._lock:
+            location = self._tokens.pop(token, None)
+            if location is None:
+                return
+            asset, timeframe, digest = location
+            groups = self._subscriptions[(asset, timeframe)]
+            groups[digest]['callbacks'].pop(token, None)
+            if not groups[digest]['callbacks']:
+                del groups[digest]
+                self._latest.pop(location, None)
+            if not groups:
+                del self._subscriptions[(asset, timeframe)]
+                self._fed.pop((asset, timeframe), None)
+
+    def feed(self, asset, timeframe, candle, fetch):
+        """Hand candle ``candle`` of a market to the subscribers once, whichever bot sees it first.
+
+        ``fetch()`` returns the closed candles (or None when the broker is
+        unavailable, so the next caller retries). Returns True if this call
+        fetched and delivered.
+        """
+        market = (asset, timeframe)
+        with self._lock:
+            if self._fed.get(market, -1) >= candle:
+                return False
+            self._fed[market] = candle
+
+        try:
+            candles = fetch()
+        except Exception as e:
+            logger.error(f"Signal hub feed error for {asset} {timeframe}: {str(e)}")
+            candles = None
+        if not candles:
+            with self._lock:
+                if self._fed.get(market) == candle:
+                    del self._fed[market]
+            return False
+        self.on_candle_closed(asset, timeframe, candles)
+        return True
+
+    def on_candle_closed(self, asset, timeframe, candles):
+        """Feed entry point: analyse once per distinct params and notify subscribers"""
+        with self._lock:
+            groups = [(group['params'], list(group['callbacks'].values()))
+                      for group in self._subscriptions.get((asset, timeframe), {}).values()]
+
+        for params, callbacks in groups:
+            try:
+                analysis = self.analyze(asset, timeframe, params, candles)
+            except Exception as e:
+                logger.error(f"Signal hub analysis error for {asset} {timeframe}: {str(e)}")
+                continue
+            with self._lock:
+                self.delivered += len(callbacks)
+            for callback in callbacks:
+                try:
+                    callback(analysis)
+                except Exception as e:
+                    logger.error(f"Signal hub subscriber error for {asset} {timeframe}: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'markets': len(self._subscriptions),
+                'configurations': sum(len(groups) for groups in self._subscriptions.values()),
+                'subscribers': len(self._tokens),
+                'cached': len(self._latest),
+                'computed': self.computed,
+                'served': self.served,
+                'delivered': self.delivered,
+            }
+
+
+signal_hub = SignalHub()
@@ -0,0 +1,192 @@
+"""
+SQLite performance mode for the main database.
+
+With ``DATABASE_URL=sqlite:///...`` every connection the engine opens is set
+up for concurrent use (a connect-event hook):
+
+- ``journal_mode=WAL``: readers see the last committed state and never wait
+  for the writer, and the writer never waits for readers
+- ``synchronous=NORMAL``: fsync at checkpoints instead of every commit (safe
+  with WAL; a power loss can lose the last commits, not corrupt the file)
+- ``busy_timeout``, ``cache_size``, ``mmap_size``, ``temp_store=MEMORY``
+
+Writes are serialized: the first INSERT/UPDATE/DELETE or flush of a
+transaction takes a writer lock (a thread lock plus an flock on
+``<database>.writer-lock``, so it holds across gunicorn workers and the bot
+worker) until the transaction ends. Writers queue on the lock in order
+instead of retrying on SQLITE_BUSY. Readers do not take it. A writer that
+waits longer than SQLITE_WRITER_TIMEOUT goes ahead without the lock and
+falls back on busy_timeout.
+
+SQLITE_PERFORMANCE_MODE=false restores SQLite's defaults.
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv('SQLITE_PERFORMANCE_MODE', 'true').lower() in ('1', 'true', 'yes', 'on')
+BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 65536))
+MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+SERIALIZE_WRITES = os.getenv('SQLITE_SERIALIZE_WRITES', 'true').lower() in ('1', 'true', 'yes', 'on')
+WRITER_TIMEOUT = float(os.getenv('SQLITE_WRITER_TIMEOUT', 30))
+
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', BUSY_TIMEOUT_MS),
+    # Negative cache_size is in KiB
+    ('cache_size', -CACHE_SIZE_KB),
+    ('mmap_size', MMAP_SIZE),
+    ('temp_store', 'MEMORY'),
+)
+
+
+def set_pragmas(dbapi_connection, connection_record):
+    """connect hook: apply PRAGMAS to a new SQLite connection"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in PRAGMAS:
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+
+class SerializedWriter:
+    """Process-wide and cross-process lock held by one write transaction at a time"""
+
+    def __init__(self, database_path, timeout=WRITER_TIMEOUT):
+        self.timeout = timeout
+        self.lock_path = f'{database_path}.writer-lock'
+        # Reentrant: a second session writing on the same thread must not wait for itself
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+        self.counters = dict.fromkeys(('acquired', 'timeouts'), 0)
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _lock_file(self, deadline):
+        if fcntl is None:
+            return True
+        if self._file is None:
+            self._file = open(self.lock_path, 'a+b')
+        while True:
+            try:
+                fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.001)
+
+    def acquire(self):
+        """True once this thread holds the writer lock; False after a timeout"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        if not self._lock.acquire(timeout=self.timeout):
+            self.counters['timeouts'] += 1
+            return False
+        if self._depth == 0 and not self._lock_file(deadline):
+            self._lock.release()
+            self.counters['timeouts'] += 1
+            return False
+        self._depth += 1
+        waited = time.monotonic() - started
+        self.counters['acquired'] += 1
+        self.wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and fcntl is not None and self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._lock.release()
+
+    def stats(self):
+        acquired = self.counters['acquired']
+        return dict(self.counters,
+                    avg_wait_ms=round(self.wait_seconds / acquired * 1000, 2) if acquired else 0.0,
+                    max_wait_ms=round(self.max_wait_seconds * 1000, 2))
+
+
+writer = None
+_engine = None
+
+_HOLDS_LOCK = 'sqlite_writer'
+
+
+def _take_writer(session):
+    if session.info.get(_HOLDS_LOCK) is not None or writer is None:
+        return
+    if session.get_bind() is not _engine:
+        return
+    if writer.acquire():
+        session.info[_HOLDS_LOCK] = True
+    else:
+        # Do not hold up the request forever; SQLite's busy_timeout takes over
+        session.info[_HOLDS_LOCK] = False
+        logger.warning(f"SQLite writer lock not acquired in {writer.timeout}s, writing without it")
+
+
+def _before_flush(session, flush_context, instances):
+    if session.new or session.dirty or session.deleted:
+        _take_writer(session)
+
+
+def _before_execute(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _take_writer(orm_execute_state.session)
+
+
+def _after_transaction_end(session, transaction):
+    # Only the outermost transaction ends the write (savepoints end inside it)
+    if transaction.parent is None:
+        held = session.info.pop(_HOLDS_LOCK, None)
+        if held:
+            writer.release()
+
+
+def register_sqlite_profile(app):
+    """Set up the SQLite engine of ``app`` for concurrent readers and one writer at a time"""
+    global writer, _engine
+    from database import db
+
+    database_url = app.config['SQLALCHEMY_DATABASE_URI']
+    if not database_url.startswith('sqlite') or not ENABLED:
+        return
+    with app.app_context():
+        engine = db.engine
+    if not event.contains(engine, 'connect', set_pragmas):
+        event.listen(engine, 'connect', set_pragmas)
+        # Connections opened before the hook (none in a fresh process) get the pragmas now
+        engine.dispose()
+
+    # Flask-SQLAlchemy has resolved relative paths against the instance folder
+    path = engine.url.database
+    if not SERIALIZE_WRITES or not path or path == ':memory:':
+        return
+    if writer is None or _engine is not engine:
+        writer = SerializedWriter(path)
+        _engine = engine
+    if not event.contains(Session, 'after_transaction_end', _after_transaction_end):
+        event.listen(Session, 'before_flush', _before_flush)
+        event.listen(Session, 'do_orm_execute', _before_execute)
+        event.listen(Session, 'after_transaction_end', _after_transaction_end)
+    logger.info(f"SQLite performance mode on {path} (WAL, serialized writer)")
@@ -6,7 +6,9 @@ This script verifies that all critical components are working
 
 import sys
 import os
+import json
 import logging
+import subprocess
 
 # Add current directory to Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -14,6 +16,29 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Cold start (import app + create_app('cli')) must stay under this budget
+STARTUP_BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', 1500))
+# Modules that belong to the code paths using them, never to startup
+HEAVY_MODULES = ('numpy', 'pandas', 'sklearn', 'scipy', 'alembic', 'iqoptionapi', 'src.services')
+
+_COLD_START = """
+import sys, json, time, atexit, threading
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+hooks = atexit._ncallbacks()
+app.create_app('cli')
+created = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'total_ms': (created - started) * 1000,
+    'heavy': [name for name in %r if name in sys.modules],
+    'scheduler_running': app.scheduler.running,
+    'threads': [t.name for t in threading.enumerate() if t is not threading.main_thread()],
+    'exit_hooks': atexit._ncallbacks() - hooks,
+}))
+"""
+
 def check_imports():
     """Check if critical imports work"""
     try:
@@ -48,13 +73,51 @@ def check_imports():
 def check_app_creation():
     """Check if app can be created"""
     try:
-        from app import app
+        from app import create_app
+        create_app('cli')
         logger.info("✓ App creation successful")
         return True
     except Exception as e:
         logger.error(f"✗ App creation failed: {e}")
         return False
 
+def measure_cold_start():
+    """Import app and create_app('cli') in a fresh interpreter; timings and what it started"""
+    output = subprocess.run(
+        [sys.executable, '-c', _COLD_START % (HEAVY_MODULES,)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, timeout=120, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def check_startup_budget():
+    """Measure a cold start in a fresh interpreter and fail if it regressed"""
+    try:
+        result = measure_cold_start()
+    except Exception as e:
+        logger.error(f"✗ Cold start measurement failed: {e}")
+        return False
+
+    ok = True
+    if result['heavy']:
+        logger.error(f"✗ Startup imports heavy modules: {', '.join(result['heavy'])}")
+        ok = False
+    if result['scheduler_running']:
+        logger.error("✗ Scheduler started by a role that does not run jobs")
+        ok = False
+    if result['threads'] or result['exit_hooks']:
+        logger.error(f"✗ The cli role started threads {result['threads']} "
+                     f"or {result['exit_hooks']} exit hooks")
+        ok = False
+    if result['total_ms'] > STARTUP_BUDGET_MS:
+        logger.error(f"✗ Cold start took {result['total_ms']:.0f} ms "
+                     f"(budget {STARTUP_BUDGET_MS:.0f} ms, import {result['import_ms']:.0f} ms)")
+        ok = False
+    if ok:
+        logger.info(f"✓ Cold start {result['total_ms']:.0f} ms "
+                    f"(import {result['import_ms']:.0f} ms, budget {STARTUP_BUDGET_MS:.0f} ms)")
+    return ok
+
 def main():
     """Main startup check"""
     logger.info("Starting deployment checks...")
@@ -67,6 +130,10 @@ def main():
         logger.error("App creation failed")
         sys.exit(1)
     
+    if not check_startup_budget():
+        logger.error("Startup budget check failed")
+        sys.exit(1)
+    
     logger.info("✓ All startup checks passed!")
     return True
 
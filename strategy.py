@@ -0,0 +1,244 @@
+"""
+Compiled, immutable trading strategies.
+
+``compile_strategy`` turns a TradingConfig (or a dict of its columns) into a
+frozen ``Strategy``: session windows parsed to minutes, pattern toggles
+folded into a bitmask, percentages turned into fractions, and the signal hub
+parameter hash computed once. Strategies are cached by a hash of the config
+content, so users with identical settings share one object.
+
+``strategies`` holds the current strategy of each user. ``save_config``
+publishes the new one right after its commit (and asks the bot worker to do
+the same when bots run out of process); the bot hot loop reads
+``strategies.current(user_id)`` on every tick, so a running bot picks up new
+settings on its next tick with no restart and no ORM access. Configs saved
+by another web worker reach this process through a periodic ``sync`` of the
+users it holds strategies for.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from collections import OrderedDict
+
+from session_scheduler import session_windows, in_session
+from signal_hub import ANALYSIS_PARAMS, PATTERN_TOGGLES, params_hash
+
+logger = logging.getLogger(__name__)
+
+PATTERN_BITS = {name: 1 << index for index, name in enumerate(PATTERN_TOGGLES)}
+# Columns that do not change how the bot trades
+_IGNORED_COLUMNS = ('id', 'user_id', 'created_at', 'updated_at')
+MAX_COMPILED = 4096
+SYNC_SECONDS = int(os.getenv('STRATEGY_SYNC_SECONDS', 10))
+
+
+def config_values(config):
+    """Column values of a TradingConfig, or the dict itself"""
+    if isinstance(config, dict):
+        return dict(config)
+    return {column.key: getattr(config, column.key) for column in config.__table__.columns}
+
+
+def content_hash(values):
+    """Stable hash of the settings that affect trading"""
+    relevant = {key: value for key, value in values.items() if key not in _IGNORED_COLUMNS}
+    return hashlib.sha1(json.dumps(relevant, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class Strategy:
+    """Frozen, pre-parsed trading parameters"""
+    __slots__ = (
+        'content_hash', 'asset', 'operation_mode', 'windows',
+        'trade_amount', 'use_balance_percentage', 'balance_fraction',
+        'take_profit', 'stop_loss',
+        'martingale_enabled', 'max_martingale_levels', 'martingale_multiplier',
+        'rsi_oversold', 'rsi_overbought', 'pattern_mask',
+        'use_ml_signals', 'ml_confidence_threshold',
+        'analysis_params', 'analysis_hash',
+    )
+
+    def __init__(self, values, digest):
+        def put(name, value):
+            object.__setattr__(self, name, value)
+
+        put('content_hash', digest)
+        put('asset', values.get('asset'))
+        put('operation_mode', values.get('operation_mode'))
+        put('windows', session_windows(_Columns(values)))
+        put('trade_amount', float(values.get('trade_amount') or 0.0))
+        put('use_balance_percentage', bool(values.get('use_balance_percentage')))
+        put('balance_fraction', float(values.get('balance_percentage') or 0.0) / 100)
+        put('take_profit', float(values.get('take_profit') or 0.0))
+        put('stop_loss', float(values.get('stop_loss') or 0.0))
+        put('martingale_enabled', bool(values.get('martingale_enabled')))
+        put('max_martingale_levels', int(values.get('max_martingale_levels') or 0))
+        put('martingale_multiplier', float(values.get('martingale_multiplier') or 1.0))
+        put('rsi_oversold', float(values.get('rsi_oversold') or 0.0))
+        put('rsi_overbought', float(values.get('rsi_overbought') or 100.0))
+        mask = 0
+        for pattern, toggle in PATTERN_TOGGLES.items():
+            # Unset toggles count as enabled, like bot_view does
+            if values.get(toggle) is not False:
+                mask |= PATTERN_BITS[pattern]
+        put('pattern_mask', mask)
+        put('use_ml_signals', bool(values.get('use_ml_signals')))
+        put('ml_confidence_threshold', float(values.get('ml_confidence_threshold') or 0.0))
+        params = {name: values.get(name) for name in ANALYSIS_PARAMS}
+        put('analysis_params', params)
+        put('analysis_hash', params_hash(params))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Strategy is immutable; compile a new one')
+
+    def __delattr__(self, name):
+        raise AttributeError('Strategy is immutable; compile a new one')
+
+    def __repr__(self):
+        return f'<Strategy {self.content_hash} {self.asset}>'
+
+    def in_session(self, now):
+        return in_session(self.windows, now)
+
+    def pattern_enabled(self, pattern):
+        return bool(self.pattern_mask & PATTERN_BITS.get(pattern, 0))
+
+    def base_amount(self, balance):
+        """Entry amount for the current balance"""
+        if self.use_balance_percentage and balance:
+            return round(balance * self.balance_fraction, 2)
+        return self.trade_amount
+
+    def martingale_amount(self, base_amount, level):
+        """Amount at martingale level (0 = first entry); None past the last allowed level"""
+        if level == 0:
+            return base_amount
+        if not self.martingale_enabled or level > self.max_martingale_levels:
+            return None
+        return round(base_amount * self.martingale_multiplier ** level, 2)
+
+    def take_profit_reached(self, session_profit, start_balance):
+        return start_balance > 0 and session_profit >= start_balance * self.take_profit / 100
+
+    def stop_loss_reached(self, session_profit, start_balance):
+        return start_balance > 0 and -session_profit >= start_balance * self.stop_loss / 100
+
+
+class _Columns:
+    """Attribute view of a values dict for session_windows"""
+    __slots__ = ('_values',)
+
+    def __init__(self, values):
+        self._values = values
+
+    def __getattr__(self, name):
+        return self._values.get(name)
+
+
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def compile_strategy(config):
+    """Strategy for a TradingConfig or dict, shared by every config with the same content"""
+    values = config_values(config)
+    digest = content_hash(values)
+    with _compiled_lock:
+        strategy = _compiled.get(digest)
+        if strategy is not None:
+            _compiled.move_to_end(digest)
+            return strategy
+    strategy = Strategy(values, digest)
+    with _compiled_lock:
+        strategy = _compiled.setdefault(digest, strategy)
+        while len(_compiled) > MAX_COMPILED:
+            _compiled.popitem(last=False)
+    return strategy
+
+
+class StrategyRegistry:
+    """Current strategy of every user, swapped atomically on config saves"""
+
+    def __init__(self):
+        self._current = {}
+        self._lock = threading.Lock()
+        self._synced_until = None
+
+    def publish(self, config):
+        """Compile the config and make it the user's current strategy"""
+        strategy = compile_strategy(config)
+        user_id = int(config['user_id'] if isinstance(config, dict) else config.user_id)
+        previous = self._current.get(user_id)
+        self._current[user_id] = strategy
+        if previous is not None and previous is not strategy:
+            logger.info(f"Strategy for user {user_id} swapped to {strategy.content_hash}")
+        return strategy
+
+    def current(self, user_id):
+        """The user's strategy (a dict lookup; None until published)"""
+        return self._current.get(user_id)
+
+    def load(self, user_id):
+        """Current strategy, compiling it from the database if needed. Needs an app context."""
+        strategy = self._current.get(user_id)
+        if strategy is None:
+            from models import TradingConfig
+
+            with self._lock:
+                strategy = self._current.get(user_id)
+                if strategy is None:
+                    config = TradingConfig.query.filter_by(user_id=user_id).first()
+                    if config is None:
+                        return None
+                    strategy = self.publish(config)
+        return strategy
+
+    def discard(self, user_id):
+        self._current.pop(user_id, None)
+
+    def sync(self, app):
+        """Republish this process's strategies whose config was saved elsewhere since the last sync"""
+        from models import TradingConfig
+
+        user_ids = list(self._current)
+        if not user_ids:
+            return 0
+        with app.app_context():
+            query = TradingConfig.query.filter(TradingConfig.user_id.in_(user_ids))
+            if self._synced_until is not None:
+                # >= : a save committed late in the same clock tick is not skipped; republishing is idempotent
+                query = query.filter(TradingConfig.updated_at >= self._synced_until)
+            changed = query.all()
+            for config in changed:
+                self.publish(config)
+        stamps = [config.updated_at for config in changed if config.updated_at]
+        if stamps:
+            self._synced_until = max(stamps)
+        elif self._synced_until is None:
+            self._synced_until = datetime.utcnow()
+        return len(changed)
+
+    def stats(self):
+        with _compiled_lock:
+            compiled = len(_compiled)
+        return {'users': len(self._current), 'compiled': compiled}
+
+
+strategies = StrategyRegistry()
+
+
+def register_strategy_sync(app, scheduler):
+    """Keep the strategies of this process's bots in step with configs saved by other processes"""
+    scheduler.add_job(
+        strategies.sync,
+        'interval',
+        args=(app,),
+        seconds=SYNC_SECONDS,
+        id='strategy_sync',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
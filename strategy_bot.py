@@ -0,0 +1,337 @@
+"""
+In-tree trading bot built on the shared services.
+
+``StrategyBot`` is used with BOT_IMPLEMENTATION=strategy; the default,
+``trading_bot``, is ``src.services.trading_bot.TradingBot`` from the parent
+project. It implements the pooled-bot protocol (``setup``/``run_cycle``/
+``teardown``/``get_status``), so it runs under both bot engines, and reads
+``strategies.current(user_id)`` on every tick: a config saved while the bot
+runs takes effect on its next tick. The bot leases the user's shared broker
+session for its lifetime and makes every broker call through the pool.
+Settled trades and start/stop events go to the write-behind buffer.
+
+Bots subscribe to the signal hub for their market and indicator parameters.
+When a candle closes, the first bot of a market to notice feeds the candles
+to the hub, which analyses them once per configuration and hands the result
+to every subscriber. Each bot applies its own thresholds and pattern toggles
+(``bot_view``), and enters a one-candle trade when the RSI extremes and
+enabled patterns agree on a direction. Losses step the martingale up to the strategy's last level; the
+bot finishes when the session reaches its take profit or stop loss.
+
+Every candle is timed in ``latency_tracker`` from its close to the order
+acknowledgement. With STRATEGY_BOT_PREARM_SECONDS set, the bot arms a
+``PreArmedDecision`` that many seconds before the close and, when the closed
+candle matches, orders without waiting for the hub's analysis.
+"""
+
+import os
+import json
+import time
+import logging
+from datetime import datetime
+
+from broker_pool import broker_pool
+from signal_hub import signal_hub, bot_view, compute_analysis
+from strategy import strategies
+from trade_latency import latency_tracker, PreArmedDecision
+from write_behind import write_behind
+
+logger = logging.getLogger(__name__)
+
+TIMEFRAME = 60
+CANDLE_COUNT = int(os.getenv('STRATEGY_BOT_CANDLES', 100))
+EXPIRATION_MINUTES = 1
+MIN_AMOUNT = 1.0
+CALL_PATTERNS = ('bullish_engulfing', 'hammer')
+PUT_PATTERNS = ('bearish_engulfing', 'shooting_star')
+OTC_SUFFIX = '-OTC'
+# Seconds before the candle close to pre-arm the decision (0 disables)
+PREARM_SECONDS = float(os.getenv('STRATEGY_BOT_PREARM_SECONDS', 0))
+
+
+def current_candle():
+    """Index of the candle forming now"""
+    return int(time.time() // TIMEFRAME)
+
+
+def session_type(strategy, now):
+    """'morning' or 'afternoon' for auto-mode sessions (by window start), else 'manual'"""
+    if strategy.operation_mode != 'auto':
+        return 'manual'
+    minute = now.hour * 60 + now.minute
+    for start, end in strategy.windows:
+        if start <= minute < end:
+            return 'morning' if start < 12 * 60 else 'afternoon'
+    return 'manual'
+
+
+def signal_direction(view):
+    """'call', 'put' or None for one bot's view of the analysis"""
+    patterns = view['patterns']
+    call = view['rsi_oversold'] or any(patterns.get(name) for name in CALL_PATTERNS)
+    put = view['rsi_overbought'] or any(patterns.get(name) for name in PUT_PATTERNS)
+    if call == put:
+        return None
+    return 'call' if call else 'put'
+
+
+class StrategyBot:
+    """One user's bot driven by the bot manager's cycle"""
+
+    cycle_interval = 1.0
+
+    def __init__(self, user_id, email, password):
+        self.user_id = int(user_id)
+        self.email = email
+        self.password = password
+        self.start_balance = 0.0
+        self.balance = 0.0
+        self.session_profit = 0.0
+        self.martingale_level = 0
+        self.wins = 0
+        self.losses = 0
+        self.ties = 0
+        self.order = None
+        self.order_signal = None
+        self.last_candle = None
+        self.finished = None
+        self.leased = False
+        # (asset, analysis hash, hub token) of the current subscription
+        self.subscription = None
+        # (candle, analysis) last delivered by the hub, written from the feeding bot's thread
+        self.delivered = None
+        # Latency marks of the current candle, open until its analysis is consumed
+        self.timeline = None
+        self.prearmed = PreArmedDecision(self.user_id) if PREARM_SECONDS > 0 else None
+        # Candle the decision was armed in, and candle already decided by the armed decision
+        self.armed_candle = None
+        self.decided_candle = None
+
+    def _session(self):
+        return broker_pool.session(self.user_id, self.email, self.password)
+
+    # Bot protocol
+
+    def setup(self):
+        if strategies.current(self.user_id) is None:
+            logger.error(f"No strategy published for user {self.user_id}")
+            return False
+        # The lease keeps the shared session connected and out of idle eviction while the bot runs
+        if broker_pool.lease(self.user_id, self.email, self.password) is None:
+            logger.error(f"Broker unavailable, bot for user {self.user_id} not started")
+            return False
+        self.leased = True
+        balance = broker_pool.get_balance(self.user_id, self.email, self.password)
+        self.balance = self.start_balance = float(balance or 0.0)
+        write_behind.log_event('INFO', 'strategy_bot', 'Bot started', user_id=self.user_id,
+                               context={'balance': self.start_balance})
+        return True
+
+    def run_cycle(self):
+        strategy = strategies.current(self.user_id)
+        if strategy is None:
+            self.finished = 'config_removed'
+            return False
+
+        with self._session() as broker:
+            if broker is None:
+                # Reconnecting with backoff; try again next tick
+                return True
+            if self.order is not None:
+                self._settle(broker, strategy)
+            if self.session_profit and self._target_reached(strategy):
+                return False
+            if self.order is None:
+                candle = current_candle()
+                if candle != self.last_candle:
+                    self.last_candle = candle
+                    self._feed(broker, strategy, candle)
+                delivered = self.delivered
+                # Analyses arriving after the candle they were made for are stale
+                if delivered is not None and delivered[0] == candle:
+                    self.delivered = None
+                    if self.decided_candle != candle:
+                        self._trade(broker, strategy, delivered[1])
+                elif self.prearmed is not None and self.armed_candle != candle and \
+                        0 < (candle + 1) * TIMEFRAME - time.time() <= PREARM_SECONDS:
+                    self._arm(broker, strategy, candle)
+        return True
+
+    def teardown(self):
+        self._unsubscribe()
+        if self.leased:
+            self.leased = False
+            broker_pool.release(self.user_id)
+            write_behind.log_event('INFO', 'strategy_bot', f"Bot stopped: {self.finished or 'stopped'}",
+                                   user_id=self.user_id, context=self._summary())
+        if self.finished:
+            logger.info(f"Bot for user {self.user_id} finished: {self.finished} "
+                        f"(profit {self.session_profit:.2f})")
+
+    def _summary(self):
+        return {'session_profit': round(self.session_profit, 2), 'wins': self.wins,
+                'losses': self.losses, 'ties': self.ties}
+
+    def get_status(self):
+        strategy = strategies.current(self.user_id)
+        return {
+            'running': self.finished is None,
+            'balance': self.balance,
+            'start_balance': self.start_balance,
+            'session_profit': round(self.session_profit, 2),
+            'martingale_level': self.martingale_level,
+            'wins': self.wins,
+            'losses': self.losses,
+            'ties': self.ties,
+            'open_trade': dict(self.order) if self.order else None,
+            'asset': strategy.asset if strategy else None,
+            'strategy': strategy.content_hash if strategy else None,
+            'finished': self.finished,
+        }
+
+    # Trading
+
+    def _target_reached(self, strategy):
+        if strategy.take_profit_reached(self.session_profit, self.start_balance):
+            self.finished = 'take_profit'
+        elif strategy.stop_loss_reached(self.session_profit, self.start_balance):
+            self.finished = 'stop_loss'
+        return self.finished is not None
+
+    def _open_asset(self, asset):
+        """The configured asset, or its OTC market when the regular one is closed"""
+        if broker_pool.is_asset_open(self.user_id, self.email, self.password, asset):
+            return asset
+        if not asset.endswith(OTC_SUFFIX) and broker_pool.is_asset_open(
+                self.user_id, self.email, self.password, asset + OTC_SUFFIX):
+            return asset + OTC_SUFFIX
+        return None
+
+    def _on_analysis(self, analysis):
+        self.delivered = (current_candle(), analysis)
+
+    def _subscribe(self, asset, strategy):
+        """Follow the hub market of the asset and the strategy's indicator parameters"""
+        if self.subscription is not None and self.subscription[:2] == (asset, strategy.analysis_hash):
+            return
+        self._unsubscribe()
+        token = signal_hub.subscribe(asset, TIMEFRAME, strategy.analysis_params, self._on_analysis)
+        self.subscription = (asset, strategy.analysis_hash, token)
+
+    def _unsubscribe(self):
+        if self.subscription is not None:
+            signal_hub.unsubscribe(self.subscription[2])
+            self.subscription = None
+
+    def _feed(self, broker, strategy, candle):
+        # The previous candle closed when this one started
+        self.timeline = latency_tracker.timeline(self.user_id, candle * TIMEFRAME)
+        asset = self._open_asset(strategy.asset)
+        if asset is None:
+            return
+        self._subscribe(asset, strategy)
+        if self.armed_candle == candle - 1:
+            self._trade_prearmed(broker, strategy, asset, candle)
+
+        def closed_candles():
+            candles = broker.get_candles(asset, TIMEFRAME, CANDLE_COUNT + 1, time.time())
+            # The last candle is still forming
+            return candles[:-1] if candles else None
+
+        signal_hub.feed(asset, TIMEFRAME, candle, closed_candles)
+
+    def _decide(self, strategy, analysis):
+        """(direction, view) of the strategy for an analysis"""
+        view = bot_view(analysis, strategy)
+        return signal_direction(view), view
+
+    def _arm(self, broker, strategy, candle):
+        """Precompute the decision for both closes of the forming candle"""
+        self.armed_candle = candle
+        if self.subscription is None:
+            return
+        candles = broker.get_candles(self.subscription[0], TIMEFRAME, CANDLE_COUNT + 1, time.time())
+        if not candles:
+            self.armed_candle = None
+            return
+        params = strategy.analysis_params
+        # The history the hub analyses: CANDLE_COUNT candles ending with the (scenario) closed one
+        self.prearmed.arm(candles[1:-1], candles[-1],
+                          lambda scenario: self._decide(strategy, compute_analysis(scenario, params)))
+
+    def _trade_prearmed(self, broker, strategy, asset, candle):
+        """Order on the armed decision when the candle closed as expected"""
+        self.armed_candle = None
+        candles = broker.get_candles(asset, TIMEFRAME, 2, time.time())
+        closed = candles[-2] if candles and len(candles) > 1 else {'from': None, 'open': 0.0, 'close': 0.0}
+        hit = self.prearmed.resolve(closed)
+        if hit is None:
+            return
+        self.decided_candle = candle
+        direction, view = hit[0]
+        if direction is not None:
+            self._order(broker, strategy, asset, direction, view)
+
+    def _trade(self, broker, strategy, analysis):
+        self.timeline.mark('indicators_updated')
+        direction, view = self._decide(strategy, analysis)
+        self.timeline.mark('ml_scored')
+        if direction is None:
+            return
+        self._order(broker, strategy, self.subscription[0], direction, view)
+
+    def _order(self, broker, strategy, asset, direction, view):
+        base = strategy.base_amount(self.balance)
+        amount = strategy.martingale_amount(base, self.martingale_level)
+        if amount is None:
+            # The strategy lost martingale levels since the last loss
+            self.martingale_level = 0
+            amount = base
+        amount = max(MIN_AMOUNT, amount)
+
+        self.timeline.mark('order_sent')
+        ok, order_id = broker.buy(amount, asset, direction, EXPIRATION_MINUTES)
+        if not ok:
+            logger.warning(f"Order rejected for user {self.user_id} on {asset}: {order_id}")
+            return
+        self.timeline.mark('order_acknowledged')
+        self.order = {'id': order_id, 'asset': asset, 'direction': direction, 'amount': amount,
+                      'martingale_level': self.martingale_level, 'placed_at': time.time()}
+        self.order_signal = {
+            'rsi_value': view['rsi'], 'macd_value': view['macd'], 'macd_signal_value': view['macd_signal'],
+            'ma_short_value': view['ma_short'], 'ma_long_value': view['ma_long'],
+            'aroon_up': view['aroon_up'], 'aroon_down': view['aroon_down'],
+            'trend_direction': view['trend_direction'], 'entry_price': view['close'],
+            'patterns_detected': json.dumps([name for name, found in view['patterns'].items() if found]),
+        }
+
+    def _settle(self, broker, strategy):
+        profit = broker.check_win(self.order['id'], wait=False)
+        if profit is None:
+            return
+        profit = float(profit)
+        self.session_profit += profit
+        if profit > 0:
+            self.wins += 1
+            self.martingale_level = 0
+        elif profit < 0:
+            self.losses += 1
+            next_level = self.martingale_level + 1
+            self.martingale_level = next_level if strategy.martingale_amount(1.0, next_level) else 0
+        else:
+            self.ties += 1
+        self._record(profit, strategy)
+        self.order = None
+        self.balance = float(broker.update_balance() or self.balance)
+
+    def _record(self, profit, strategy):
+        """Queue the settled trade for the write-behind flusher"""
+        order = self.order
+        result = 'win' if profit > 0 else 'loss' if profit < 0 else 'tie'
+        write_behind.record_trade(dict(
+            self.order_signal,
+            user_id=self.user_id, asset=order['asset'], direction=order['direction'], amount=order['amount'],
+            expiration_time=EXPIRATION_MINUTES * 60, result=result, profit=profit,
+            payout_percentage=round(profit / order['amount'] * 100, 2) if profit > 0 else None,
+            martingale_level=order['martingale_level'], is_martingale=order['martingale_level'] > 0,
+            session_type=session_type(strategy, datetime.now())))
@@ -0,0 +1,57 @@
+"""
+Shared fixtures. Every test session gets its own temporary directory for the
+database and the cross-worker SQLite stores; the variables are set before any
+app module is imported because they are read at import time.
+"""
+
+import os
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix='iqbot-tests-')
+for _name, _filename in (('RATE_LIMIT_DB_PATH', 'rate-limits.db'), ('REVOCATION_DB_PATH', 'revoked.db'),
+                         ('LEADER_DB_PATH', 'leader.db'), ('LOG_FILE', 'app.log')):
+    os.environ[_name] = os.path.join(_workdir, _filename)
+os.environ['METRICS_DIR'] = os.path.join(_workdir, 'metrics')
+os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(_workdir, "app.db")}'
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    """App with the 'cli' role on a fresh SQLite database"""
+    from app import create_app
+    from database import db, engine_options
+
+    url = f'sqlite:///{tmp_path / "app.db"}'
+    app = create_app('cli', config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': url,
+                                    'SQLALCHEMY_ENGINE_OPTIONS': engine_options(url)})
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def user(app):
+    from database import db
+    from models import User, TradingConfig
+
+    account = User(name='Test', email='test@example.com', password_hash='x',
+                   iq_email='test@sim', iq_password='sim')
+    db.session.add(account)
+    db.session.flush()
+    db.session.add(TradingConfig(user_id=account.id))
+    db.session.commit()
+    return account
+
+
+@pytest.fixture
+def auth_headers(app, user):
+    """Bearer token for ``user``"""
+    from flask_jwt_extended import create_access_token
+
+    # String subject: PyJWT >= 2.10 rejects integer 'sub' claims when decoding
+    return {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
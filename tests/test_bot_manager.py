@@ -0,0 +1,112 @@
+import time
+import threading
+
+import pytest
+
+from async_engine import AsyncBotEngine
+from bot_manager import BotManager
+
+
+class ThreadedBot:
+    """start()/stop() bot whose thread ends when ``done`` is set"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.done.wait, daemon=True)
+        self.stopped = False
+
+    def start(self):
+        self.thread.start()
+        return True
+
+    def stop(self):
+        self.stopped = True
+        self.done.set()
+        return True
+
+    def get_status(self):
+        return {'running': self.thread.is_alive(), 'balance': 10.0}
+
+
+class StatusOnlyBot:
+    """Threaded bot exposing no thread, only its status"""
+
+    def __init__(self):
+        self.running = False
+
+    def start(self):
+        self.running = True
+        return True
+
+    def stop(self):
+        self.running = False
+        return True
+
+    def get_status(self):
+        return {'running': self.running, 'balance': 10.0}
+
+
+@pytest.fixture(params=['threaded', 'asyncio'])
+def manager(request):
+    manager = BotManager() if request.param == 'threaded' else AsyncBotEngine(cpu_workers=2)
+    yield manager
+    manager.shutdown()
+
+
+def test_bot_whose_thread_ended_is_unregistered(manager):
+    bot = ThreadedBot()
+    assert manager.start_bot(1, bot)
+    assert manager.is_running(1) and manager.running_user_ids() == [1]
+
+    bot.done.set()  # take profit reached inside the bot
+    bot.thread.join()
+    assert not manager.is_running(1)
+    assert manager.get_status(1)['running'] is False
+    assert manager.stats()['bots'] == 0
+    assert not bot.stopped
+
+    # The user can start again
+    assert manager.start_bot(1, ThreadedBot())
+
+
+def test_bot_reporting_not_running_is_unregistered(manager):
+    bot = StatusOnlyBot()
+    assert manager.start_bot(2, bot)
+    assert manager.is_running(2)
+    bot.running = False
+    assert manager.running_user_ids() == []
+    assert manager.stop_bot(2) is False
+
+
+class SlowCycleBot:
+    """Pooled bot whose cycle orders after a delay"""
+
+    cycle_interval = 0.01
+
+    def __init__(self):
+        self.in_cycle = threading.Event()
+        self.events = []
+
+    def run_cycle(self):
+        self.in_cycle.set()
+        time.sleep(0.2)
+        self.events.append('order')
+        return True
+
+    def teardown(self):
+        self.events.append('teardown')
+
+
+def test_stop_waits_for_the_cycle_in_flight():
+    engine = AsyncBotEngine(cpu_workers=2)
+    bot = SlowCycleBot()
+    try:
+        assert engine.start_bot(3, bot)
+        assert bot.in_cycle.wait(1)
+        assert engine.stop_bot(3)
+        events = list(bot.events)
+        time.sleep(0.3)
+    finally:
+        engine.shutdown()
+    # The order of the cycle in flight went out before the stop returned, and none after
+    assert events == ['order', 'teardown'] and bot.events == events
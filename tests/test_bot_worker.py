@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+from bot_worker import BotWorkerClient, StatusBoard
+
+
+@pytest.fixture
+def board_name():
+    return f'iqbot_test_{os.getpid()}'
+
+
+def test_client_follows_a_restarted_worker_board(board_name):
+    board = StatusBoard(board_name, slots=4, create=True)
+    board.publish(1, {'running': True, 'balance': 100.0})
+    client = BotWorkerClient(board_name=board_name)
+    assert client.get_status(1)['balance'] == 100.0
+
+    # The restarted worker replaces the board; the client still maps the old one
+    restarted = StatusBoard(board_name, slots=4, create=True)
+    restarted.publish(1, {'running': True, 'balance': 250.0})
+    assert not board.live
+    assert client.get_status(1)['balance'] == 250.0
+    assert client.running_user_ids() == [1]
+
+    restarted.close(unlink=True)
+    assert client.get_status(1)['running'] is False
+    client.shutdown()
+
+
+def test_client_without_a_worker_reports_stopped(board_name):
+    client = BotWorkerClient(board_name=board_name)
+    assert client.get_status(7)['running'] is False
+    assert client.running_user_ids() == []
@@ -0,0 +1,51 @@
+import threading
+
+from broker_pool import BrokerConnectionPool
+from broker_simulator import SimulatedMarket
+
+
+def test_slow_client_construction_does_not_block_other_users():
+    market = SimulatedMarket.synthetic(candles=100, seed=1)
+    entered, release = threading.Event(), threading.Event()
+
+    def factory(email, password):
+        if email == 'slow@sim':
+            entered.set()
+            release.wait(5)
+        return market.service(email, password)
+
+    pool = BrokerConnectionPool(service_factory=factory)
+    slow = threading.Thread(target=pool.get_balance, args=(1, 'slow@sim', 'x'))
+    slow.start()
+    assert entered.wait(5)
+    try:
+        # Would wait on the pool lock until the slow client is built if the factory ran under it
+        balances = []
+        fast = threading.Thread(target=lambda: balances.append(pool.get_balance(2, 'fast@sim', 'x')))
+        fast.start()
+        fast.join(1)
+        assert balances == [market.initial_balance]
+    finally:
+        release.set()
+        slow.join()
+    assert pool.stats()['sessions'] == 2
+
+
+def test_concurrent_first_use_keeps_one_session():
+    market = SimulatedMarket.synthetic(candles=100, seed=1)
+    pool = BrokerConnectionPool(service_factory=market.service)
+    threads = [threading.Thread(target=pool.get_balance, args=(1, 'a@sim', 'x')) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert pool.stats()['sessions'] == 1 and pool.stats()['logins'] == 1
+
+
+def test_credential_change_replaces_the_session():
+    market = SimulatedMarket.synthetic(candles=100, seed=1)
+    pool = BrokerConnectionPool(service_factory=market.service)
+    pool.get_balance(1, 'a@sim', 'old')
+    old = pool._sessions[1]
+    pool.get_balance(1, 'a@sim', 'new')
+    assert pool._sessions[1] is not old and not old.connected
@@ -0,0 +1,22 @@
+import os
+import runpy
+
+import pytest
+
+CONF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gunicorn.conf.py')
+
+
+@pytest.mark.parametrize('mode, concurrency, expected', [
+    (None, None, 1),
+    ('inprocess', '4', 1),
+    ('external', None, 2),
+    ('external', '4', 4),
+])
+def test_one_worker_while_bots_run_in_process(monkeypatch, mode, concurrency, expected):
+    for name, value in (('BOT_WORKER_MODE', mode), ('WEB_CONCURRENCY', concurrency)):
+        if value is None:
+            monkeypatch.delenv(name, raising=False)
+        else:
+            monkeypatch.setenv(name, value)
+    monkeypatch.setenv('SOCKETIO_ASYNC_MODE', 'threading')
+    assert runpy.run_path(CONF)['workers'] == expected
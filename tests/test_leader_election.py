@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+from leader_election import SKIPPED, LeaderElector, SqliteLease, job_key
+
+
+@pytest.fixture
+def electors(tmp_path):
+    """Two processes' electors sharing one lease file"""
+    path = str(tmp_path / 'leader.sqlite3')
+    pair = []
+    for _ in range(2):
+        elector = LeaderElector(lease_seconds=0.3, renew_seconds=0.1)
+        elector.backend = SqliteLease(elector.name, elector.lease_seconds, path)
+        pair.append(elector)
+    return pair
+
+
+def test_one_process_leads(electors):
+    first, second = electors
+    assert first.campaign() and not second.campaign()
+    assert first.is_leader and not second.is_leader
+    assert first.campaign()  # renewing keeps the lease
+    assert first.stats()['current_holder'] == first.holder
+
+
+def test_follower_takes_over_when_the_leader_steps_down(electors):
+    first, second = electors
+    changes = []
+    first.add_listener(changes.append)
+    first.campaign()
+    first.shutdown()
+    assert changes == [True, False]
+    assert second.campaign()
+
+
+def test_expired_lease_is_taken_over(electors):
+    first, second = electors
+    first.campaign()
+    time.sleep(0.35)
+    assert not first.is_leader  # no renewal within the lease
+    assert second.campaign()
+    assert not first.campaign()
+    assert first.counters['demotions'] == 1
+
+
+def test_leader_keeps_leading_through_errors_until_the_lease_runs_out(electors, monkeypatch):
+    first, _ = electors
+    first.campaign()
+
+    def broken(holder):
+        raise OSError('database is locked')
+
+    monkeypatch.setattr(first.backend, 'acquire', broken)
+    assert first.campaign() and first.counters['errors'] == 1
+    time.sleep(0.35)
+    assert not first.campaign()
+
+
+def test_guarded_jobs_run_on_the_leader_only(electors):
+    first, second = electors
+    first.campaign()
+    second.campaign()
+    job = lambda: 'ran'  # noqa: E731
+    assert first.guard(job, 'sweep')() == 'ran'
+    assert second.guard(job, 'sweep')() is SKIPPED
+
+    second.record('ml_retrain_12', ran=False)
+    second.record('ml_retrain_13', ran=False)
+    assert second.stats()['jobs']['ml_retrain']['skipped'] == 2
+    assert job_key('auto_session_start') == 'auto_session_start'
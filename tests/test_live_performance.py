@@ -0,0 +1,20 @@
+from database import db
+from live_performance import live_performance
+from models import MLModel
+
+
+def test_live_accuracy_counts_unflushed_results(app, user):
+    model = MLModel(user_id=user.id, model_name='rf', asset='EURUSD')
+    db.session.add(model)
+    db.session.commit()
+    assert model.live_accuracy == 0.0
+
+    for is_win in (True, True, False, True):
+        model.update_live_performance(is_win)
+    assert model.live_accuracy == 75.0
+
+    assert live_performance.flush() == 4
+    db.session.refresh(model)
+    assert (model.live_trades, model.live_wins) == (4, 3)
+    assert model.live_accuracy == 75.0
+    assert db.session.query(MLModel.live_accuracy).scalar() == 75.0
@@ -0,0 +1,114 @@
+import time
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import login_guard as guard_module
+import routes
+from database import db
+from login_guard import LoginGuard, LoginOverloaded, RateLimiter
+
+
+@pytest.fixture
+def guard(tmp_path, monkeypatch):
+    guard = LoginGuard(limiter=RateLimiter(str(tmp_path / 'rate-limits.sqlite3')))
+    monkeypatch.setattr(routes, 'login_guard', guard)
+    yield guard
+    guard.hasher.shutdown()
+
+
+@pytest.fixture
+def account(user):
+    user.password_hash = generate_password_hash('secret', method='pbkdf2:sha256:1000')
+    db.session.commit()
+    return user
+
+
+def _login(client, password, ip='10.0.0.1', email='test@example.com', **headers):
+    return client.post('/api/auth/login', json={'email': email, 'password': password},
+                       environ_base={'REMOTE_ADDR': ip}, headers=headers)
+
+
+def test_successful_logins_do_not_use_up_the_email_attempts(client, guard, account):
+    for _ in range(guard_module.MAX_LOGIN_ATTEMPTS + 3):
+        assert _login(client, 'secret').status_code == 200
+
+
+def test_failed_logins_are_limited_per_email(client, guard, account):
+    for _ in range(guard_module.MAX_LOGIN_ATTEMPTS):
+        assert _login(client, 'wrong').status_code == 401
+    response = _login(client, 'secret')
+    assert response.status_code == 429 and int(response.headers['Retry-After']) > 0
+
+
+def test_successes_refund_only_their_own_attempt(client, guard, account):
+    for _ in range(guard_module.MAX_LOGIN_ATTEMPTS - 1):
+        assert _login(client, 'wrong').status_code == 401
+    assert _login(client, 'secret').status_code == 200
+    assert _login(client, 'wrong').status_code == 401
+    assert _login(client, 'wrong').status_code == 429
+
+
+@pytest.mark.parametrize('path', ['/api/auth/login', '/login'])
+def test_overloaded_logins_do_not_use_up_the_email_attempts(client, guard, account, monkeypatch, path):
+    check = guard.hasher.check
+
+    def overloaded(password_hash, password):
+        raise LoginOverloaded(retry_after=2)
+
+    monkeypatch.setattr(guard.hasher, 'check', overloaded)
+    for _ in range(guard_module.MAX_LOGIN_ATTEMPTS + 3):
+        response = client.post(path, json={'email': 'test@example.com', 'password': 'secret'},
+                               environ_base={'REMOTE_ADDR': '10.0.0.1'})
+        assert response.status_code == 429 and response.headers['Retry-After'] == '2'
+
+    # The email bucket is still full: every failed attempt is available
+    monkeypatch.setattr(guard.hasher, 'check', check)
+    for _ in range(guard_module.MAX_LOGIN_ATTEMPTS):
+        assert _login(client, 'wrong').status_code == 401
+    assert _login(client, 'wrong').status_code == 429
+
+
+def test_ip_limit_uses_the_forwarded_client_behind_a_trusted_proxy(tmp_path, guard, monkeypatch):
+    from app import create_app
+    from database import engine_options
+
+    monkeypatch.setattr(guard_module, 'RATE_LIMIT_PER_MINUTE', 2)
+    url = f'sqlite:///{tmp_path / "proxy.db"}'
+    app = create_app('cli', config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': url,
+                                    'SQLALCHEMY_ENGINE_OPTIONS': engine_options(url), 'TRUSTED_PROXY_HOPS': 1})
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+        # Every request arrives from the proxy's address; clients differ by X-Forwarded-For
+        for client_ip in ('203.0.113.1', '203.0.113.2', '203.0.113.3'):
+            for attempt in range(2):
+                response = _login(client, 'x', ip='10.0.0.254', email=f'{client_ip}-{attempt}@example.com',
+                                  **{'X-Forwarded-For': client_ip})
+                assert response.status_code == 401
+        response = _login(client, 'x', ip='10.0.0.254', email='another@example.com',
+                          **{'X-Forwarded-For': '203.0.113.1'})
+        assert response.status_code == 429
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_rate_limiter_buckets_refill_and_are_shared(tmp_path):
+    path = str(tmp_path / 'buckets.sqlite3')
+    limiter, other_process = RateLimiter(path), RateLimiter(path)
+    assert [limiter.take('ip:1', 2, 60) for _ in range(2)] == [0, 0]
+    assert other_process.take('ip:1', 2, 60) > 0  # same bucket through the shared file
+    assert limiter.take('ip:2', 2, 60) == 0  # other keys are independent
+
+    other_process.refund('ip:1', 2, 60)
+    assert limiter.take('ip:1', 2, 60) == 0
+    assert limiter.take('ip:fast', 1, 0.05) == 0
+    time.sleep(0.06)
+    assert limiter.take('ip:fast', 1, 0.05) == 0
+
+
+def test_rate_limiter_purges_idle_buckets(tmp_path):
+    limiter = RateLimiter(str(tmp_path / 'buckets.sqlite3'))
+    limiter.take('ip:1', 5, 60)
+    assert limiter.purge(3600) == 0
+    assert limiter.purge(-1) == 1
@@ -0,0 +1,34 @@
+import pytest
+
+from ml_evaluation import rolling_windows
+
+
+def test_windows_slide_by_step():
+    windows = list(rolling_windows(100, 50, 10, step=20))
+    assert [(train.start, test.stop) for train, test in windows] == [(0, 60), (20, 80), (40, 100)]
+
+
+@pytest.mark.parametrize('step', [0, -5])
+def test_non_positive_step_is_rejected(step):
+    with pytest.raises(ValueError):
+        list(rolling_windows(100, 50, 10, step=step))
+
+
+def test_max_windows_keeps_the_latest():
+    windows = list(rolling_windows(10000, 50, 10, step=1, max_windows=3))
+    assert len(windows) == 3
+    assert windows[-1][1].stop == 10000
+
+
+@pytest.mark.parametrize('body', [
+    {'step': 0},
+    {'step': -1},
+    {'train_size': 'many'},
+    {'train_size': 10 ** 9},
+    {'test_size': 1.5},
+    {'step': True},
+    {'assets': 'EURUSD'},
+])
+def test_walk_forward_route_rejects_bad_parameters(client, auth_headers, body):
+    response = client.post('/api/ml/walk-forward', json=body, headers=auth_headers)
+    assert response.status_code == 400
@@ -0,0 +1,66 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import ml_training
+from database import db
+from models import MLModel, TradeHistory
+
+
+class RecordingScheduler:
+    def __init__(self):
+        self.jobs = []
+
+    def add_job(self, func, trigger=None, **kwargs):
+        self.jobs.append((func, trigger, kwargs))
+
+
+def _add_trades(user_id, count, start):
+    rng = random.Random(count)
+    db.session.execute(TradeHistory.__table__.insert(), [dict(
+        user_id=user_id, asset='EURUSD', direction=rng.choice(('call', 'put')), amount=10.0,
+        timestamp=start + timedelta(minutes=i), result=rng.choice(('win', 'loss')),
+        rsi_value=rng.uniform(10, 90), signal_strength=rng.random()) for i in range(count)])
+    db.session.commit()
+
+
+@pytest.fixture
+def forest(app, user, tmp_path, monkeypatch):
+    monkeypatch.setattr(ml_training, 'ML_MODELS_DIR', str(tmp_path))
+    model = MLModel(user_id=user.id, model_name='rf', model_type='random_forest', asset='EURUSD')
+    db.session.add(model)
+    db.session.commit()
+    _add_trades(user.id, 60, datetime(2026, 1, 1))
+    assert ml_training.retrain_model(model.id)
+    return model
+
+
+def test_warm_start_grows_the_forest(forest, user):
+    _add_trades(user.id, 30, datetime(2026, 1, 2))
+    assert ml_training.retrain_model(forest.id)
+    assert ml_training.load_artifact(forest)['estimator'].n_estimators == 50 + ml_training.TREES_PER_INCREMENT
+
+
+def test_forest_at_the_tree_limit_is_rebuilt(forest, user, monkeypatch):
+    monkeypatch.setattr(ml_training, 'MAX_TREES', 55)
+    _add_trades(user.id, 30, datetime(2026, 1, 2))
+    assert ml_training.retrain_model(forest.id)
+    assert ml_training.load_artifact(forest)['estimator'].n_estimators == 50
+    assert forest.training_samples == 90
+
+
+def test_retrain_at_the_user_limit_is_deferred(app):
+    scheduler = RecordingScheduler()
+    app.extensions['scheduler'] = scheduler
+    slot = ml_training._user_slot(42)
+    assert slot.acquire(blocking=False)
+    try:
+        assert ml_training.run_retrain_job(app, 7, 42) is False
+    finally:
+        slot.release()
+
+    (func, trigger, kwargs), = scheduler.jobs
+    assert func is ml_training.run_retrain_job and trigger == 'date'
+    assert kwargs['id'] == 'ml_retrain_7' and kwargs['args'][1:] == [7, 42, True]
+    assert kwargs['run_date'] > datetime.now()
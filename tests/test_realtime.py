@@ -0,0 +1,76 @@
+from datetime import datetime
+
+import pytest
+
+import bot_manager
+import realtime
+from realtime import RealtimePublisher
+
+
+class RecordingSocketIO:
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, event, data, to=None):
+        self.emitted.append((event, data, to))
+
+    def start_background_task(self, target):
+        return object()  # flushed by the tests instead
+
+
+@pytest.fixture
+def publisher(monkeypatch):
+    publisher = RealtimePublisher()
+    publisher.init_app(RecordingSocketIO())
+    monkeypatch.setattr(realtime, 'publisher', publisher)
+    monkeypatch.setattr(bot_manager.bot_manager, 'get_status', lambda user_id: {'running': True, 'balance': 5})
+    publisher.connected(1)
+    return publisher
+
+
+def _events(publisher, name):
+    return [data for event, data, _ in publisher.socketio.emitted if event == name]
+
+
+def test_trades_without_ids_are_not_coalesced(publisher):
+    now = datetime.utcnow()
+    realtime._publish_bulk_trades([
+        dict(user_id=1, asset='EURUSD', direction='call', amount=10.0, result='win', profit=8.0, timestamp=now),
+        dict(user_id=1, asset='GBPUSD', direction='put', amount=10.0, result='loss', profit=-10.0, timestamp=now),
+    ])
+    publisher.flush()
+    trades, = _events(publisher, 'trades')
+    assert [trade['asset'] for trade in trades] == ['EURUSD', 'GBPUSD']
+    delta, = _events(publisher, 'stats_delta')
+    assert delta['total_trades'] == 2 and delta['total_profit'] == -2.0
+
+
+def test_updates_of_one_trade_are_coalesced(publisher):
+    trade = {'id': 9, 'asset': 'EURUSD', 'result': None}
+    publisher.trade_changed(1, trade, dict.fromkeys(realtime._STAT_KEYS, 0))
+    publisher.trade_changed(1, dict(trade, result='win'), dict.fromkeys(realtime._STAT_KEYS, 0))
+    publisher.flush()
+    assert _events(publisher, 'trades') == [[dict(trade, result='win')]]
+
+
+def test_bot_status_is_sent_on_change_only(publisher):
+    publisher.flush()
+    publisher.flush()
+    assert len(_events(publisher, 'bot_status')) == 1
+    publisher.disconnected(1)
+    publisher.flush()
+    assert publisher._last_status == {}
+
+
+def test_nothing_is_buffered_without_the_flush_task(monkeypatch):
+    monkeypatch.setattr(realtime, 'MESSAGE_QUEUE', 'redis://localhost:6379')
+    publisher = RealtimePublisher()
+    publisher.init_app(RecordingSocketIO())
+    trade = {'id': 9, 'asset': 'EURUSD', 'result': 'win'}
+    publisher.trade_changed(1, trade, dict.fromkeys(realtime._STAT_KEYS, 1))
+    assert not publisher._trades and not publisher._deltas
+
+    # Once the flush task runs, users connected to other processes get the changes
+    publisher.start()
+    publisher.trade_changed(1, trade, dict.fromkeys(realtime._STAT_KEYS, 1))
+    assert publisher._trades[1] == {9: trade} and publisher._deltas[1]['total_trades'] == 1
@@ -0,0 +1,49 @@
+import pytest
+
+from risk_simulator import simulate_sessions
+
+
+def test_sure_wins_reach_take_profit():
+    result = simulate_sessions(1000.0, 10.0, win_rate=1.0, payout=0.8, take_profit=5, stop_loss=50,
+                               sessions=100, seed=1)
+    assert result['take_profit_probability'] == 1.0 and result['bust_probability'] == 0.0
+
+
+
+def test_martingale_ladders_deeper_than_int8():
+    # Every trade loses: the level climbs 0..200, resets, then climbs 0..99
+    result = simulate_sessions(1e9, 1.0, win_rate=0.0, payout=0.8, take_profit=50, stop_loss=100,
+                               max_martingale_levels=200, martingale_multiplier=1.01,
+                               sessions=10, max_trades=301, seed=1)
+    expected = -(sum(1.01 ** level for level in range(201)) + sum(1.01 ** level for level in range(100)))
+    assert result['pnl']['mean'] == pytest.approx(expected)
+
+    # Levels no session can reach are not built into the ladder
+    result = simulate_sessions(1000.0, 10.0, win_rate=0.0, payout=0.8, take_profit=5, stop_loss=50,
+                               max_martingale_levels=10 ** 9, sessions=10, max_trades=50, seed=1)
+    assert result['bust_probability'] + result['stop_loss_probability'] == 1.0
+
+@pytest.mark.parametrize('body', [
+    {'win_rate': 55, 'max_trades': 0},
+    {'win_rate': 55, 'max_trades': 10 ** 6},
+    {'win_rate': 150},
+    {'win_rate': -1},
+    {'win_rate': 'high'},
+    {'win_rate': 55, 'payout': 0},
+    {'win_rate': 55, 'payout': 87},
+    {'win_rate': 55, 'sessions': 0},
+    {'win_rate': 55, 'sessions': 10 ** 9},
+    {'win_rate': 55, 'balance': 'lots'},
+])
+def test_simulate_route_rejects_bad_parameters(client, auth_headers, body):
+    response = client.post('/api/risk/simulate', json=body, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_simulate_route_takes_win_rate_in_percent(client, auth_headers):
+    response = client.post('/api/risk/simulate', headers=auth_headers,
+                           json={'win_rate': 55, 'payout': 0.87, 'sessions': 1000, 'max_trades': 20,
+                                 'balance': 1000, 'seed': 3})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['parameters']['win_rate'] == 0.55 and body['parameters']['sessions'] == 1000
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import bot_manager
+from session_scheduler import SessionScheduler
+
+
+class InlineExecutor:
+    def submit(self, func, *args):
+        func(*args)
+
+
+def _config(user_id=1, mode='auto', start=None, end=None):
+    """Config whose morning window is [start, end) minutes from now"""
+    now = datetime.now()
+    start = (now + timedelta(minutes=start)).strftime('%H:%M') if start is not None else None
+    end = (now + timedelta(minutes=end)).strftime('%H:%M') if end is not None else None
+    return SimpleNamespace(user_id=user_id, operation_mode=mode, morning_start=start, morning_end=end,
+                           afternoon_start=None, afternoon_end=None)
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    if not (2 < datetime.now().hour < 21):
+        pytest.skip('windows around now would cross midnight')
+    stopped = []
+    monkeypatch.setattr(bot_manager.bot_manager, 'stop_bot', lambda user_id: stopped.append(user_id) or True)
+    scheduler = SessionScheduler()
+    scheduler._executor = InlineExecutor()
+    monkeypatch.setattr(scheduler, '_start_session', lambda user_id, adopt=False: scheduler._started.add(user_id))
+    scheduler.stopped = stopped
+    return scheduler
+
+
+def test_joining_mid_session_starts_the_bot(sessions):
+    sessions.update_user(_config(start=-10, end=30))
+    assert sessions._started == {1}
+    assert sessions.stats()['users'] == 1 and sessions.stats()['queued'] == 1
+
+
+def test_switch_to_manual_stops_the_scheduled_bot(sessions):
+    sessions.update_user(_config(start=-10, end=30))
+    sessions.update_user(_config(mode='manual', start=-10, end=30))
+    assert sessions.stopped == [1] and not sessions._started
+    assert sessions.next_session(1) is None
+
+
+def test_moving_the_window_away_stops_the_scheduled_bot(sessions):
+    sessions.update_user(_config(start=-10, end=30))
+    sessions.update_user(_config(start=60, end=120))
+    assert sessions.stopped == [1] and not sessions._started
+    assert sessions.next_session(1) == _config(start=60).morning_start
+
+
+def test_window_change_within_the_session_keeps_the_bot(sessions):
+    sessions.update_user(_config(start=-10, end=30))
+    sessions.update_user(_config(start=-20, end=60))
+    assert sessions.stopped == [] and sessions._started == {1}
+
+
+def test_bots_started_by_hand_are_left_alone(sessions):
+    sessions.update_user(_config(start=60, end=120))
+    sessions.update_user(_config(mode='manual'))
+    assert sessions.stopped == []
+
+
+def test_superseded_boundaries_are_skipped(sessions):
+    sessions.update_user(_config(start=60, end=120))
+    sessions.update_user(_config(start=90, end=120))
+    sessions._arm()
+    assert sessions.stats()['queued'] == 1
+
+
+def test_next_schedule_is_computed_from_the_config_without_the_scheduler(app, user, sessions, monkeypatch):
+    import routes
+    from database import db
+    from entity_cache import entity_cache
+    from models import TradingConfig
+
+    monkeypatch.setattr(routes, 'session_scheduler', sessions)  # loaded no user
+    window = _config(start=60, end=120)
+    config = TradingConfig.query.filter_by(user_id=user.id).one()
+    config.operation_mode, config.morning_start, config.morning_end = 'auto', window.morning_start, window.morning_end
+    config.afternoon_start = config.afternoon_end = None
+    db.session.commit()
+    entity_cache.invalidate_config(user.id)
+
+    assert routes.get_next_schedule(user.id) == window.morning_start
+    config.operation_mode = 'manual'
+    db.session.commit()
+    entity_cache.invalidate_config(user.id)
+    assert routes.get_next_schedule(user.id) is None
+
+
+def test_sync_picks_up_configs_saved_at_the_watermark(app, user, sessions):
+    from database import db
+    from models import TradingConfig
+
+    window = _config(start=60, end=120)
+    config = TradingConfig.query.filter_by(user_id=user.id).one()
+    config.operation_mode, config.morning_start, config.morning_end = 'auto', window.morning_start, window.morning_end
+    config.afternoon_start = config.afternoon_end = None
+    db.session.commit()
+    sessions.init_app(app, None)
+    # Another process saved in the same clock tick as the last config this one synced
+    sessions._synced_until = config.updated_at
+
+    sessions.sync()
+    assert sessions.next_session(user.id) == window.morning_start
+    # Re-reading the unchanged config at the watermark re-plans nothing
+    sessions.sync()
+    assert sessions.stats()['queued'] == 1 and sessions._users[user.id].version == 1
@@ -0,0 +1,71 @@
+import threading
+
+import numpy as np
+
+from signal_hub import SignalHub
+
+PARAMS = {'rsi_period': 14, 'macd_fast': 12, 'macd_slow': 26, 'macd_signal': 9,
+          'ma_short_period': 5, 'ma_long_period': 20, 'aroon_period': 14}
+
+
+def _candles(count=60, start=0):
+    close = 1.1 + np.cumsum(np.random.default_rng(start).normal(0, 0.0005, count))
+    return [{'from': (start + i) * 60, 'open': c - 0.0001, 'max': c + 0.0002, 'min': c - 0.0002, 'close': c}
+            for i, c in enumerate(close)]
+
+
+def test_feed_fetches_once_per_market_and_candle():
+    hub = SignalHub()
+    received = []
+    for _ in range(3):
+        hub.subscribe('EURUSD', 60, PARAMS, received.append)
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        return _candles()
+
+    assert hub.feed('EURUSD', 60, 1, fetch)
+    assert not hub.feed('EURUSD', 60, 1, fetch)
+    assert len(fetches) == 1 and len(received) == 3
+    assert received[0] is received[1] is received[2]
+    assert hub.stats()['computed'] == 1 and hub.stats()['delivered'] == 3
+
+
+def test_feed_retries_when_the_fetch_fails():
+    hub = SignalHub()
+    hub.subscribe('EURUSD', 60, PARAMS, lambda analysis: None)
+    assert not hub.feed('EURUSD', 60, 1, lambda: None)
+    assert hub.feed('EURUSD', 60, 1, _candles)
+
+
+def test_cached_analyses_are_bounded():
+    hub = SignalHub(max_analyses=4)
+    for period in range(2, 12):
+        hub.analyze('EURUSD', 60, dict(PARAMS, rsi_period=period), _candles())
+    assert hub.stats()['cached'] == 4
+    assert hub.stats()['computed'] == 10
+
+
+def test_unsubscribe_drops_the_market_state():
+    hub = SignalHub()
+    token = hub.subscribe('EURUSD', 60, PARAMS, lambda analysis: None)
+    hub.feed('EURUSD', 60, 1, _candles)
+    hub.unsubscribe(token)
+    assert hub.stats()['cached'] == 0 and hub._fed == {}
+
+
+def test_counters_are_exact_under_concurrency():
+    hub = SignalHub()
+    candles = _candles()
+
+    def worker():
+        for _ in range(200):
+            hub.analyze('EURUSD', 60, PARAMS, candles)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert hub.stats()['served'] == 1600 and hub.stats()['computed'] == 1
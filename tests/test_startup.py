@@ -0,0 +1,24 @@
+import pytest
+
+from app import role_settings
+from startup_check import STARTUP_BUDGET_MS, measure_cold_start
+
+
+def test_cli_cold_start_stays_within_budget():
+    result = measure_cold_start()
+    assert result['heavy'] == []
+    assert result['total_ms'] <= STARTUP_BUDGET_MS, result
+
+
+def test_cli_role_starts_nothing():
+    result = measure_cold_start()
+    assert not result['scheduler_running']
+    assert result['threads'] == [] and result['exit_hooks'] == 0
+
+
+@pytest.mark.parametrize('role, background', [('web', True), ('worker', True), ('cli', False)])
+def test_background_services_follow_the_role(role, background, monkeypatch):
+    monkeypatch.delenv('APP_BACKGROUND', raising=False)
+    assert role_settings(role)['background'] is background
+    monkeypatch.setenv('APP_BACKGROUND', 'false')
+    assert role_settings(role)['background'] is False
@@ -0,0 +1,140 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import strategy_bot
+from broker_pool import BrokerConnectionPool
+from broker_simulator import SimulatedMarket
+from database import db
+from models import TradeHistory, TradingConfig
+from signal_hub import SignalHub
+from strategy import StrategyRegistry, strategies
+from write_behind import WriteBehindBuffer
+
+
+@pytest.fixture
+def market(monkeypatch):
+    # 600x: a one-minute order expires in 0.1 s
+    market = SimulatedMarket.synthetic(candles=500, seed=1, speed=600)
+    monkeypatch.setattr(strategy_bot, 'broker_pool', BrokerConnectionPool(service_factory=market.service))
+    return market
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Candle index the bots see, advanced by the tests"""
+    candle = [1000]
+    monkeypatch.setattr(strategy_bot, 'current_candle', lambda: candle[0])
+    monkeypatch.setattr(strategy_bot, 'signal_hub', SignalHub())
+    monkeypatch.setattr(strategy_bot, 'write_behind', WriteBehindBuffer())
+    return candle
+
+
+@pytest.fixture
+def bot(app, user, market, clock, monkeypatch):
+    monkeypatch.setattr(strategy_bot, 'signal_direction', lambda view: 'call')
+    strategies.publish(TradingConfig.query.filter_by(user_id=user.id).one())
+    bot = strategy_bot.StrategyBot(user.id, user.iq_email, user.iq_password)
+    bot.clock = clock
+    assert bot.setup()
+    yield bot
+    bot.teardown()
+    strategies.discard(user.id)
+
+
+def _next_candle(bot):
+    bot.clock[0] += 1
+    bot.run_cycle()
+
+
+def test_bot_trades_with_the_current_strategy(bot, user):
+    config = TradingConfig.query.filter_by(user_id=user.id).one()
+    config.trade_amount, config.use_balance_percentage, config.martingale_enabled = 7.0, False, False
+    strategies.publish(config)
+    _next_candle(bot)
+    assert bot.order['amount'] == 7.0
+
+    # A config saved mid-session is used from the next entry on, without a restart
+    time.sleep(0.15)
+    bot.run_cycle()
+    assert bot.order is None
+    config.trade_amount = 12.0
+    strategies.publish(config)
+    _next_candle(bot)
+    assert bot.order['amount'] == 12.0
+    db.session.rollback()
+
+
+def test_settled_trades_go_through_write_behind(bot, user):
+    _next_candle(bot)
+    time.sleep(0.15)
+    bot.run_cycle()
+    assert bot.order is None and bot.wins + bot.losses + bot.ties == 1
+
+    buffer = strategy_bot.write_behind
+    assert buffer.pending() == {'trade_history': 1, 'system_logs': 1}
+    buffer.flush()
+    trade = TradeHistory.query.filter_by(user_id=user.id).one()
+    assert trade.direction == 'call' and trade.rsi_value is not None and trade.session_type == 'manual'
+
+
+def test_bot_finishes_at_stop_loss(bot, user):
+    config = TradingConfig.query.filter_by(user_id=user.id).one()
+    config.stop_loss = 0.01
+    strategies.publish(config)
+    bot.session_profit = -bot.start_balance
+    assert bot.run_cycle() is False
+    assert bot.get_status()['finished'] == 'stop_loss'
+    db.session.rollback()
+
+
+def test_bots_on_one_market_share_one_fetch(app, user, market, clock, monkeypatch):
+    fetches = []
+    candles = market.candles
+    monkeypatch.setattr(market, 'candles', lambda *args: fetches.append(args) or candles(*args))
+    strategies.publish(TradingConfig.query.filter_by(user_id=user.id).one())
+    bots = [strategy_bot.StrategyBot(user.id, user.iq_email, user.iq_password) for _ in range(3)]
+    for each in bots:
+        each.setup()
+        each.run_cycle()
+    clock[0] += 1
+    for each in bots:
+        each.run_cycle()
+
+    assert len(fetches) == 2  # one per candle for the whole market
+    assert all(each.delivered is None or each.delivered[0] == clock[0] for each in bots)
+    # The first candle reached the bots subscribed when it was fed; the second one all of them
+    assert strategy_bot.signal_hub.stats()['delivered'] == 1 + len(bots)
+    for each in bots:
+        each.teardown()
+    assert strategy_bot.signal_hub.stats()['subscribers'] == 0
+    strategies.discard(user.id)
+
+
+def test_sync_republishes_configs_saved_elsewhere(app, user):
+    registry = StrategyRegistry()
+    config = TradingConfig.query.filter_by(user_id=user.id).one()
+    registry.publish(config)
+    assert registry.sync(app) == 1  # first sync takes every held user once
+
+    # Another worker saves the config
+    db.session.execute(TradingConfig.__table__.update()
+                       .where(TradingConfig.user_id == user.id)
+                       .values(trade_amount=33.0, updated_at=datetime.utcnow() + timedelta(seconds=1)))
+    db.session.commit()
+    registry.sync(app)
+    assert registry.current(user.id).trade_amount == 33.0
+
+
+def test_sync_skips_users_without_a_strategy(app, user):
+    assert StrategyRegistry().sync(app) == 0
+
+
+def test_bot_leases_the_broker_session_while_running(bot):
+    pool = strategy_bot.broker_pool
+    assert pool.stats()['leased'] == 1
+    bot.teardown()
+    assert pool.stats()['leased'] == 0
+    bot.teardown()  # idempotent: the fixture tears down again
+    assert pool.stats()['leased'] == 0
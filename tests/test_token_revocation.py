@@ -0,0 +1,32 @@
+import time
+
+from token_revocation import TokenRevocationStore
+
+
+def _stores(tmp_path):
+    path = str(tmp_path / 'revoked.sqlite3')
+    return TokenRevocationStore(path, sync_seconds=0), TokenRevocationStore(path, sync_seconds=0)
+
+
+def test_revocation_is_seen_by_another_store(tmp_path):
+    first, second = _stores(tmp_path)
+    assert not second.is_revoked('a')
+    first.revoke('a', time.time() + 60)
+    assert second.is_revoked('a')
+
+
+def test_revocation_after_a_purge_of_the_newest_rows_is_seen(tmp_path):
+    first, second = _stores(tmp_path)
+    first.revoke('kept', time.time() + 60)
+    assert second.is_revoked('kept')
+    # The newest rows expire and are purged; a rowid-based sync would then miss the next revocation
+    first.revoke('short-1', time.time() + 0.2)
+    first.revoke('short-2', time.time() + 0.2)
+    assert second.is_revoked('short-2')
+    time.sleep(0.3)
+    assert first.purge_expired() == 2
+
+    first.revoke('after-purge', time.time() + 60)
+    assert second.is_revoked('after-purge')
+    assert not second.is_revoked('short-1')
+
@@ -0,0 +1,169 @@
+import time
+
+import pytest
+
+import strategy_bot
+from broker_pool import BrokerConnectionPool
+from broker_simulator import SimulatedMarket
+from models import TradingConfig
+from signal_hub import SignalHub
+from strategy import strategies
+from trade_latency import LatencyHistogram, LatencyTracker, PreArmedDecision, STAGES, TOTAL_STAGE
+from write_behind import WriteBehindBuffer
+
+
+def _candles(count, start=0):
+    candles = []
+    price = 1.1
+    for number in range(count):
+        close = price + (0.0004 if number % 3 else -0.0003)
+        candles.append({'from': (start + number) * 60, 'open': price, 'close': close,
+                        'max': max(price, close) + 0.0001, 'min': min(price, close) - 0.0001})
+        price = close
+    return candles
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) is None and histogram.summary()['avg_ms'] is None
+    for ms in range(1, 101):
+        histogram.record(float(ms))
+
+    # Buckets are 10% apart: a percentile is at most one bucket above the exact value
+    assert 50 <= histogram.percentile(50) <= 55
+    assert 95 <= histogram.percentile(95) <= 100
+    assert histogram.percentile(99) <= histogram.max == 100
+    summary = histogram.summary()
+    assert summary['count'] == 100 and summary['avg_ms'] == 50.5 and summary['max_ms'] == 100
+
+
+def test_timeline_marks_each_stage_and_the_total():
+    tracker = LatencyTracker()
+    timeline = tracker.timeline(1, time.time() - 0.2)
+    for stage in STAGES[1:]:
+        timeline.mark(stage)
+
+    stages = tracker.report(1)['stages']
+    assert list(stages) == list(STAGES) + [TOTAL_STAGE]
+    assert all(summary['count'] == 1 for summary in stages.values())
+    # candle_received is measured from the candle close
+    assert stages['candle_received']['max_ms'] >= 200
+    assert stages[TOTAL_STAGE]['max_ms'] >= stages['candle_received']['max_ms']
+
+
+def test_report_per_user_and_overall():
+    tracker = LatencyTracker()
+    tracker.record(1, 'order_sent', 5.0)
+    tracker.record(2, 'order_sent', 7.0)
+    tracker.record_prearm(1, True)
+    tracker.record_prearm(2, False)
+
+    report = tracker.report(1)
+    assert set(report) == {'stages', 'prearmed'}
+    assert report['stages']['order_sent']['count'] == 1
+    assert report['prearmed'] == {'hits': 1, 'misses': 0}
+    overall = tracker.report()
+    assert overall['stages']['order_sent']['count'] == 2
+    assert overall['prearmed'] == {'hits': 1, 'misses': 1}
+
+    tracker.reset(1)
+    assert tracker.report(1) == {'stages': {}, 'prearmed': {'hits': 0, 'misses': 0}}
+
+
+def test_prearmed_hit_and_miss():
+    tracker = LatencyTracker()
+    prearmed = PreArmedDecision(user_id=1, max_drift=0.001, tracker=tracker)
+
+    def decide(candles):
+        last = candles[-1]
+        return 'call' if last['close'] > last['open'] else 'put'
+
+    candles = _candles(21)
+    history, forming = candles[:-1], dict(candles[-1])
+
+    prearmed.arm(history, forming, decide)
+    assert prearmed.resolve(dict(forming)) == ('call',)
+
+    # Closed the other way: the bearish scenario was armed too
+    prearmed.arm(history, forming, decide)
+    assert prearmed.resolve(dict(forming, close=forming['open'] - 0.0002)) == ('put',)
+
+    # Too far from the armed price, another candle, or nothing armed: fall back
+    prearmed.arm(history, forming, decide)
+    assert prearmed.resolve(dict(forming, close=forming['close'] * 1.01)) is None
+    prearmed.arm(history, forming, decide)
+    assert prearmed.resolve(dict(forming, **{'from': forming['from'] + 60})) is None
+    assert prearmed.resolve(dict(forming)) is None
+
+    assert tracker.report(1)['prearmed'] == {'hits': 2, 'misses': 3}
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    tracker = LatencyTracker()
+    monkeypatch.setattr(strategy_bot, 'latency_tracker', tracker)
+    monkeypatch.setattr(strategy_bot, 'signal_hub', SignalHub())
+    monkeypatch.setattr(strategy_bot, 'write_behind', WriteBehindBuffer())
+    monkeypatch.setattr(strategy_bot, 'signal_direction', lambda view: 'call')
+    return tracker
+
+
+@pytest.fixture
+def strategy(app, user):
+    strategies.publish(TradingConfig.query.filter_by(user_id=user.id).one())
+    yield strategies.current(user.id)
+    strategies.discard(user.id)
+
+
+def test_strategy_bot_records_every_stage(tracker, strategy, user, monkeypatch):
+    market = SimulatedMarket.synthetic(candles=500, seed=1, speed=600)
+    monkeypatch.setattr(strategy_bot, 'broker_pool', BrokerConnectionPool(service_factory=market.service))
+    monkeypatch.setattr(strategy_bot, 'current_candle', lambda: 1000)
+    bot = strategy_bot.StrategyBot(user.id, user.iq_email, user.iq_password)
+    assert bot.setup()
+    try:
+        bot.run_cycle()
+        assert bot.order is not None
+    finally:
+        bot.teardown()
+
+    stages = tracker.report(user.id)['stages']
+    assert list(stages) == list(STAGES) + [TOTAL_STAGE]
+    assert all(summary['count'] == 1 for summary in stages.values())
+
+
+class FakeBroker:
+    def __init__(self, candles):
+        self.candles = candles
+        self.orders = []
+
+    def get_candles(self, asset, timeframe, count, end_time):
+        return [dict(candle) for candle in self.candles[-count:]]
+
+    def buy(self, amount, asset, direction, expiration):
+        self.orders.append((asset, direction))
+        return True, len(self.orders)
+
+
+@pytest.mark.parametrize('drift, hit', [(0.0, True), (0.01, False)])
+def test_strategy_bot_orders_on_the_armed_decision(tracker, strategy, user, drift, hit):
+    bot = strategy_bot.StrategyBot(user.id, user.iq_email, user.iq_password)
+    bot.prearmed = PreArmedDecision(user.id, tracker=tracker)
+    bot.subscription = ('EURUSD', strategy.analysis_hash, None)
+    broker = FakeBroker(_candles(strategy_bot.CANDLE_COUNT + 1, start=1000 - strategy_bot.CANDLE_COUNT))
+    bot._arm(broker, strategy, 1000)
+    assert bot.armed_candle == 1000
+
+    # The candle closed (near) where it was when the decision was armed
+    forming = broker.candles[-1]
+    forming['close'] *= 1 + drift
+    broker.candles.append(dict(forming, open=forming['close'], **{'from': forming['from'] + 60}))
+    bot.timeline = tracker.timeline(user.id, 1001 * strategy_bot.TIMEFRAME)
+    bot._trade_prearmed(broker, strategy, 'EURUSD', 1001)
+
+    assert tracker.report(user.id)['prearmed'] == {'hits': int(hit), 'misses': int(not hit)}
+    assert broker.orders == ([('EURUSD', 'call')] if hit else [])
+    assert bot.decided_candle == (1001 if hit else None)
+    stages = tracker.report(user.id)['stages']
+    # An armed order skips the analysis stages
+    assert ('order_acknowledged' in stages) == hit and 'indicators_updated' not in stages
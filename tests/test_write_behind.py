@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from models import TradeHistory, SystemLog
+from write_behind import WriteBehindBuffer
+
+
+def _trade(user, **values):
+    return dict(dict(user_id=user.id, asset='EURUSD', direction='call', amount=10.0, result='win', profit=8.7),
+                **values)
+
+
+def test_poison_row_is_dead_lettered_and_the_rest_written(app, user):
+    buffer = WriteBehindBuffer()
+    buffer.record_trade(_trade(user))
+    buffer.record_trade(_trade(user, direction=None))  # NOT NULL direction
+    buffer.record_trade(_trade(user, asset='GBPUSD'))
+    buffer.log_event('INFO', 'test', 'event', user_id=user.id)
+
+    assert buffer.flush() == 3
+    assert TradeHistory.query.count() == 2 and SystemLog.query.count() == 1
+    assert buffer.pending() == {'trade_history': 0, 'system_logs': 0}
+    assert buffer.stats()['dead_letters'] == {'trade_history': 1}
+    [dead] = buffer.dead_letters()
+    assert dead['table'] == 'trade_history' and 'direction' not in dead['row']
+
+    # Never requeued
+    assert buffer.flush() == 0
+
+
+def test_listeners_get_the_rows_written_row_by_row(app, user):
+    buffer = WriteBehindBuffer()
+    received = []
+    buffer.add_listener(received.extend)
+    buffer.record_trade(_trade(user))
+    buffer.record_trade(_trade(user, direction=None))
+    buffer.flush()
+    assert len(received) == 1 and received[0]['asset'] == 'EURUSD'
+
+
+def test_connection_errors_requeue_the_batch(app, user, monkeypatch):
+    buffer = WriteBehindBuffer()
+    buffer.record_trade(_trade(user))
+    buffer.log_event('INFO', 'test', 'event')
+
+    def down(*args, **kwargs):
+        raise OperationalError('INSERT', {}, Exception('database is locked'))
+
+    monkeypatch.setattr(buffer, '_insert', down)
+    with pytest.raises(RuntimeError):
+        buffer.flush()
+    assert buffer.pending() == {'trade_history': 1, 'system_logs': 1}
+    assert buffer.stats()['dead_letters'] == {}
+
+    monkeypatch.undo()
+    assert buffer.flush() == 2
+
+
+def test_connection_loss_during_row_retry_keeps_the_unwritten_rows(app, user, monkeypatch):
+    buffer = WriteBehindBuffer()
+    for asset in ('EURUSD', 'GBPUSD', 'USDJPY'):
+        buffer.record_trade(_trade(user, asset=asset))
+    buffer.record_trade(_trade(user, direction=None))
+    insert = buffer._insert
+    calls = []
+
+    def flaky(table, rows, returning=False):
+        calls.append(len(rows))
+        # The batch fails on the poison row, then the database goes away after one retried row
+        if len(calls) == 3:
+            raise OperationalError('INSERT', {}, Exception('server closed the connection'))
+        return insert(table, rows, returning)
+
+    monkeypatch.setattr(buffer, '_insert', flaky)
+    with pytest.raises(RuntimeError):
+        buffer.flush()
+    assert TradeHistory.query.count() == 1
+    assert buffer.pending()['trade_history'] == 3
@@ -0,0 +1,180 @@
+"""
+Revoked JWTs, shared by every worker on the machine.
+
+Revocations live in a small SQLite file (WAL mode) with the token's expiry,
+so a logout on one gunicorn worker is seen by the others, survives restarts,
+and is forgotten once the token could not be used anyway. Each process keeps
+a Bloom filter of the revoked jtis in front of it: a token that is not in the
+filter is accepted without touching the file, and only filter hits (revoked
+tokens and rare false positives) are confirmed against the store. Filters
+pick up other workers' revocations every REVOCATION_SYNC_SECONDS, reading the
+rows past the last AUTOINCREMENT ``seq`` they saw (never reused, unlike a
+rowid after the newest rows are purged).
+"""
+
+import os
+import math
+import time
+import hashlib
+import logging
+import threading
+
+from local_store import LocalStore, default_path
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.getenv('REVOCATION_DB_PATH', default_path('revoked-tokens'))
+SYNC_SECONDS = float(os.getenv('REVOCATION_SYNC_SECONDS', 1.0))
+PURGE_SECONDS = int(os.getenv('REVOCATION_PURGE_SECONDS', 3600))
+BLOOM_CAPACITY = int(os.getenv('REVOCATION_BLOOM_CAPACITY', 100000))
+BLOOM_ERROR_RATE = 0.001
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS revocations (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    jti TEXT NOT NULL UNIQUE,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on one blake2b digest)"""
+    __slots__ = ('size', 'hashes', 'bits', 'count')
+
+    def __init__(self, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class TokenRevocationStore:
+    """SQLite-backed revocation list with an in-process Bloom filter front"""
+
+    def __init__(self, path=DB_PATH, sync_seconds=SYNC_SECONDS, capacity=BLOOM_CAPACITY):
+        self.store = LocalStore(path, SCHEMA)
+        self.sync_seconds = sync_seconds
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._synced_seq = 0
+        self._synced_at = 0.0
+        self.counters = dict.fromkeys(('checks', 'lookups', 'false_positives', 'revoked_hits'), 0)
+
+    # Bloom filter
+
+    def _rebuild(self):
+        """Fresh filter from the unexpired rows. Caller holds self._lock."""
+        rows = self.store.execute(
+            'SELECT seq, jti FROM revocations WHERE expires_at > ?', (time.time(),)).fetchall()
+        bloom = BloomFilter(max(self.capacity, 2 * len(rows)))
+        for _, jti in rows:
+            bloom.add(jti)
+        self._bloom = bloom
+        self._synced_seq = max((seq for seq, _ in rows), default=self._synced_seq)
+        self._synced_at = time.time()
+
+    def _sync(self):
+        """Add revocations made by other processes since the last sync"""
+        with self._lock:
+            if self._bloom is None:
+                self._rebuild()
+                return
+            if time.time() - self._synced_at < self.sync_seconds:
+                return
+            rows = self.store.execute(
+                'SELECT seq, jti FROM revocations WHERE seq > ?', (self._synced_seq,)).fetchall()
+            for seq, jti in rows:
+                self._bloom.add(jti)
+                self._synced_seq = max(self._synced_seq, seq)
+            # An overfull filter loses its error rate; start over at a larger size
+            if self._bloom.count > 2 * self.capacity:
+                self.capacity = self._bloom.count
+                self._rebuild()
+            self._synced_at = time.time()
+
+    # Public API
+
+    def revoke(self, jti, expires_at):
+        """Revoke a token until ``expires_at`` (its 'exp' claim, epoch seconds)"""
+        self.store.execute(
+            'INSERT OR REPLACE INTO revocations (jti, expires_at) VALUES (?, ?)', (jti, float(expires_at)))
+        with self._lock:
+            if self._bloom is None:
+                self._rebuild()
+            else:
+                self._bloom.add(jti)
+
+    def is_revoked(self, jti):
+        self._sync()
+        self.counters['checks'] += 1
+        if jti not in self._bloom:
+            return False
+        self.counters['lookups'] += 1
+        row = self.store.execute(
+            'SELECT expires_at FROM revocations WHERE jti = ?', (jti,)).fetchone()
+        if row is None:
+            self.counters['false_positives'] += 1
+            return False
+        self.counters['revoked_hits'] += 1
+        return True
+
+    def purge_expired(self):
+        """Drop rows of tokens that have expired and shrink the filter"""
+        deleted = self.store.execute(
+            'DELETE FROM revocations WHERE expires_at <= ?', (time.time(),)).rowcount
+        if deleted:
+            with self._lock:
+                self._rebuild()
+            logger.info(f"Purged {deleted} expired revoked tokens")
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            bloom = self._bloom
+            stats = dict(self.counters)
+        stats['bloom_entries'] = bloom.count if bloom else 0
+        stats['bloom_bits'] = bloom.size if bloom else 0
+        return stats
+
+
+revocation_store = TokenRevocationStore()
+
+
+def register_token_revocation(jwt, scheduler):
+    """Check every protected request against the store and purge expired rows periodically"""
+    from flask import jsonify
+
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        return revocation_store.is_revoked(jwt_payload['jti'])
+
+    @jwt.revoked_token_loader
+    def revoked_token_response(jwt_header, jwt_payload):
+        return jsonify({'message': 'Token inválido'}), 401
+
+    scheduler.add_job(
+        revocation_store.purge_expired,
+        'interval',
+        seconds=PURGE_SECONDS,
+        id='purge_revoked_tokens',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
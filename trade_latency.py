@@ -0,0 +1,204 @@
+"""
+Stage-by-stage latency of the candle-close -> order path.
+
+A ``TradeTimeline`` is opened when a closed candle reaches a bot and marked
+at each stage (candle received, indicators updated, ML scored, order sent,
+order acknowledged). Each mark records the time since the previous one in a
+per-user log-bucketed histogram, so p50/p95/p99 cost O(buckets) memory per
+stage no matter how many trades are recorded.
+
+``PreArmedDecision`` takes the analysis off that path: shortly before the
+candle closes the bot evaluates its decision for a bullish and a bearish
+close, and when the real candle arrives the matching decision is used as
+is, so the order goes out without waiting for indicators or the model.
+"""
+
+import os
+import time
+import bisect
+import logging
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('candle_received', 'indicators_updated', 'ml_scored', 'order_sent', 'order_acknowledged')
+TOTAL_STAGE = 'close_to_ack'
+PREARM_MAX_DRIFT = float(os.getenv('PREARM_MAX_DRIFT', 0.0005))
+
+# 0.05 ms .. ~120 s, 10% apart
+_BUCKET_BOUNDS_MS = np.geomspace(0.05, 120000, 156)
+
+
+class LatencyHistogram:
+    """Log-bucketed latency histogram (milliseconds)"""
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = np.zeros(len(_BUCKET_BOUNDS_MS) + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, ms):
+        self.counts[bisect.bisect_left(_BUCKET_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile (capped at the max seen)"""
+        if not self.count:
+            return None
+        index = int(np.searchsorted(np.cumsum(self.counts), q / 100 * self.count))
+        return min(float(_BUCKET_BOUNDS_MS[min(index, len(_BUCKET_BOUNDS_MS) - 1)]), self.max)
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'p50_ms': _round(self.percentile(50)),
+            'p95_ms': _round(self.percentile(95)),
+            'p99_ms': _round(self.percentile(99)),
+            'max_ms': round(self.max, 3),
+            'avg_ms': round(self.total / self.count, 3) if self.count else None,
+        }
+
+
+def _round(value):
+    return None if value is None else round(value, 3)
+
+
+class TradeTimeline:
+    """Marks of one candle's trip through the trade path"""
+    __slots__ = ('tracker', 'user_id', 'started', 'last', 'prearmed')
+
+    def __init__(self, tracker, user_id, candle_closed_at=None):
+        self.tracker = tracker
+        self.user_id = user_id
+        now = time.time()
+        # Without the candle's close time the timeline starts when the candle is received
+        self.started = candle_closed_at if candle_closed_at else now
+        self.last = self.started
+        self.prearmed = False
+
+    def mark(self, stage):
+        now = time.time()
+        self.tracker.record(self.user_id, stage, (now - self.last) * 1000)
+        self.last = now
+        if stage == 'order_acknowledged':
+            self.tracker.record(self.user_id, TOTAL_STAGE, (now - self.started) * 1000)
+
+
+class LatencyTracker:
+    """Per-user stage histograms"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = defaultdict(dict)  # user_id -> stage -> LatencyHistogram
+        self._prearm = defaultdict(lambda: [0, 0])  # user_id -> [hits, misses]
+
+    def timeline(self, user_id, candle_closed_at=None):
+        """Start timing a closed candle; candle_received is measured from candle_closed_at"""
+        timeline = TradeTimeline(self, user_id, candle_closed_at)
+        timeline.mark('candle_received')
+        return timeline
+
+    def record(self, user_id, stage, ms):
+        with self._lock:
+            histogram = self._histograms[user_id].get(stage)
+            if histogram is None:
+                histogram = self._histograms[user_id][stage] = LatencyHistogram()
+            histogram.record(max(ms, 0.0))
+
+    def record_prearm(self, user_id, hit):
+        with self._lock:
+            self._prearm[user_id][0 if hit else 1] += 1
+
+    def report(self, user_id=None):
+        """p50/p95/p99 per stage for one user, or for all users"""
+        with self._lock:
+            users = [user_id] if user_id is not None else list(self._histograms)
+            merged = {}
+            hits = misses = 0
+            for uid in users:
+                for stage, histogram in self._histograms.get(uid, {}).items():
+                    merged.setdefault(stage, LatencyHistogram()).merge(histogram)
+                if uid in self._prearm:
+                    hits += self._prearm[uid][0]
+                    misses += self._prearm[uid][1]
+
+        order = STAGES + (TOTAL_STAGE,)
+        return {
+            'stages': {stage: merged[stage].summary() for stage in order if stage in merged},
+            'prearmed': {'hits': hits, 'misses': misses},
+        }
+
+    def reset(self, user_id):
+        with self._lock:
+            self._histograms.pop(user_id, None)
+            self._prearm.pop(user_id, None)
+
+
+latency_tracker = LatencyTracker()
+
+
+class PreArmedDecision:
+    """Decisions computed before a candle closes, for both close directions.
+
+    ``arm(candles, forming, decide)`` runs ``decide`` on the history plus the
+    forming candle closed one tick up and one tick down from its open (or at
+    the current price when it is already on that side). ``resolve(closed)``
+    returns the decision matching the real close, or None when the candle
+    closed flat or too far from the armed price, in which case the bot runs
+    its normal analysis.
+    """
+
+    def __init__(self, user_id=None, max_drift=PREARM_MAX_DRIFT, tracker=latency_tracker):
+        self.user_id = user_id
+        self.max_drift = max_drift
+        self.tracker = tracker
+        self._armed = None
+
+    @staticmethod
+    def _scenario(forming, close):
+        candle = dict(forming)
+        candle['close'] = close
+        high_key = 'max' if 'max' in candle else 'high'
+        low_key = 'min' if 'min' in candle else 'low'
+        candle[high_key] = max(candle.get(high_key, close), close)
+        candle[low_key] = min(candle.get(low_key, close), close)
+        return candle
+
+    def arm(self, candles, forming, decide, tick=1e-5):
+        """Precompute decide(candles + [scenario]) for a bullish and a bearish close"""
+        open_price, price = forming['open'], forming['close']
+        up = self._scenario(forming, max(price, open_price + tick))
+        down = self._scenario(forming, min(price, open_price - tick))
+        self._armed = {
+            'from': forming.get('from', forming.get('timestamp')),
+            'up': (up['close'], decide(list(candles) + [up])),
+            'down': (down['close'], decide(list(candles) + [down])),
+        }
+
+    def resolve(self, closed):
+        """Armed decision for the real closed candle, or None to fall back"""
+        armed, self._armed = self._armed, None
+        hit = None
+        if armed is not None and armed['from'] == closed.get('from', closed.get('timestamp')):
+            direction = 'up' if closed['close'] > closed['open'] else 'down' if closed['close'] < closed['open'] else None
+            if direction:
+                armed_close, decision = armed[direction]
+                if abs(closed['close'] - armed_close) <= self.max_drift * abs(armed_close):
+                    hit = (decision,)
+        if self.user_id is not None:
+            self.tracker.record_prearm(self.user_id, hit is not None)
+        return hit
@@ -0,0 +1,303 @@
+"""
+Write-behind buffer for TradeHistory and SystemLog rows.
+
+Bots hand finished trade records and log events to ``write_behind`` and
+return immediately; a background thread inserts them in batches (one
+executemany INSERT per table and column set) every
+WRITE_BEHIND_FLUSH_SECONDS, or sooner once WRITE_BEHIND_BATCH_SIZE rows are
+waiting. The buffer is bounded: when full, new trades are rejected (and
+logged) and the oldest log events are dropped, so memory stays flat if the
+database is down. Everything still queued is written at shutdown.
+
+A batch that fails on a connection error goes back to the front of the queue
+and is retried with backoff. Any other failure is blamed on the rows: the
+batch is retried one row per transaction, and rows that still fail (e.g. a
+trade without its NOT NULL direction) are logged, counted and kept in a
+bounded dead-letter list instead of being requeued forever.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque, defaultdict
+from datetime import datetime
+
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SECONDS = float(os.getenv('WRITE_BEHIND_FLUSH_SECONDS', 1.0))
+BATCH_SIZE = int(os.getenv('WRITE_BEHIND_BATCH_SIZE', 500))
+MAX_TRADES = int(os.getenv('WRITE_BEHIND_MAX_TRADES', 50000))
+MAX_LOGS = int(os.getenv('WRITE_BEHIND_MAX_LOGS', 20000))
+MAX_DEAD_LETTERS = int(os.getenv('WRITE_BEHIND_MAX_DEAD_LETTERS', 1000))
+MAX_BACKOFF_SECONDS = 30.0
+
+
+def _row(table, record):
+    """Column dict for a model instance or dict; unknown keys and unset columns are dropped"""
+    if isinstance(record, dict):
+        return {key: value for key, value in record.items() if key in table.c and value is not None}
+    return {column.key: getattr(record, column.key) for column in table.columns
+            if getattr(record, column.key, None) is not None}
+
+
+def _transient(error):
+    """Connection-level failures are retried; anything else is a problem with the rows"""
+    return isinstance(error, (OperationalError, InterfaceError)) or getattr(error, 'connection_invalidated', False)
+
+
+class WriteBehindBuffer:
+    """Bounded queues of pending inserts with a background flusher"""
+
+    def __init__(self, max_trades=MAX_TRADES, max_logs=MAX_LOGS):
+        self.app = None
+        self.max_trades = max_trades
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._trades = deque()
+        self._logs = deque(maxlen=max_logs)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._listeners = []
+        self.written = defaultdict(int)
+        self.dropped = defaultdict(int)
+        self.dead = defaultdict(int)
+        self._dead_letters = deque(maxlen=MAX_DEAD_LETTERS)
+
+    def init_app(self, app, start=True):
+        self.app = app
+        if start and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def add_listener(self, callback):
+        """Call ``callback(rows)`` with the TradeHistory rows (ids included) after each insert"""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    # Producers (never touch the database)
+
+    def record_trade(self, trade):
+        """Queue a finished trade (TradeHistory instance or column dict); False if the buffer is full"""
+        from models import TradeHistory
+
+        row = _row(TradeHistory.__table__, trade)
+        row.setdefault('timestamp', datetime.utcnow())
+        with self._lock:
+            if len(self._trades) >= self.max_trades:
+                self.dropped['trade_history'] += 1
+                logger.error(f"Write-behind buffer full, trade for user {row.get('user_id')} not queued")
+                return False
+            self._trades.append(row)
+            wake = len(self._trades) >= BATCH_SIZE
+        if wake:
+            self._wakeup.set()
+        return True
+
+    def log_event(self, level, component, message, user_id=None, context=None):
+        """Queue a SystemLog entry; the oldest entries are dropped when the buffer is full"""
+        row = {
+            'timestamp': datetime.utcnow(),
+            'level': level,
+            'component': component,
+            'message': message,
+            'user_id': user_id,
+            'context_data': json.dumps(context) if context is not None else None,
+        }
+        with self._lock:
+            if len(self._logs) == self._logs.maxlen:
+                self.dropped['system_logs'] += 1
+            self._logs.append({key: value for key, value in row.items() if value is not None})
+
+    def pending(self):
+        with self._lock:
+            return {'trade_history': len(self._trades), 'system_logs': len(self._logs)}
+
+    # Flushing
+
+    def _take(self, queue, limit):
+        with self._lock:
+            return [queue.popleft() for _ in range(min(limit, len(queue)))]
+
+    def _requeue(self, queue, rows, table_name):
+        """Put failed rows back in front; if that overflows, trades lose the newest rows and logs the oldest"""
+        with self._lock:
+            combined = list(rows) + list(queue)
+            limit = queue.maxlen or self.max_trades
+            overflow = max(0, len(combined) - limit)
+            kept = combined[overflow:] if queue.maxlen else combined[:limit]
+            queue.clear()
+            queue.extend(kept)
+            self.dropped[table_name] += overflow
+
+    def _insert(self, table, rows, returning=False):
+        """executemany INSERT per distinct column set; returns rows with ids when asked"""
+        groups = defaultdict(list)
+        for row in rows:
+            groups[tuple(sorted(row))].append(row)
+
+        # Without executemany RETURNING the listeners get the rows without ids
+        returning = returning and db.session.get_bind().dialect.insert_executemany_returning
+        inserted = []
+        for batch in groups.values():
+            stmt = table.insert()
+            if returning:
+                result = db.session.execute(stmt.returning(table.c.id, sort_by_parameter_order=True), batch)
+                for row, (row_id,) in zip(batch, result):
+                    inserted.append(dict(row, id=row_id))
+            else:
+                db.session.execute(stmt, batch)
+                inserted.extend(batch)
+        return inserted
+
+    def _dead_letter(self, table_name, row, error):
+        with self._lock:
+            self.dead[table_name] += 1
+            self._dead_letters.append({'table': table_name, 'row': row, 'error': str(error)})
+        logger.error(f"Write-behind dropped a {table_name} row for user {row.get('user_id')}: {str(error)}")
+
+    def dead_letters(self):
+        """Rows that failed on their own, newest last: {'table', 'row', 'error'}"""
+        with self._lock:
+            return list(self._dead_letters)
+
+    def _insert_each(self, trades, logs, returning):
+        """Retry a failed batch one row per transaction; returns (inserted trades, rows written).
+
+        Rows failing on their own are dead-lettered. A connection error puts
+        the rows not yet written back in their queues and is re-raised.
+        """
+        from models import TradeHistory, SystemLog
+
+        pending = [(TradeHistory.__table__, row) for row in trades] + [(SystemLog.__table__, row) for row in logs]
+        inserted = []
+        written = 0
+        for index, (table, row) in enumerate(pending):
+            try:
+                result = self._insert(table, [row], returning=returning and table.name == 'trade_history')
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                if _transient(e):
+                    rest = pending[index:]
+                    self._requeue(self._trades, [r for t, r in rest if t.name == 'trade_history'], 'trade_history')
+                    self._requeue(self._logs, [r for t, r in rest if t.name == 'system_logs'], 'system_logs')
+                    raise
+                self._dead_letter(table.name, row, e)
+                continue
+            self.written[table.name] += 1
+            written += 1
+            if table.name == 'trade_history':
+                inserted.extend(result)
+        return inserted, written
+
+    def flush(self):
+        """Write queued rows in batches. Must run inside an application context.
+
+        Returns the number of rows written. On a connection error the rows go
+        back to the front of their queue; other failures are retried row by
+        row and the failing rows dead-lettered.
+        """
+        from models import TradeHistory, SystemLog
+
+        written = 0
+        with self._flush_lock:
+            while True:
+                trades = self._take(self._trades, BATCH_SIZE)
+                logs = self._take(self._logs, BATCH_SIZE)
+                if not trades and not logs:
+                    break
+                returning = bool(self._listeners)
+                try:
+                    inserted = self._insert(TradeHistory.__table__, trades, returning=returning)
+                    self._insert(SystemLog.__table__, logs)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    if _transient(e):
+                        self._requeue(self._trades, trades, 'trade_history')
+                        self._requeue(self._logs, logs, 'system_logs')
+                        raise RuntimeError(f"write-behind flush failed: {str(e)}") from e
+                    logger.warning(f"Write-behind batch of {len(trades) + len(logs)} rows failed, "
+                                   f"retrying row by row: {str(e)}")
+                    try:
+                        inserted, count = self._insert_each(trades, logs, returning)
+                    except Exception as e:
+                        raise RuntimeError(f"write-behind flush failed: {str(e)}") from e
+                    written += count
+                else:
+                    self.written['trade_history'] += len(trades)
+                    self.written['system_logs'] += len(logs)
+                    written += len(trades) + len(logs)
+
+                for callback in self._listeners:
+                    try:
+                        callback(inserted)
+                    except Exception as e:
+                        logger.error(f"Write-behind listener error: {str(e)}")
+        return written
+
+    def _flush_in_context(self):
+        with self.app.app_context():
+            try:
+                return self.flush()
+            finally:
+                db.session.remove()
+
+    def _run(self):
+        backoff = FLUSH_SECONDS
+        while not self._stopping.is_set():
+            self._wakeup.wait(backoff)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            try:
+                self._flush_in_context()
+                backoff = FLUSH_SECONDS
+            except Exception as e:
+                backoff = min(MAX_BACKOFF_SECONDS, backoff * 2)
+                logger.error(f"{str(e)}; retrying in {backoff:.0f}s")
+
+    def shutdown(self, timeout=10.0):
+        """Stop the flusher and write everything still queued"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.app is None:
+            return
+        deadline = time.time() + timeout
+        while any(self.pending().values()) and time.time() < deadline:
+            try:
+                self._flush_in_context()
+            except Exception as e:
+                logger.error(f"{str(e)} at shutdown")
+                time.sleep(0.5)
+        left = self.pending()
+        if any(left.values()):
+            logger.error(f"Write-behind buffer shut down with unwritten rows: {left}")
+
+    def stats(self):
+        return {'pending': self.pending(), 'written': dict(self.written), 'dropped': dict(self.dropped),
+                'dead_letters': dict(self.dead)}
+
+
+write_behind = WriteBehindBuffer()
+
+
+def register_write_behind(app, background=True):
+    """Start the flusher; the final flush runs at exit after bots are stopped.
+
+    Without ``background`` rows are only written by explicit ``flush()`` calls.
+    """
+    import atexit
+
+    write_behind.init_app(app, start=background)
+    if background:
+        atexit.register(write_behind.shutdown)
@@ -21,8 +21,9 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 try:
-    # Import the main application
-    from app import app as application
+    # Build the web application (scheduler and schema creation per APP_* settings)
+    from app import create_app
+    application = create_app('web')
     
     # Templates and static files are now in project root
     logger.info(f"Application imported successfully from project root")